@@ -0,0 +1,128 @@
+"""
+Toplu Değerlendirme (Batch API) Endpoints
+Yeni prompt versiyonlarını fiş kütüphanesinde offline, indirimli olarak dener
+"""
+from fastapi import APIRouter, Form, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, desc
+from typing import List, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+from ..database.database import get_db, AsyncSessionLocal
+from ..database.models import BatchJob
+from ..models.schemas import BatchJobResponse
+from ..services.batch_evaluation import (
+    create_batch_job,
+    poll_batch_job,
+    run_batch_job,
+    pending_batch_job_ids
+)
+
+router = APIRouter(prefix="/api/batch-jobs", tags=["Batch Jobs"])
+
+
+# Sorgulama task'leri (GC tarafından toplanmasın diye referans tutulur)
+_poll_tasks: set = set()
+
+
+def _parse_ids(value: Optional[str]) -> Optional[List[str]]:
+    """Virgülle ayrılmış ID listesi (boş = None)"""
+    ids = [v.strip() for v in (value or "").split(",") if v.strip()]
+    return ids or None
+
+
+def start_polling(job_id: str):
+    """İş bitene kadar arka planda sorgula"""
+    task = asyncio.create_task(run_batch_job(job_id))
+    _poll_tasks.add(task)
+    task.add_done_callback(_poll_tasks.discard)
+
+
+async def resume_pending_jobs():
+    """Sunucu başlarken bitmemiş işlerin sorgulamasını sürdür"""
+    async with AsyncSessionLocal() as db:
+        job_ids = await pending_batch_job_ids(db)
+    for job_id in job_ids:
+        start_polling(job_id)
+    if job_ids:
+        logger.info(f"⏳ {len(job_ids)} batch job sorgulanmaya devam ediyor")
+
+
+@router.post("", response_model=BatchJobResponse)
+async def create_job(
+    kind: str = Form(...),
+    model_name: Optional[str] = Form(None),
+    gpt_model: Optional[str] = Form(None),
+    receipt_ids: Optional[str] = Form(None),
+    analysis_ids: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Toplu değerlendirme işi başlat
+
+    Args:
+        kind: "vision" (görsel -> OpenAI Vision OCR) veya "accounting" (kayıtlı OCR metni -> muhasebe)
+        model_name: Muhasebe işinde prompt'u değerlendirilen OCR modeli
+        gpt_model: GPT modeli (boş = varsayılan)
+        receipt_ids: Virgülle ayrılmış fiş ID'leri (boş = tüm kütüphane)
+        analysis_ids: Vision işinde ayrıca işlenecek analiz ID'leri
+    """
+    try:
+        job = await create_batch_job(
+            db,
+            kind=kind,
+            model_name=model_name,
+            gpt_model=gpt_model,
+            receipt_ids=_parse_ids(receipt_ids),
+            analysis_ids=_parse_ids(analysis_ids)
+        )
+        await db.commit()
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        logger.error(f"❌ Batch job oluşturulamadı: {e}")
+        raise HTTPException(500, f"Batch job oluşturulamadı: {str(e)}")
+
+    start_polling(job.id)
+    return BatchJobResponse.model_validate(job)
+
+
+@router.get("", response_model=List[BatchJobResponse])
+async def list_jobs(
+    status: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Batch job listesi (en yeni önce)"""
+    query = select(BatchJob).order_by(desc(BatchJob.created_at))
+    if status:
+        query = query.where(BatchJob.status == status)
+    result = await db.execute(query)
+    return [BatchJobResponse.model_validate(job) for job in result.scalars().all()]
+
+
+@router.get("/{job_id}", response_model=BatchJobResponse)
+async def get_job(job_id: str, db: AsyncSession = Depends(get_db)):
+    """Batch job detayı"""
+    job = await db.get(BatchJob, job_id)
+    if not job:
+        raise HTTPException(404, "Batch job bulunamadı")
+    return BatchJobResponse.model_validate(job)
+
+
+@router.post("/{job_id}/poll", response_model=BatchJobResponse)
+async def poll_job(job_id: str, db: AsyncSession = Depends(get_db)):
+    """Durumu hemen sorgula (tamamlandıysa sonuçları yazar)"""
+    job = await db.get(BatchJob, job_id)
+    if not job:
+        raise HTTPException(404, "Batch job bulunamadı")
+
+    try:
+        await poll_batch_job(db, job)
+        await db.commit()
+    except Exception as e:
+        logger.error(f"❌ Batch job sorgulanamadı: {e}")
+        raise HTTPException(500, f"Batch job sorgulanamadı: {str(e)}")
+    return BatchJobResponse.model_validate(job)
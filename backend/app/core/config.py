@@ -37,12 +37,47 @@ class Settings(BaseSettings):
     AWS_ACCESS_KEY_ID: str = ""
     AWS_SECRET_ACCESS_KEY: str = ""
     AWS_REGION: str = "us-east-1"
+    # Textract analyze_expense (opt-in: tipli fiş alanları, muhasebede GPT'siz eşleme;
+    # sayfa fiyatı $1.50 yerine $10/1000 sayfa)
+    AWS_TEXTRACT_EXPENSE: bool = False
     
     # OpenAI
     OPENAI_API_KEY: str = ""
     OPENAI_MODEL: str = "gpt-4o"
     OPENAI_VISION_MODEL: str = "gpt-4o"  # Vision specific
     OPENAI_ACCOUNTING_MODEL: str = "gpt-4o-mini"  # For accounting extraction
+    # V2 AccountingData şemasını strict JSON schema response_format olarak gönder (Vision + muhasebe)
+    OPENAI_STRUCTURED_OUTPUT: bool = False
+    # GPT scheduler limitleri: "model:tpm:rpm" virgülle ayrılmış (tanımsız modeller varsayılanı kullanır)
+    OPENAI_RATE_LIMITS: str = "gpt-4o-mini:200000:500,gpt-4.1-mini:200000:500"
+    OPENAI_DEFAULT_TPM: int = 30000
+    OPENAI_DEFAULT_RPM: int = 500
+    
+    # Toplu değerlendirme (Batch API): "openai" veya "local" (test/geliştirme için yerel yedek)
+    OPENAI_BATCH_CLIENT: str = "openai"
+    OPENAI_BATCH_POLL_INTERVAL: int = 60  # saniye
+    BATCH_DIR: str = "./batches"  # JSONL istek/yanıt dosyaları
+    OPENAI_VISION_PACK_SIZE: int = 4  # Toplu Vision'da tek istekteki fiş sayısı (1 = paketleme kapalı)
+    
+    # Muhasebe sonuç cache'i (analizler arası, SQLite)
+    ACCOUNTING_CACHE_ENABLED: bool = True
+    ACCOUNTING_CACHE_PATH: str = "./accounting_cache.db"
+    ACCOUNTING_CACHE_MAX_ENTRIES: int = 5000
+    
+    # Muhasebe model yönlendirici (gpt_model="auto"): ucuzdan pahalıya, doğrulama başarısızsa yükselt
+    ACCOUNTING_ROUTER_MODELS: str = "gpt-4o-mini,gpt-4o"
+    ACCOUNTING_ROUTER_TOLERANCE: float = 0.10  # TL, toplam/KDV karşılaştırma toleransı
+    
+    # OCR metni sıkıştırma (GPT'ye göndermeden önce)
+    OCR_COMPACTION_ENABLED: bool = True
+    OCR_COMPACTION_DEDUPE: bool = True
+    OCR_COMPACTION_NEAR_DUP_THRESHOLD: float = 0.9  # 0 = sadece birebir tekrarlar
+    OCR_COMPACTION_STRIP_DECORATIONS: bool = True
+    OCR_COMPACTION_NORMALIZE_NUMBERS: bool = True
+    
+    # PaddleOCR mikroservis
+    PADDLE_SERVICE_URL: str = "http://localhost:8001"
+    PADDLE_OCR_LANG: str = ""  # Boşsa mikroservisin varsayılan dili
     
     # Upload
     UPLOAD_DIR: str = "./uploads"
@@ -75,19 +110,24 @@ class Settings(BaseSettings):
         return {
             "access_key_id": self.AWS_ACCESS_KEY_ID,
             "secret_access_key": self.AWS_SECRET_ACCESS_KEY,
-            "region": self.AWS_REGION
+            "region": self.AWS_REGION,
+            "expense_analysis": self.AWS_TEXTRACT_EXPENSE
         }
     
     def get_openai_config(self) -> dict:
         """OpenAI konfigürasyonu"""
         return {
             "api_key": self.OPENAI_API_KEY,
-            "model": self.OPENAI_MODEL
+            "model": self.OPENAI_MODEL,
+            "structured_output": self.OPENAI_STRUCTURED_OUTPUT
         }
     
     def get_paddle_config(self) -> dict:
-        """PaddleOCR konfigürasyonu (parametresiz)"""
-        return {}
+        """PaddleOCR mikroservis konfigürasyonu"""
+        return {
+            "paddle_service_url": self.PADDLE_SERVICE_URL,
+            "lang": self.PADDLE_OCR_LANG
+        }
     
     def get_model_config(self, model_type: 'OCRModelType') -> Dict[str, Any]:
         """
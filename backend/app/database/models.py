@@ -25,6 +25,7 @@ class Analysis(Base):
     # İlişkiler
     results = relationship("OCRResult", back_populates="analysis", cascade="all, delete-orphan")
     evaluations = relationship("ModelEvaluation", back_populates="analysis", cascade="all, delete-orphan")
+    accounting_results = relationship("AccountingResult", back_populates="analysis", cascade="all, delete-orphan")
 
 
 class OCRResult(Base):
@@ -48,6 +49,37 @@ class OCRResult(Base):
     analysis = relationship("Analysis", back_populates="results")
 
 
+class AccountingResult(Base):
+    """GPT muhasebe çıkarım sonucu - aynı OCR metni + model + prompt için tekrar kullanılır"""
+    __tablename__ = "accounting_results"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    analysis_id = Column(String, ForeignKey("analyses.id"), nullable=False, index=True)
+    model_name = Column(String, nullable=False)  # OCR modeli
+    gpt_model = Column(String, nullable=False)
+    prompt_version = Column(Integer, nullable=False)  # Muhasebe prompt versiyonu
+    text_hash = Column(String, nullable=False)  # OCR metninin SHA-256'sı
+    accounting_data = Column(JSON, nullable=True)  # V1 format (frontend)
+    raw_gpt_response = Column(Text, nullable=True)
+    processing_time_ms = Column(Float, nullable=False)
+    estimated_cost = Column(Float, default=0.0)
+    token_usage = Column(JSON, nullable=True)
+    # Sonucu üreten yol: gpt_model (yükseltme sonrası), routing, compaction, extraction_method, field_confidence
+    result_metadata = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    # İlişkiler
+    analysis = relationship("Analysis", back_populates="accounting_results")
+    
+    __table_args__ = (
+        Index(
+            'idx_unique_accounting_result',
+            'analysis_id', 'model_name', 'gpt_model', 'prompt_version', 'text_hash',
+            unique=True
+        ),
+    )
+
+
 class ModelEvaluation(Base):
     """Model değerlendirme tablosu"""
     __tablename__ = "model_evaluations"
@@ -118,6 +150,30 @@ class PromptTest(Base):
     )
 
 
+class BatchJob(Base):
+    """Batch API ile toplu değerlendirme işi (Vision OCR veya muhasebe çıkarımı)"""
+    __tablename__ = "batch_jobs"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    kind = Column(String, nullable=False)  # "vision" | "accounting"
+    model_name = Column(String, nullable=False)  # Değerlendirilen OCR modeli (prompt sahibi)
+    prompt_version = Column(Integer, nullable=False)
+    gpt_model = Column(String, nullable=False)
+    client = Column(String, nullable=False)  # "openai" | "local"
+    batch_id = Column(String, nullable=True)  # Sağlayıcı tarafı batch ID
+    status = Column(String, nullable=False, default="created", index=True)
+    input_path = Column(String, nullable=True)  # JSONL istek dosyası
+    request_count = Column(Integer, default=0)
+    succeeded_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    estimated_cost = Column(Float, default=0.0)
+    error = Column(Text, nullable=True)
+    # Paket yanıtından ayrıştırılamayan görseller için açılan takip işinde: ana iş
+    parent_job_id = Column(String, ForeignKey("batch_jobs.id"), nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    completed_at = Column(DateTime, nullable=True)
+
+
 class Receipt(Base):
     """Fiş Datası - Toplu test için fiş arşivi"""
     __tablename__ = "receipts"
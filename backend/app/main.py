@@ -1,29 +1,34 @@
 from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc, delete, and_
 from typing import List, Optional
 from contextlib import asynccontextmanager
+from pydantic import TypeAdapter, ValidationError
 import asyncio
+import json
 import os
 import logging
 from datetime import datetime
 import uuid
 
 from .core.config import settings
-from .database.database import init_db, get_db
+from .database.database import init_db, get_db, AsyncSessionLocal
 from .database.models import Analysis, OCRResult, ModelEvaluation, PromptTest, Receipt
 from .models.schemas import ModelStatistics, ModelPromptStatistics
 from .models.schemas import (
     OCRModelType,
+    CropArea,
     AnalysisResponse,
     OCRResult as OCRResultSchema,
     AnalysisEvaluation,
     AnalysisHistory,
     AccountingAnalysisRequest,
     AccountingAnalysisResponse,
+    EnsembleAccountingResponse,
+    ModelAccountingResult,
     PromptTestCreate,
     PromptTestLabel,
     PromptTestResponse,
@@ -31,8 +36,13 @@ from .models.schemas import (
 )
 from .services import OCRServiceFactory
 from .services.accounting_service import AccountingService
-from .services.prompt_manager import PromptManager
+from .services.accounting_cache import get_accounting_cache
+from .services.gpt_scheduler import get_gpt_scheduler, PRIORITY_BULK
+from .services.model_router import get_model_router
+from .services.json_repair import get_json_repair_tracker
+from .services.prompt_manager import get_prompt_manager
 from .api.receipts import router as receipts_router
+from .api.batch_jobs import router as batch_jobs_router, resume_pending_jobs
 
 # Configure logging
 logging.basicConfig(
@@ -51,6 +61,8 @@ async def lifespan(app: FastAPI):
         await init_db()
         os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
         logger.info(f"📁 Upload directory: {settings.UPLOAD_DIR}")
+        get_prompt_manager().warm()
+        await resume_pending_jobs()
         logger.info("✅ Platform started successfully")
     except Exception as e:
         logger.error(f"❌ Startup failed: {e}")
@@ -83,6 +95,7 @@ app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads"
 
 # Include routers
 app.include_router(receipts_router)
+app.include_router(batch_jobs_router)
 
 
 @app.get("/")
@@ -111,7 +124,7 @@ async def get_prompt_versions(model_name: str):
         model_name: OCR model adı (paddle_ocr, openai_vision, google_docai, amazon_textract)
     """
     try:
-        prompt_manager = PromptManager()
+        prompt_manager = get_prompt_manager()
         versions = prompt_manager.get_available_versions(model_name)
         return {
             "model_name": model_name,
@@ -126,6 +139,7 @@ async def analyze_receipt(
     file: UploadFile = File(...),
     prompt: Optional[str] = Form(None),
     models: Optional[str] = Form(None),  # Comma-separated model names
+    crop_areas: Optional[str] = Form(None),  # JSON CropArea veya listesi
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -135,6 +149,7 @@ async def analyze_receipt(
         file: Yüklenecek fiş görseli
         prompt: Custom OCR prompt
         models: Kullanılacak modeller (comma-separated)
+        crop_areas: OCR'ın çalışacağı bölgeler (şimdilik sadece PaddleOCR destekler)
         db: Database session
     """
     try:
@@ -144,6 +159,7 @@ async def analyze_receipt(
         file_content = await file.read()
         if len(file_content) > settings.MAX_UPLOAD_SIZE:
             raise HTTPException(400, "Dosya çok büyük (max 20MB)")
+        crops = _parse_crop_areas(crop_areas)
         
         # Dosya kaydet
         analysis_id = str(uuid.uuid4())
@@ -184,7 +200,8 @@ async def analyze_receipt(
                 image_bytes=file_content,
                 prompt=prompt,
                 analysis_id=analysis_id,
-                db=db
+                db=db,
+                crop_areas=crops
             )
             tasks.append(task)
         
@@ -263,6 +280,11 @@ async def analyze_receipt(
         )
 
 
+def _ocr_entities(result: Optional[dict]) -> Optional[List[dict]]:
+    """OCR servis sonucundaki entity listesi (Google DocAI raw_response'unda döner)"""
+    return ((result or {}).get("raw_response") or {}).get("entities")
+
+
 def _create_ocr_result_db(
     analysis_id: str,
     model_type: OCRModelType,
@@ -292,7 +314,11 @@ def _create_ocr_result_db(
             estimated_cost=0
         )
     
-    # Başarılı durum
+    # Başarılı durum (entities muhasebe analizinde provider eşlemesi için saklanır)
+    metadata = result.get("metadata")
+    entities = _ocr_entities(result)
+    if entities:
+        metadata = {**(metadata or {}), "entities": entities}
     return OCRResult(
         analysis_id=analysis_id,
         model_name=model_type.value,
@@ -303,7 +329,7 @@ def _create_ocr_result_db(
         token_count=result.get("token_count"),
         estimated_cost=result.get("estimated_cost", 0),
         error=result.get("error"),
-        model_metadata=result.get("metadata")
+        model_metadata=metadata
     )
 
 
@@ -347,19 +373,41 @@ def _create_ocr_result_schema(
     )
 
 
+def _parse_crop_areas(raw: Optional[str]) -> List[CropArea]:
+    """Form alanındaki JSON crop alanlarını (tek obje veya liste) CropArea listesine çevir"""
+    if not raw:
+        return []
+    try:
+        data = json.loads(raw)
+        if isinstance(data, dict):
+            data = [data]
+        return TypeAdapter(List[CropArea]).validate_python(data)
+    except (json.JSONDecodeError, ValidationError) as e:
+        raise HTTPException(400, f"Geçersiz crop_areas: {e}")
+
+
+def _model_config(model_type: OCRModelType, crop_areas: Optional[List[CropArea]] = None) -> dict:
+    """Model konfigürasyonu; crop alanları bölge bazlı OCR destekleyen modele (PaddleOCR) eklenir"""
+    config = settings.get_model_config(model_type)
+    if crop_areas and model_type == OCRModelType.PADDLE_OCR:
+        config = {**config, "crops": [crop.model_dump() for crop in crop_areas]}
+    return config
+
+
 async def process_with_model(
     model_type: OCRModelType,
     image_bytes: bytes,
     prompt: Optional[str],
     analysis_id: str,
-    db: AsyncSession
+    db: AsyncSession,
+    crop_areas: Optional[List[CropArea]] = None
 ) -> OCRResultSchema:
     """
     Tek bir model ile işleme yap
     """
     try:
         # Config al - Artık tek satır! ✅
-        config = settings.get_model_config(model_type)
+        config = _model_config(model_type, crop_areas)
         
         # Servisi oluştur
         service = OCRServiceFactory.create_service(model_type, config)
@@ -522,52 +570,60 @@ async def get_analysis(
     )
 
 
+async def _load_accounting_inputs(analysis_id: str, db: AsyncSession) -> List[dict]:
+    """Analizin OCR sonuçlarını AccountingService girdisine çevir (structured_data ve entities dahil)"""
+    result = await db.execute(
+        select(Analysis).where(Analysis.id == analysis_id)
+    )
+    analysis = result.scalar_one_or_none()
+    
+    if not analysis:
+        raise HTTPException(404, "Analysis bulunamadı")
+    
+    results_query = await db.execute(
+        select(OCRResult).where(OCRResult.analysis_id == analysis_id)
+    )
+    ocr_results_db = results_query.scalars().all()
+    
+    if not ocr_results_db:
+        raise HTTPException(404, "OCR sonucu bulunamadı")
+    
+    return [
+        {
+            "model_name": r.model_name,
+            "text_content": r.text_content or "",
+            "structured_data": r.structured_data,  # Direkt field
+            "entities": (r.model_metadata or {}).get("entities"),
+            "error": r.error
+        }
+        for r in ocr_results_db
+    ]
+
+
 @app.post("/api/accounting-analysis/{analysis_id}", response_model=AccountingAnalysisResponse)
 async def analyze_accounting(
     analysis_id: str,
     gpt_model: str = Form("gpt-4o-mini"),
+    force: bool = Form(False),
     db: AsyncSession = Depends(get_db)
 ):
     """
     OCR sonuçlarını GPT ile muhasebe verisine dönüştür
     
+    Aynı OCR metni + GPT modeli + prompt versiyonu için kaydedilmiş sonuçlar
+    tekrar kullanılır.
+    
     Args:
         analysis_id: Analiz ID'si
-        gpt_model: Kullanılacak GPT modeli (gpt-4o-mini veya gpt-4.1-mini)
+        gpt_model: Kullanılacak GPT modeli (gpt-4o-mini, gpt-4.1-mini veya "auto":
+            ucuz modelle başla, doğrulama başarısızsa üst modele yükselt)
+        force: True ise kayıtlı sonuçları yok say ve yeniden hesapla
         db: Database session
     """
     try:
         logger.info(f"💰 Starting accounting analysis: {analysis_id} with {gpt_model}")
         
-        # Analysis ve OCR sonuçlarını getir
-        result = await db.execute(
-            select(Analysis).where(Analysis.id == analysis_id)
-        )
-        analysis = result.scalar_one_or_none()
-        
-        if not analysis:
-            raise HTTPException(404, "Analysis bulunamadı")
-        
-        # OCR sonuçlarını getir
-        results_query = await db.execute(
-            select(OCRResult).where(OCRResult.analysis_id == analysis_id)
-        )
-        ocr_results_db = results_query.scalars().all()
-        
-        if not ocr_results_db:
-            raise HTTPException(404, "OCR sonucu bulunamadı")
-        
-        # OCR sonuçlarını dict formatına çevir (structured_data ve metadata dahil)
-        ocr_results = [
-            {
-                "model_name": r.model_name,
-                "text_content": r.text_content or "",
-                "structured_data": r.structured_data,  # Direkt field
-                "entities": r.model_metadata.get("raw_response", {}).get("entities") if r.model_metadata else None,
-                "error": r.error
-            }
-            for r in ocr_results_db
-        ]
+        ocr_results = await _load_accounting_inputs(analysis_id, db)
         
         # Muhasebe servisini başlat (seçili GPT modeli ile)
         accounting_service = AccountingService(
@@ -576,17 +632,21 @@ async def analyze_accounting(
         )
         
         # Her model için ayrı ayrı muhasebe verisi çıkar
-        model_results_list = await accounting_service.extract_accounting_data_per_model(ocr_results)
+        model_results_list = await accounting_service.extract_accounting_data_per_model(
+            ocr_results,
+            analysis_id=analysis_id,
+            db=db,
+            force=force
+        )
         
-        # Toplam maliyet ve süreyi hesapla
-        total_processing_time = sum(r.get("processing_time_ms", 0) for r in model_results_list)
-        total_cost = sum(r.get("estimated_cost", 0) for r in model_results_list)
+        # Toplam maliyet ve süreyi hesapla (kayıtlı sonuçlar bu çağrıda harcama yapmadı)
+        fresh_results = [r for r in model_results_list if not r.get("cached")]
+        total_processing_time = sum(r.get("processing_time_ms", 0) for r in fresh_results)
+        total_cost = sum(r.get("estimated_cost", 0) for r in fresh_results)
         
         logger.info(f"✅ Accounting analysis completed: {len(model_results_list)} models, {total_processing_time:.0f}ms, ${total_cost:.6f}")
         
         # Schema'ya uygun response oluştur
-        from .models.schemas import ModelAccountingResult
-        
         model_results = [
             ModelAccountingResult(
                 model_name=r["model_name"],
@@ -594,7 +654,11 @@ async def analyze_accounting(
                 raw_gpt_response=r.get("raw_gpt_response"),
                 processing_time_ms=r["processing_time_ms"],
                 estimated_cost=r["estimated_cost"],
-                error=r.get("error")
+                error=r.get("error"),
+                cached=r.get("cached", False),
+                compaction=r.get("compaction"),
+                gpt_model=r.get("gpt_model"),
+                routing=r.get("routing")
             )
             for r in model_results_list
         ]
@@ -616,13 +680,377 @@ async def analyze_accounting(
         )
 
 
+# Arka plan task'leri (GC tarafından toplanmasın diye referans tutulur)
+_background_tasks: set = set()
+
+
+async def _run_per_model_comparison(analysis_id: str, gpt_model: str, ocr_results: List[dict]):
+    """Model bazında muhasebe çıkarımını toplu öncelikle çalıştır ve kaydet (ensemble karşılaştırması için)"""
+    try:
+        async with AsyncSessionLocal() as db:
+            accounting_service = AccountingService(
+                api_key=settings.OPENAI_API_KEY,
+                gpt_model=gpt_model,
+                priority=PRIORITY_BULK
+            )
+            await accounting_service.extract_accounting_data_per_model(
+                ocr_results,
+                analysis_id=analysis_id,
+                db=db
+            )
+            await db.commit()
+        logger.info(f"✅ Background per-model comparison saved: {analysis_id}")
+    except Exception as e:
+        logger.error(f"❌ Background per-model comparison failed for {analysis_id}: {e}")
+
+
+@app.post("/api/accounting-analysis/{analysis_id}/ensemble", response_model=EnsembleAccountingResponse)
+async def analyze_accounting_ensemble(
+    analysis_id: str,
+    gpt_model: str = Form("gpt-4o-mini"),
+    compare: bool = Form(False),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Tüm OCR çıktılarını tek GPT çağrısında uzlaştır
+    
+    Model bazında karşılaştırma yerine sadece en iyi muhasebe cevabı gerektiğinde
+    kullanılır (sistem prompt'u bir kez, tek round trip). Sonuç V2 formatında ve
+    alan bazında provenance içerir.
+    
+    Args:
+        analysis_id: Analiz ID'si
+        gpt_model: Kullanılacak GPT modeli
+        compare: True ise model bazında çıkarım arka planda (toplu öncelikle) çalışır ve
+            kaydedilir; sonradan /api/accounting-analysis/{analysis_id} GPT'ye gitmeden döner
+        db: Database session
+    """
+    try:
+        logger.info(f"🧩 Starting ensemble accounting analysis: {analysis_id} with {gpt_model}")
+        
+        ocr_results = await _load_accounting_inputs(analysis_id, db)
+        
+        accounting_service = AccountingService(
+            api_key=settings.OPENAI_API_KEY,
+            gpt_model=gpt_model
+        )
+        ensemble = await accounting_service.extract_ensemble(ocr_results)
+        
+        if compare:
+            task = asyncio.create_task(_run_per_model_comparison(analysis_id, gpt_model, ocr_results))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        
+        return EnsembleAccountingResponse(
+            analysis_id=analysis_id,
+            accounting_data=ensemble["accounting_data"],
+            provenance=ensemble.get("provenance", {}),
+            conflicts=ensemble.get("conflicts", []),
+            sources=ensemble.get("sources", []),
+            raw_gpt_response=ensemble.get("raw_gpt_response"),
+            processing_time_ms=ensemble["processing_time_ms"],
+            estimated_cost=ensemble["estimated_cost"],
+            token_usage=ensemble.get("token_usage"),
+            error=ensemble.get("error"),
+            cached=ensemble.get("cached", False),
+            comparison_started=compare
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Ensemble accounting analysis error: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ensemble muhasebe analizi sırasında hata oluştu: {str(e)}"
+        )
+
+
+@app.get("/api/accounting-cache/stats")
+async def accounting_cache_stats():
+    """Analizler arası muhasebe cache'i: hit oranı, doluluk, tasarruf"""
+    cache = get_accounting_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.delete("/api/accounting-cache")
+async def clear_accounting_cache():
+    """Muhasebe cache'ini temizle"""
+    cache = get_accounting_cache()
+    if cache is not None:
+        cache.clear()
+    return {"success": True}
+
+
+@app.get("/api/gpt-scheduler/stats")
+async def gpt_scheduler_stats():
+    """GPT scheduler: model bazında TPM/RPM kullanımı, kuyruk ve bekleme süreleri"""
+    return get_gpt_scheduler().stats()
+
+
+@app.get("/api/accounting-router/stats")
+async def accounting_router_stats():
+    """Model yönlendirici: OCR modeli bazında yükseltme oranı ve son GPT modeli dağılımı"""
+    return get_model_router().stats()
+
+
+@app.get("/api/json-repair/stats")
+async def json_repair_stats():
+    """GPT JSON onarım oranları: kaynak bazında parsed / repaired / partial / failed"""
+    return get_json_repair_tracker().stats()
+
+
+# ==================== Pipeline (OCR -> Muhasebe) ====================
+
+def _sse_event(event: str, data: dict) -> str:
+    """Server-Sent Events formatında tek mesaj"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _accounting_input_from_ocr(
+    model_type: OCRModelType,
+    result: Optional[dict] = None,
+    error: Optional[str] = None
+) -> dict:
+    """OCR servis sonucunu AccountingService girdisine çevir (analyze_accounting ile aynı alanlar)"""
+    if error or not result:
+        return {"model_name": model_type.value, "text_content": "", "error": error or "Unknown error"}
+    
+    return {
+        "model_name": model_type.value,
+        "text_content": result.get("text", "") or "",
+        "structured_data": result.get("structured_data"),
+        "entities": _ocr_entities(result),
+        "error": result.get("error")
+    }
+
+
+async def _run_pipeline_for_model(
+    model_type: OCRModelType,
+    image_bytes: bytes,
+    prompt: Optional[str],
+    analysis_id: str,
+    accounting_service: AccountingService,
+    db: AsyncSession,
+    queue: asyncio.Queue,
+    partial: bool = False,
+    crop_areas: Optional[List[CropArea]] = None,
+    db_lock: Optional[asyncio.Lock] = None
+):
+    """
+    Tek model zinciri: OCR -> (beklemeden) muhasebe çıkarımı
+    
+    Her aşamanın sonucu bittiği anda kuyruğa yazılır. partial=True ise GPT
+    yanıtları stream edilir ve tamamlanan alanlar/kalemler de "partial" olarak yazılır.
+    """
+    def partial_callback(stage: str):
+        if not partial:
+            return None
+        
+        async def on_partial(event: str, data: dict):
+            await queue.put(("partial", {
+                "model_name": model_type.value,
+                "stage": stage,
+                "event": event,
+                "data": data
+            }))
+        return on_partial
+    
+    started = datetime.utcnow()
+    accounting_event = None
+    try:
+        result, error = None, None
+        try:
+            config = _model_config(model_type, crop_areas)
+            service = OCRServiceFactory.create_service(model_type, config)
+            result = await asyncio.wait_for(
+                service.analyze(image_bytes, prompt, on_partial=partial_callback("ocr")),
+                timeout=60.0
+            )
+        except asyncio.TimeoutError:
+            error = "Timeout veya hata: Processing took too long"
+        except Exception as e:
+            error = str(e)
+        
+        db_lock = db_lock or asyncio.Lock()
+        async with db_lock:
+            db.add(_create_ocr_result_db(analysis_id, model_type, result, error=error))
+        ocr_schema = _create_ocr_result_schema(model_type, result, error=error)
+        await queue.put(("ocr", ocr_schema.model_dump(mode="json")))
+        
+        accounting_input = _accounting_input_from_ocr(model_type, result, error)
+        try:
+            accounting = await accounting_service.extract_for_ocr_result(
+                accounting_input, on_partial=partial_callback("accounting")
+            )
+        except Exception as e:
+            accounting = AccountingService._empty_result(model_type.value, str(e))
+        try:
+            # Zincirler aynı session'ı paylaşır: DB yazımları sırayla
+            async with db_lock:
+                await accounting_service.save_result(db, analysis_id, accounting_input, accounting)
+        except Exception as e:
+            logger.warning(f"⚠️ Muhasebe sonucu kaydedilemedi ({model_type.value}): {e}")
+        
+        accounting_schema = ModelAccountingResult(
+            model_name=accounting["model_name"],
+            accounting_data=accounting["accounting_data"],
+            raw_gpt_response=accounting.get("raw_gpt_response"),
+            processing_time_ms=accounting["processing_time_ms"],
+            estimated_cost=accounting["estimated_cost"],
+            error=accounting.get("error"),
+            compaction=accounting.get("compaction"),
+            gpt_model=accounting.get("gpt_model"),
+            routing=accounting.get("routing")
+        )
+        accounting_event = accounting_schema.model_dump(mode="json")
+    except Exception as e:
+        logger.error(f"❌ Pipeline zinciri hata verdi ({model_type.value}): {e}", exc_info=True)
+        accounting_event = AccountingService._empty_result(model_type.value, str(e))
+    finally:
+        # event_stream her model için tek bir "accounting" olayı bekler: zincir nasıl biterse bitsin yazılır
+        if accounting_event is None:
+            accounting_event = AccountingService._empty_result(model_type.value, "Pipeline iptal edildi")
+        queue.put_nowait(("accounting", {
+            **accounting_event,
+            "chain_time_ms": (datetime.utcnow() - started).total_seconds() * 1000
+        }))
+
+
+@app.post("/api/analyze-pipeline")
+async def analyze_pipeline(
+    file: UploadFile = File(...),
+    prompt: Optional[str] = Form(None),
+    models: Optional[str] = Form(None),
+    gpt_model: str = Form("gpt-4o-mini"),
+    partial: bool = Form(True),
+    crop_areas: Optional[str] = Form(None)
+):
+    """
+    OCR + muhasebe analizini tek istekte, model bazında zincirleme çalıştır
+    
+    /api/analyze + /api/accounting-analysis akışından farkı: her modelin OCR
+    sonucu hazır olur olmaz GPT çıkarımına girer. Toplam süre en yavaş
+    (OCR + muhasebe) zinciri kadardır. Sonuçlar SSE olarak akar:
+    
+    - event: analysis   -> {analysis_id, models}
+    - event: partial    -> {model_name, stage, event, data} (GPT stream'inde tamamlanan
+                           document alanı / items[] elemanı / bölüm; partial=True ise)
+    - event: ocr        -> OCRResult (model bitince)
+    - event: accounting -> ModelAccountingResult (model bitince)
+    - event: done       -> toplam maliyet/süre
+    
+    Args:
+        file: Fiş görseli
+        prompt: Custom OCR prompt
+        models: Kullanılacak modeller (comma-separated)
+        gpt_model: Muhasebe için GPT modeli
+        partial: GPT yanıtlarını stream edip kısmi sonuçları (firma, tarih, kalemler) erken gönder
+        crop_areas: OCR'ın çalışacağı bölgeler (JSON CropArea veya listesi; şimdilik sadece PaddleOCR)
+    """
+    file_content = await file.read()
+    if len(file_content) > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(400, "Dosya çok büyük (max 20MB)")
+    
+    try:
+        model_list = (
+            [OCRModelType(m.strip()) for m in models.split(",")]
+            if models else list(OCRModelType)
+        )
+    except ValueError as e:
+        raise HTTPException(400, f"Geçersiz model: {e}")
+    crops = _parse_crop_areas(crop_areas)
+    
+    analysis_id = str(uuid.uuid4())
+    file_ext = os.path.splitext(file.filename)[1]
+    file_path = os.path.join(settings.UPLOAD_DIR, f"{analysis_id}{file_ext}")
+    with open(file_path, "wb") as f:
+        f.write(file_content)
+    
+    accounting_service = AccountingService(
+        api_key=settings.OPENAI_API_KEY,
+        gpt_model=gpt_model
+    )
+    
+    async def event_stream():
+        # StreamingResponse süresince yaşayan kendi session'ı
+        async with AsyncSessionLocal() as db:
+            started = datetime.utcnow()
+            analysis = Analysis(
+                id=analysis_id,
+                file_name=file.filename,
+                file_path=file_path,
+                file_size_bytes=len(file_content),
+                prompt=prompt,
+                upload_timestamp=started
+            )
+            db.add(analysis)
+            await db.flush()
+            
+            logger.info(f"🔀 Starting pipeline analysis: {file.filename} ({len(model_list)} models, {gpt_model})")
+            yield _sse_event("analysis", {
+                "analysis_id": analysis_id,
+                "models": [m.value for m in model_list],
+                "gpt_model": gpt_model
+            })
+            
+            queue: asyncio.Queue = asyncio.Queue()
+            db_lock = asyncio.Lock()
+            tasks = [
+                asyncio.create_task(_run_pipeline_for_model(
+                    model_type, file_content, prompt, analysis_id, accounting_service, db, queue, partial, crops,
+                    db_lock
+                ))
+                for model_type in model_list
+            ]
+            
+            ocr_cost = 0.0
+            accounting_cost = 0.0
+            pending = len(model_list)
+            try:
+                while pending:
+                    event, data = await queue.get()
+                    if event == "ocr":
+                        ocr_cost += data.get("estimated_cost") or 0.0
+                    elif event == "accounting":
+                        accounting_cost += data.get("estimated_cost") or 0.0
+                        pending -= 1
+                    yield _sse_event(event, data)
+                
+                analysis.total_cost = ocr_cost
+                await db.commit()
+            finally:
+                # İstemci bağlantıyı koparırsa kalan zincirleri iptal et
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+            
+            total_ms = (datetime.utcnow() - started).total_seconds() * 1000
+            logger.info(f"✅ Pipeline completed: {analysis_id}, {total_ms:.0f}ms, ${ocr_cost + accounting_cost:.6f}")
+            yield _sse_event("done", {
+                "analysis_id": analysis_id,
+                "total_ocr_cost": ocr_cost,
+                "total_accounting_cost": accounting_cost,
+                "total_estimated_cost": ocr_cost + accounting_cost,
+                "total_processing_time_ms": total_ms
+            })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # ==================== Prompt Yönetimi Endpoints ====================
 
 @app.get("/api/prompts")
 async def get_all_prompts():
     """Tüm modellerin prompt'larını getir"""
     try:
-        prompt_manager = PromptManager()
+        prompt_manager = get_prompt_manager()
         prompts = prompt_manager.get_all_prompts()
         return JSONResponse(content=prompts)
     except Exception as e:
@@ -634,12 +1062,15 @@ async def get_all_prompts():
 async def get_model_prompt(model_name: str):
     """Belirli bir modelin prompt'unu getir"""
     try:
-        prompt_manager = PromptManager()
+        prompt_manager = get_prompt_manager()
         prompt_data = prompt_manager.get_prompt(model_name)
         
-        # Token sayısını hesapla ve ekle
-        if "prompt" in prompt_data:
-            prompt_data["token_count"] = prompt_manager.count_tokens(prompt_data["prompt"])
+        # Token sayısı kayıtta hesaplanıp saklanır (index'ten, tokenizer yüklenmez)
+        if "prompt" in prompt_data and prompt_data.get("token_count") is None:
+            token_count = prompt_manager.get_token_count(model_name, prompt_data.get("version"))
+            prompt_data["token_count"] = (
+                token_count if token_count is not None else prompt_manager.count_tokens(prompt_data["prompt"])
+            )
         
         return JSONResponse(content=prompt_data)
     except Exception as e:
@@ -651,7 +1082,7 @@ async def get_model_prompt(model_name: str):
 async def save_model_prompt(model_name: str, prompt: str = Form(...)):
     """Belirli bir modelin prompt'unu kaydet ve versiyon artır"""
     try:
-        prompt_manager = PromptManager()
+        prompt_manager = get_prompt_manager()
         updated_data = prompt_manager.save_prompt(model_name, prompt)
         
         logger.info(f"✅ Prompt saved: {model_name} (v{updated_data['version']})")
@@ -670,14 +1101,9 @@ async def save_model_prompt(model_name: str, prompt: str = Form(...)):
 async def get_prompt_history(model_name: str):
     """Belirli bir modelin prompt geçmişini getir"""
     try:
-        prompt_manager = PromptManager()
+        prompt_manager = get_prompt_manager()
+        # Versiyon index'inden özetler (token sayısı dahil, prompt metni yok)
         history = prompt_manager.get_prompt_history(model_name)
-        
-        # Her versiyona token sayısını ekle
-        for item in history:
-            if "prompt" in item:
-                item["token_count"] = prompt_manager.count_tokens(item["prompt"])
-        
         return JSONResponse(content=history)
     except Exception as e:
         logger.error(f"❌ Error getting prompt history for {model_name}: {str(e)}", exc_info=True)
@@ -688,7 +1114,7 @@ async def get_prompt_history(model_name: str):
 async def get_prompt_version(model_name: str, version: int):
     """Belirli bir prompt versiyonunu getir"""
     try:
-        prompt_manager = PromptManager()
+        prompt_manager = get_prompt_manager()
         version_data = prompt_manager.load_version(model_name, version)
         if not version_data:
             raise HTTPException(404, f"Version {version} not found")
@@ -704,7 +1130,7 @@ async def get_prompt_version(model_name: str, version: int):
 async def restore_prompt_version(model_name: str, version: int):
     """Eski bir prompt versiyonunu geri yükle"""
     try:
-        prompt_manager = PromptManager()
+        prompt_manager = get_prompt_manager()
         restored = prompt_manager.restore_version(model_name, version)
         logger.info(f"✅ Restored version {version} for {model_name} as v{restored['version']}")
         return JSONResponse(content={
@@ -723,7 +1149,7 @@ async def restore_prompt_version(model_name: str, version: int):
 async def delete_prompt_version(model_name: str, version: int):
     """Bir prompt versiyonunu sil"""
     try:
-        prompt_manager = PromptManager()
+        prompt_manager = get_prompt_manager()
         success = prompt_manager.delete_version(model_name, version)
         if not success:
             raise HTTPException(400, "Mevcut versiyon silinemez veya versiyon bulunamadı")
@@ -215,6 +215,10 @@ class ModelAccountingResult(BaseModel):
     processing_time_ms: float = Field(description="İşlem süresi (ms)")
     estimated_cost: float = Field(description="Tahmini maliyet ($)")
     error: Optional[str] = Field(default=None, description="Hata mesajı varsa")
+    cached: bool = Field(default=False, description="Kayıtlı sonuçtan mı döndü (GPT çağrısı yapılmadı)")
+    compaction: Optional[Dict[str, Any]] = Field(default=None, description="OCR metni sıkıştırma istatistikleri (token tasarrufu)")
+    gpt_model: Optional[str] = Field(default=None, description="Sonucu üreten GPT modeli")
+    routing: Optional[Dict[str, Any]] = Field(default=None, description="Model yönlendirici denemeleri ve yükseltme bilgisi (gpt_model=auto)")
 
 
 class AccountingAnalysisResponse(BaseModel):
@@ -225,6 +229,22 @@ class AccountingAnalysisResponse(BaseModel):
     total_estimated_cost: float = Field(description="Toplam tahmini maliyet")
 
 
+class EnsembleAccountingResponse(BaseModel):
+    """Tüm OCR çıktılarının tek GPT çağrısında uzlaştırılmış muhasebe sonucu"""
+    analysis_id: str
+    accounting_data: Dict[str, Any] = Field(description="Uzlaştırılmış muhasebe verisi (V2 format)")
+    provenance: Dict[str, List[str]] = Field(default={}, description="Alan -> değeri destekleyen OCR modelleri")
+    conflicts: List[str] = Field(default=[], description="Kaynaklar arası çelişkiler ve seçim nedeni")
+    sources: List[str] = Field(default=[], description="Uzlaştırmaya giren OCR modelleri")
+    raw_gpt_response: Optional[str] = Field(default=None, description="Ham GPT yanıtı")
+    processing_time_ms: float = Field(description="İşlem süresi (ms)")
+    estimated_cost: float = Field(description="Tahmini maliyet ($)")
+    token_usage: Optional[Dict[str, int]] = Field(default=None, description="Token kullanımı")
+    error: Optional[str] = Field(default=None, description="Hata mesajı varsa")
+    cached: bool = Field(default=False, description="Cache'ten mi döndü (GPT çağrısı yapılmadı)")
+    comparison_started: bool = Field(default=False, description="Model bazında karşılaştırma arka planda başlatıldı mı")
+
+
 # ==================== PROMPT TEST SCHEMAS ====================
 
 class PromptTestCreate(BaseModel):
@@ -341,6 +361,30 @@ class PromptTestStatistics(BaseModel):
     avg_gpt_cost: float = Field(description="Ortalama GPT maliyeti")
 
 
+# ==================== BATCH JOB SCHEMAS ====================
+
+class BatchJobResponse(BaseModel):
+    """Toplu değerlendirme işi durumu"""
+    id: str
+    kind: str
+    model_name: str
+    prompt_version: int
+    gpt_model: str
+    client: str
+    batch_id: Optional[str]
+    status: str
+    request_count: int
+    succeeded_count: int
+    failed_count: int
+    estimated_cost: float
+    error: Optional[str]
+    parent_job_id: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime]
+    
+    model_config = ConfigDict(from_attributes=True)
+
+
 # ==================== RECEIPT DATA SCHEMAS ====================
 
 class ReceiptCreate(BaseModel):
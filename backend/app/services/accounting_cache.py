@@ -0,0 +1,203 @@
+"""
+Analizler arası muhasebe sonuç cache'i
+Aynı OCR metni (normalize edilmiş) + model + prompt versiyonu + GPT ayarları
+için GPT'ye tekrar gidilmez. SQLite dosyasında saklanır, LRU ile sınırlanır.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AccountingCache:
+    """
+    İçerik adresli (content-addressed) muhasebe sonuç cache'i
+
+    Anahtar: (normalize OCR metin + entity hash'i, model_name, prompt versiyonu,
+    gpt_model, temperature). Entity'ler de prompt'a girdiği için hash'e dahildir.
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS accounting_cache (
+                cache_key TEXT PRIMARY KEY,
+                model_name TEXT NOT NULL,
+                gpt_model TEXT NOT NULL,
+                prompt_version INTEGER NOT NULL,
+                temperature REAL NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_accounting_cache_lru ON accounting_cache (last_used_at)"
+        )
+        self._conn.commit()
+
+        # Process ömrü boyunca sayaçlar
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tokens_saved = 0
+        self.cost_saved = 0.0
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Unicode NFC, satır içi boşlukları tekle, boş satırları at"""
+        text = unicodedata.normalize("NFC", text or "")
+        lines = (" ".join(line.split()) for line in text.splitlines())
+        return "\n".join(line for line in lines if line)
+
+    @classmethod
+    def make_key(
+        cls,
+        text: str,
+        model_name: str,
+        prompt_version: int,
+        gpt_model: str,
+        temperature: float,
+        entities: Optional[List[Dict]] = None,
+        variant: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        variant: GPT çıktısını değiştiren diğer ayarlar (response_format modu,
+            sıkıştırma ayarları, prompt'a giren yapısal veri vb.)
+        """
+        digest = hashlib.sha256(cls.normalize_text(text).encode("utf-8"))
+        if entities:
+            digest.update(json.dumps(entities, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        if variant:
+            digest.update(json.dumps(variant, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        digest.update(f"|{model_name}|{prompt_version}|{gpt_model}|{temperature}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Kayıt varsa döndür ve LRU zamanını güncelle"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM accounting_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE accounting_cache SET last_used_at = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                (time.time(), key)
+            )
+            self._conn.commit()
+
+            result = json.loads(row[0])
+            self.hits += 1
+            self.tokens_saved += (result.get("token_usage") or {}).get("total", 0)
+            self.cost_saved += result.get("estimated_cost") or 0.0
+            return result
+
+    def put(
+        self,
+        key: str,
+        result: Dict[str, Any],
+        model_name: str,
+        gpt_model: str,
+        prompt_version: int,
+        temperature: float
+    ):
+        """Sonucu kaydet, sınır aşıldıysa en az kullanılanları sil"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO accounting_cache
+                    (cache_key, model_name, gpt_model, prompt_version, temperature, result, created_at, last_used_at, hit_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+                """,
+                (key, model_name, gpt_model, prompt_version, temperature,
+                 json.dumps(result, ensure_ascii=False, default=str), now, now)
+            )
+
+            count = self._conn.execute("SELECT COUNT(*) FROM accounting_cache").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    """
+                    DELETE FROM accounting_cache WHERE cache_key IN (
+                        SELECT cache_key FROM accounting_cache ORDER BY last_used_at ASC LIMIT ?
+                    )
+                    """,
+                    (overflow,)
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, result: Dict[str, Any], **meta: Any):
+        await asyncio.to_thread(self.put, key, result, **meta)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM accounting_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss sayaçları, doluluk ve tasarruf"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM accounting_cache").fetchone()[0]
+            per_model = self._conn.execute(
+                "SELECT model_name, COUNT(*), SUM(hit_count) FROM accounting_cache GROUP BY model_name"
+            ).fetchall()
+
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "tokens_saved": self.tokens_saved,
+            "cost_saved": round(self.cost_saved, 6),
+            "per_model": {
+                model_name: {"entries": count, "total_hits": total_hits or 0}
+                for model_name, count, total_hits in per_model
+            }
+        }
+
+
+# Global singleton instance
+_cache_instance: Optional[AccountingCache] = None
+
+
+def get_accounting_cache() -> Optional[AccountingCache]:
+    """
+    Global muhasebe cache instance'ını döner (singleton pattern)
+
+    ACCOUNTING_CACHE_ENABLED=false ise None döner.
+    """
+    global _cache_instance
+    from ..core.config import settings
+
+    if not settings.ACCOUNTING_CACHE_ENABLED:
+        return None
+    if _cache_instance is None:
+        _cache_instance = AccountingCache(
+            path=settings.ACCOUNTING_CACHE_PATH,
+            max_entries=settings.ACCOUNTING_CACHE_MAX_ENTRIES
+        )
+        logger.info(f"✅ Accounting cache: {settings.ACCOUNTING_CACHE_PATH} (max {settings.ACCOUNTING_CACHE_MAX_ENTRIES})")
+    return _cache_instance
@@ -2,116 +2,890 @@
 OCR sonuçlarını GPT ile yapılandırılmış muhasebe verisine dönüştürür
 """
 
+import hashlib
 import json
 import time
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
 from openai import AsyncOpenAI
+from sqlalchemy import select, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database.models import AccountingResult
 from ..models.schemas import AccountingData, LineItem, VATBreakdown
-from .prompt_manager import PromptManager
+from .prompt_manager import get_prompt_manager
 from .schema_registry import get_schema_registry
 from .model_specific_parsers import get_model_parser
+from .accounting_cache import get_accounting_cache
+from .rule_based_extractor import RuleBasedExtractor
+from .provider_mappers import map_provider_output
+from .text_compactor import get_text_compactor
+from .gpt_scheduler import get_gpt_scheduler, PRIORITY_INTERACTIVE
+from .model_router import get_model_router, ROUTER_AUTO
+from .json_repair import parse_gpt_json, FLAG_PARTIAL
+from .structured_output import accounting_response_format, strip_json_schema_blocks
+from .json_stream import IncrementalJSONParser, PartialCallback
 
 logger = logging.getLogger(__name__)
 
 
+# Muhasebe çıkarımı system prompt'u (OCR modelinden bağımsız, prefix cache için sabit)
+ACCOUNTING_SYSTEM_PROMPT = """Sen elit seviye bir Türk muhasebe ve finansal analiz uzmanısın.
+
+🎯 UZMANLIKLARIN:
+- Fiş/Fatura OCR çıktılarını analiz etme
+- Yapılandırılmış muhasebe verisi çıkarma
+- KDV hesaplamaları ve vergi mevzuatı
+- Hata düzeltme ve veri doğrulama
+- Akıllı veri yorumlama
+
+📋 GÖREVİN:
+1. **OCR Metni Analizi**: OCR çıktısını dikkatlice oku (kaynak model user mesajında belirtilir)
+2. **Veri Çıkarımı**: Tüm kritik bilgileri çıkar (VKN, firma, tarih, ürünler, tutarlar)
+3. **KDV Ayrıştırma**: Her KDV oranı için (0%, 1%, 10%, 20%) ayrı breakdown oluştur
+4. **Doğrulama**: Matematiksel tutarlılık kontrol et
+5. **JSON Dönüşümü**: Belirtilen şemaya uygun JSON döndür
+
+⚠️ KRİTİK KURALLAR:
+- Sayısal değerler MUTLAKA number tipinde ("123.45" YANLIŞ, 123.45 DOĞRU)
+- Bulunamayan veya şüpheli değerler için null kullan (boş string "" YASAK)
+- Tüm tutarlar TL cinsinden decimal olmalı
+- JSON şemasına TAM UYUM (eksik veya fazla field YASAK)
+
+🧮 MATEMATİK KONTROL:
+- Hedef: grand_total = subtotal + total_vat
+- Her line_item: total_price = unit_price * quantity
+- OCR kalitesi düşükse, fişte basılı toplam tutara öncelik ver
+- Tutarsızlık varsa, en güvenilir değeri kullan (genelde fiş altındaki toplam)
+- vat_breakdown toplamı ~= total_vat olmalı (küçük yuvarlama farkları kabul edilebilir)
+
+🎯 MODEL-SPECIFIC TALİMATLAR ÖNCELİKLİDİR:
+Aşağıdaki user mesajında bu OCR modeline özel talimatlar var.
+O talimatlara MUTLAKA uy - bu genel kurallardan daha ÖNCELİKLİDİR.
+Her OCR modelinin farklı güçlü/zayıf yönleri var, buna göre uyarla.
+
+🎓 KALİTE STANDARDI:
+Senin çıktın muhasebe analizine gidecek. Mümkün olan en yüksek doğruluk ve tutarlılık gerekli."""
+
+# Prompt'a gömülen V2 şema açıklaması ve örnek çıktı
+# (structured output modunda şema response_format ile gönderildiği için atlanır)
+V2_SCHEMA_PROMPT_SECTION = """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📋 ZORUNLU JSON ŞEMASI
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+{
+  "metadata": {
+    "source": "string",                    // OCR model adı
+    "ocrQualityScore": number,            // 0.0-1.0
+    "classification": "string",           // grocery, fuel, restaurant, etc.
+    "vatTreatment": "string",             // "VAT included" veya "VAT excluded"
+    "notes": "string"
+  },
+  
+  "document": {
+    "merchantName": "string | null",      // Firma adı
+    "merchantVKN": "string | null",       // 10 haneli VKN
+    "merchantTCKN": "string | null",      // 11 haneli TCKN
+    "address": "string | null",
+    "date": "string | null",              // DD.MM.YYYY
+    "time": "string | null",              // HH:MM
+    "receiptNo": "string | null",
+    "plate": "string | null",
+    "invoiceNo": "string | null",
+    "mersisNo": "string | null"
+  },
+  
+  "items": [                              // ✅ "line_items" DEĞİL "items"
+    {
+      "description": "string",           // ✅ "name" DEĞİL "description"
+      "quantity": number,
+      "unitPrice": number,                // ✅ camelCase
+      "grossAmount": number,              // ✅ KDV dahil tutar
+      "netAmount": number,                // ✅ KDV hariç tutar
+      "vatRate": integer,                 // ✅ 0, 1, 10, 20
+      "vatAmount": number,
+      "discountAmount": number,
+      "accountCode": "string",
+      "itemType": "string",               // food, drink, fuel, etc.
+      "confidence": number                // 0.0-1.0
+    }
+  ],
+  
+  "extraTaxes": [                         // Ek vergiler (konaklama vergisi gibi)
+    {
+      "type": "string",
+      "amount": number
+    }
+  ],
+  
+  "totals": {
+    "vatBreakdown": [                     // KDV dağılımı
+      {
+        "vatRate": integer,               // ✅ "rate" DEĞİL "vatRate"
+        "taxBase": number,                // ✅ "base_amount" DEĞİL "taxBase"
+        "vatAmount": number
+      }
+    ],
+    "totalVat": number,
+    "totalAmount": number,                // Genel toplam
+    "paymentAccountCode": "string",
+    "currency": "TRY"
+  },
+  
+  "paymentLines": [                       // Ödeme satırları
+    {
+      "method": "string",                 // cash, credit_card, bank_transfer
+      "amount": number,
+      "accountCode": "string"             // 100, 108, 102
+    }
+  ],
+  
+  "entryLines": [                         // Muhasebe yevmiye kayıtları
+    {
+      "accountCode": "string",
+      "debit": number,
+      "credit": number,
+      "description": "string"
+    }
+  ],
+  
+  "unprocessedLines": ["string"],       // İşlenemeyen OCR satırları
+  "validationFlags": ["string"],         // Uyarılar (ROUNDING_APPLIED, etc.)
+  "errorFlags": ["string"],              // Hatalar (TOTAL_MISMATCH, etc.)
+  
+  "stats": {
+    "itemCount": integer,
+    "parsedLines": integer,
+    "unprocessedCount": integer
+  }
+}
+
+"""
+
+V2_EXAMPLE_PROMPT_SECTION = """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📌 ÖRNEK ÇIKTI (Referans)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+{
+  "metadata": {
+    "source": "paddle_ocr",
+    "ocrQualityScore": 0.85,
+    "classification": "fuel_station",
+    "vatTreatment": "VAT included",
+    "notes": ""
+  },
+  "document": {
+    "merchantName": "ABC Petrol A.Ş.",
+    "merchantVKN": "1234567890",
+    "merchantTCKN": null,
+    "address": "İstanbul Cad. No:15",
+    "date": "14.09.2023",
+    "time": "15:30",
+    "receiptNo": "FIS-0040",
+    "plate": "34ABC123",
+    "invoiceNo": null,
+    "mersisNo": null
+  },
+  "items": [
+    {
+      "description": "Motorin",
+      "quantity": 50.5,
+      "unitPrice": 34.50,
+      "grossAmount": 1742.25,
+      "netAmount": 1583.84,
+      "vatRate": 10,
+      "vatAmount": 158.41,
+      "discountAmount": 0.0,
+      "accountCode": "153",
+      "itemType": "fuel",
+      "confidence": 0.95
+    },
+    {
+      "description": "Kısa kol gömlek",
+      "quantity": 1.0,
+      "unitPrice": 1199.99,
+      "grossAmount": 839.99,
+      "netAmount": 763.63,
+      "vatRate": 10,
+      "vatAmount": 76.36,
+      "discountAmount": 360.0,
+      "accountCode": "153",
+      "itemType": "clothing",
+      "confidence": 0.90
+    },
+    {
+      "description": "Yıkama Hizmeti",
+      "quantity": 1.0,
+      "unitPrice": 100.0,
+      "grossAmount": 100.0,
+      "netAmount": 83.33,
+      "vatRate": 20,
+      "vatAmount": 16.67,
+      "discountAmount": 0.0,
+      "accountCode": "770",
+      "itemType": "service",
+      "confidence": 0.90
+    }
+  ],
+  "extraTaxes": [],
+  "totals": {
+    "vatBreakdown": [
+      {
+        "vatRate": 10,
+        "taxBase": 2347.47,
+        "vatAmount": 234.77
+      },
+      {
+        "vatRate": 20,
+        "taxBase": 83.33,
+        "vatAmount": 16.67
+      }
+    ],
+    "totalVat": 251.44,
+    "totalAmount": 2682.24,
+    "paymentAccountCode": "108",
+    "currency": "TRY"
+  },
+  "paymentLines": [
+    {
+      "method": "credit_card",
+      "amount": 2682.24,
+      "accountCode": "108"
+    }
+  ],
+  "entryLines": [
+    {
+      "accountCode": "153",
+      "debit": 1583.84,
+      "credit": 0.0,
+      "description": "Motorin alışı"
+    },
+    {
+      "accountCode": "153",
+      "debit": 763.63,
+      "credit": 0.0,
+      "description": "Gömlek alışı (İndirimli)"
+    },
+    {
+      "accountCode": "191",
+      "debit": 234.77,
+      "credit": 0.0,
+      "description": "İndirilecek KDV %10"
+    },
+    {
+      "accountCode": "770",
+      "debit": 83.33,
+      "credit": 0.0,
+      "description": "Yıkama hizmeti"
+    },
+    {
+      "accountCode": "191",
+      "debit": 16.67,
+      "credit": 0.0,
+      "description": "İndirilecek KDV %20"
+    },
+    {
+      "accountCode": "108",
+      "debit": 0.0,
+      "credit": 2682.24,
+      "description": "Kredi kartı ile ödeme"
+    }
+  ],
+  "unprocessedLines": [],
+  "validationFlags": [],
+  "errorFlags": [],
+  "stats": {
+    "itemCount": 3,
+    "parsedLines": 15,
+    "unprocessedCount": 0
+  }
+}
+
+"""
+
+
 class AccountingService:
     """GPT kullanarak muhasebe verisi çıkarma servisi"""
     
     # Model fiyatlandırması (USD per 1M tokens)
     MODEL_PRICING = {
         "gpt-4o-mini": {
-            "input": 0.15,   # $0.15 / 1M input tokens
-            "output": 0.60   # $0.60 / 1M output tokens
+            "input": 0.15,          # $0.15 / 1M input tokens
+            "cached_input": 0.075,  # $0.075 / 1M cached input tokens (prefix cache)
+            "output": 0.60          # $0.60 / 1M output tokens
         },
         "gpt-4.1-mini": {
-            "input": 0.10,   # $0.10 / 1M input tokens (varsayılan, gerçek fiyat kontrol edilmeli)
-            "output": 0.40   # $0.40 / 1M output tokens (varsayılan, gerçek fiyat kontrol edilmeli)
+            "input": 0.10,          # $0.10 / 1M input tokens (varsayılan, gerçek fiyat kontrol edilmeli)
+            "cached_input": 0.025,  # $0.025 / 1M cached input tokens (varsayılan, gerçek fiyat kontrol edilmeli)
+            "output": 0.40          # $0.40 / 1M output tokens (varsayılan, gerçek fiyat kontrol edilmeli)
+        },
+        "gpt-4o": {
+            "input": 2.50,          # $2.50 / 1M input tokens
+            "cached_input": 1.25,   # $1.25 / 1M cached input tokens
+            "output": 10.00         # $10.00 / 1M output tokens
         }
     }
     
-    def __init__(self, api_key: str, gpt_model: str = "gpt-4o-mini"):
+    def __init__(
+        self,
+        api_key: str,
+        gpt_model: str = "gpt-4o-mini",
+        use_local_extractor: bool = True,
+        priority: int = PRIORITY_INTERACTIVE,
+        structured_output: Optional[bool] = None,
+        use_provider_mapping: bool = True
+    ):
+        from ..core.config import settings
         self.client = AsyncOpenAI(api_key=api_key)
-        self.model = gpt_model  # Seçilebilir GPT modeli
+        self.model = gpt_model  # Seçilebilir GPT modeli ("auto" = ucuzdan pahalıya yönlendirme)
+        self.router = get_model_router() if gpt_model == ROUTER_AUTO else None
         self.temperature = 0.1  # Minimal randomness (OCR hata toleransı için)
         # NOT: 0.0 = Tam deterministik, 0.1 = Hafif esneklik
         # Muhasebe için 0.1'den yüksek ÖNERİLMEZ!
         self.max_tokens = 3000  # Büyük fişler için yeterli
-        self.prompt_manager = PromptManager()  # Prompt yöneticisi
+        self.prompt_manager = get_prompt_manager()  # Prompt yöneticisi
+        self.result_cache = get_accounting_cache()  # Analizler arası cache (None = kapalı)
+        # Kolay fişlerde GPT'siz kural tabanlı çıkarım (doğrulanamazsa GPT'ye düşer)
+        self.local_extractor = RuleBasedExtractor() if use_local_extractor else None
+        # DocAI entity'leri / Textract expense alanları doğrudan V2'ye (doğrulanırsa GPT'siz)
+        self.provider_validator = RuleBasedExtractor() if use_provider_mapping else None
+        self.text_compactor = get_text_compactor()  # OCR metni sıkıştırma (None = kapalı)
+        self.scheduler = get_gpt_scheduler()  # Process genelinde TPM/RPM bütçesi
+        self.priority = priority  # Kuyruk önceliği (interaktif önce, toplu iş sonra)
+        # Strict JSON şema response_format (prompt'ta şema/örnek yok, çıktı doğrudan V2)
+        self.structured_output = (
+            settings.OPENAI_STRUCTURED_OUTPUT if structured_output is None else structured_output
+        )
         
     async def extract_accounting_data_per_model(
         self,
-        ocr_results: List[Dict[str, Any]]
+        ocr_results: List[Dict[str, Any]],
+        analysis_id: Optional[str] = None,
+        db: Optional[AsyncSession] = None,
+        force: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Her bir OCR modeli için ayrı ayrı muhasebe verisi çıkar (PARALEL)
         
+        analysis_id ve db verilirse sonuçlar AccountingResult tablosunda saklanır;
+        anahtar (analysis, OCR modeli, GPT modeli, prompt versiyonu, OCR metin hash'i)
+        eşleşen kayıtlar GPT'ye gitmeden döndürülür.
+        
         Args:
             ocr_results: Farklı modellerden gelen OCR sonuçları
+            analysis_id: Analiz ID'si (kalıcı sonuç için)
+            db: Database session (kalıcı sonuç için)
+            force: True ise kayıtlı sonuçları yok say ve yeniden hesapla
             
         Returns:
             List of results for each model
         """
         import asyncio
         
-        # Paralel işlenecek taskler
-        tasks = []
-        
-        for ocr_result in ocr_results:
-            model_name = ocr_result.get("model_name", "Unknown")
-            text_content = ocr_result.get("text_content", "")
-            entities = ocr_result.get("entities")
-            structured_data = ocr_result.get("structured_data")
-            error = ocr_result.get("error")
-            
-            # Eğer OCR'da hata varsa veya metin yoksa, boş result döndüren coroutine oluştur
-            if error or not text_content or text_content.strip() == "":
-                # Closure variable capture için lambda kullan
-                async def _create_empty_result(name=model_name, err=error):
-                    return {
-                        "model_name": name,
-                        "accounting_data": {
-                            "line_items": [],
-                            "vat_breakdown": []
-                        },  # Boş V1 format
-                        "raw_gpt_response": None,
-                        "processing_time_ms": 0,
-                        "estimated_cost": 0.0,
-                        "error": err or "OCR metni bulunamadı"
-                    }
-                tasks.append(_create_empty_result())
+        persist = analysis_id is not None and db is not None
+        keys = [self.result_key(r) for r in ocr_results] if persist else []
+        stored = await self._load_stored_results(db, analysis_id) if persist and not force else {}
+        
+        final_results: List[Optional[Dict[str, Any]]] = [None] * len(ocr_results)
+        pending = []
+        for i in range(len(ocr_results)):
+            row = stored.get(keys[i]) if stored else None
+            if row is not None:
+                final_results[i] = self._row_to_result(row)
             else:
-                # Bu model için muhasebe verisi çıkar (entities dahil) - paralel
-                tasks.append(self._extract_for_single_model(model_name, text_content, entities, structured_data))
+                pending.append(i)
+        
+        if len(pending) < len(ocr_results):
+            logger.info(f"♻️ {len(ocr_results) - len(pending)} model için kayıtlı muhasebe sonucu kullanıldı")
+        
+        if persist and force:
+            # Yeniden hesaplanacak kayıtların eskilerini sil (unique index)
+            for i in pending:
+                await db.execute(delete(AccountingResult).where(
+                    AccountingResult.analysis_id == analysis_id,
+                    *self._key_filter(keys[i])
+                ))
+        
+        # Paralel işlenecek taskler
+        tasks = [self.extract_for_ocr_result(ocr_results[i]) for i in pending]
         
         # Tüm modelleri PARALEL işle (60 saniye yerine ~15 saniyede biter!)
         logger.info(f"🚀 Processing {len(tasks)} models in PARALLEL...")
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # Exception'ları yakala ve error olarak döndür
-        final_results = []
-        for i, result in enumerate(results):
+        for i, result in zip(pending, results):
             if isinstance(result, Exception):
                 logger.error(f"❌ Model {i} failed: {result}")
-                final_results.append({
-                    "model_name": ocr_results[i].get("model_name", "Unknown"),
-                    "accounting_data": {"line_items": [], "vat_breakdown": []},
-                    "raw_gpt_response": None,
-                    "processing_time_ms": 0,
-                    "estimated_cost": 0.0,
-                    "error": str(result)
-                })
+                final_results[i] = self._empty_result(ocr_results[i].get("model_name", "Unknown"), str(result))
             else:
-                final_results.append(result)
+                final_results[i] = result
+                if persist:
+                    await self.save_result(db, analysis_id, ocr_results[i], result)
         
         return final_results
     
+    # ==================== Kalıcı sonuçlar ====================
+    
+    def result_key(self, ocr_result: Dict[str, Any]) -> Tuple[str, str, int, str]:
+        """(OCR modeli, GPT modeli, muhasebe prompt versiyonu, OCR metin hash'i)"""
+        model_name = ocr_result.get("model_name", "Unknown")
+        text = ocr_result.get("text_content") or ""
+        return (
+            model_name,
+            self.model,
+            self.prompt_manager.get_prompt(model_name).get("version", 1),
+            hashlib.sha256(text.encode("utf-8")).hexdigest()
+        )
+    
+    @staticmethod
+    def _key_filter(key: Tuple[str, str, int, str]) -> List[Any]:
+        model_name, gpt_model, prompt_version, text_hash = key
+        return [
+            AccountingResult.model_name == model_name,
+            AccountingResult.gpt_model == gpt_model,
+            AccountingResult.prompt_version == prompt_version,
+            AccountingResult.text_hash == text_hash
+        ]
+    
+    async def _load_stored_results(
+        self,
+        db: AsyncSession,
+        analysis_id: str
+    ) -> Dict[Tuple[str, str, int, str], AccountingResult]:
+        """Analizin bu GPT modeli ile kaydedilmiş sonuçları (anahtar -> satır)"""
+        rows = await db.execute(
+            select(AccountingResult).where(
+                AccountingResult.analysis_id == analysis_id,
+                AccountingResult.gpt_model == self.model
+            )
+        )
+        return {
+            (row.model_name, row.gpt_model, row.prompt_version, row.text_hash): row
+            for row in rows.scalars().all()
+        }
+    
+    # Sonucun şeklini belirleyen alanlar (kayıtlı sonuç yeni hesaplananla aynı şekilde döner)
+    STORED_RESULT_FIELDS = ("gpt_model", "routing", "compaction", "extraction_method", "field_confidence")
+    
+    @staticmethod
+    def _row_to_result(row: AccountingResult) -> Dict[str, Any]:
+        return {
+            "model_name": row.model_name,
+            **(row.result_metadata or {}),
+            "accounting_data": row.accounting_data or {"line_items": [], "vat_breakdown": []},
+            "raw_gpt_response": row.raw_gpt_response,
+            "processing_time_ms": row.processing_time_ms,
+            "estimated_cost": row.estimated_cost or 0.0,
+            "token_usage": row.token_usage,
+            "cached": True
+        }
+    
+    async def save_result(
+        self,
+        db: AsyncSession,
+        analysis_id: str,
+        ocr_result: Dict[str, Any],
+        result: Dict[str, Any]
+    ):
+        """
+        Başarılı sonucu kaydet (upsert; commit çağırana aittir)
+        
+        Hatalı sonuçlar saklanmaz, bir sonraki çağrıda yeniden denenir. Aynı analiz için
+        eşzamanlı iki istek aynı anahtarı yazarsa unique index hatası yerine son sonuç kalır.
+        Aynı session'ı paylaşan eşzamanlı task'ler çağrıyı sıraya almalıdır.
+        """
+        if result.get("error"):
+            return
+        
+        model_name, gpt_model, prompt_version, text_hash = self.result_key(ocr_result)
+        key_values = {
+            "analysis_id": analysis_id,
+            "model_name": model_name,
+            "gpt_model": gpt_model,
+            "prompt_version": prompt_version,
+            "text_hash": text_hash
+        }
+        values = {
+            "accounting_data": result.get("accounting_data"),
+            "raw_gpt_response": result.get("raw_gpt_response"),
+            "processing_time_ms": result.get("processing_time_ms", 0),
+            "estimated_cost": result.get("estimated_cost", 0.0),
+            "token_usage": result.get("token_usage"),
+            "result_metadata": {
+                field: result[field] for field in self.STORED_RESULT_FIELDS if result.get(field) is not None
+            } or None
+        }
+        
+        dialect = {"sqlite": sqlite, "postgresql": postgresql}.get(db.get_bind().dialect.name)
+        if dialect is not None:
+            statement = dialect.insert(AccountingResult).values(**key_values, **values)
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=list(key_values),
+                set_=values
+            ))
+            return
+        
+        # ON CONFLICT desteklemeyen veritabanı: savepoint içinde ekle, çakışırsa güncelle
+        try:
+            async with db.begin_nested():
+                db.add(AccountingResult(**key_values, **values))
+        except IntegrityError:
+            row = (await db.execute(
+                select(AccountingResult).where(
+                    AccountingResult.analysis_id == analysis_id,
+                    *self._key_filter((model_name, gpt_model, prompt_version, text_hash))
+                )
+            )).scalar_one()
+            for column, value in values.items():
+                setattr(row, column, value)
+    
+    async def extract_for_ocr_result(
+        self,
+        ocr_result: Dict[str, Any],
+        on_partial: Optional[PartialCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Tek bir OCR sonucu için muhasebe verisi çıkar
+        
+        OCR hatası varsa veya metin boşsa GPT'ye gitmeden boş sonuç döner.
+        Pipeline endpoint'i her modelin OCR'ı biter bitmez bunu çağırır.
+        
+        Args:
+            ocr_result: {model_name, text_content, entities, structured_data, error}
+            on_partial: Verilirse GPT yanıtı stream edilir; tamamlanan document alanları
+                ve items[] elemanları geldikçe (olay, veri) ile çağrılır
+        """
+        model_name = ocr_result.get("model_name", "Unknown")
+        text_content = ocr_result.get("text_content", "")
+        error = ocr_result.get("error")
+        
+        if error or not text_content or text_content.strip() == "":
+            return self._empty_result(model_name, error or "OCR metni bulunamadı")
+        
+        def extract(gpt_model: Optional[str] = None) -> Awaitable[Dict[str, Any]]:
+            return self._extract_for_single_model(
+                model_name,
+                text_content,
+                ocr_result.get("entities"),
+                ocr_result.get("structured_data"),
+                gpt_model=gpt_model,
+                on_partial=on_partial
+            )
+        
+        if self.router is not None:
+            return await self._extract_with_routing(model_name, extract)
+        return await extract()
+    
+    @staticmethod
+    def _empty_result(model_name: str, error: str) -> Dict[str, Any]:
+        """Hata/boş OCR için boş V1 format sonuç"""
+        return {
+            "model_name": model_name,
+            "accounting_data": {
+                "line_items": [],
+                "vat_breakdown": []
+            },
+            "raw_gpt_response": None,
+            "processing_time_ms": 0,
+            "estimated_cost": 0.0,
+            "error": error
+        }
+
+    # ==================== Ucuzdan pahalıya yönlendirme ====================
+
+    async def _extract_with_routing(
+        self,
+        ocr_model_name: str,
+        extract: Callable[[str], Awaitable[Dict[str, Any]]],
+        to_v1: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        En ucuz GPT modeliyle başla, doğrulama başarısızsa bir üst modele yükselt
+        
+        Doğrulama V1 veri üzerinden yapılır (KDV dökümü ↔ toplamlar, kalem toplamı ↔
+        genel toplam). Maliyet, süre ve token kullanımı tüm denemelerin toplamıdır.
+        
+        Args:
+            ocr_model_name: Yükseltme istatistiği için OCR modeli
+            extract: gpt_model -> sonuç
+            to_v1: Sonucu V1 veriye çeviren fonksiyon (None = result["accounting_data"])
+        """
+        attempts: List[Dict[str, Any]] = []
+        total_cost = 0.0
+        total_time = 0.0
+        token_usage = {"input": 0, "output": 0, "total": 0, "cached": 0}
+        result: Dict[str, Any] = {}
+        
+        for gpt_model in self.router.chain:
+            result = await extract(gpt_model)
+            total_cost += result.get("estimated_cost") or 0.0
+            total_time += result.get("processing_time_ms") or 0.0
+            for key in token_usage:
+                token_usage[key] += (result.get("token_usage") or {}).get(key, 0)
+            
+            if result.get("error"):
+                issues = [f"error: {result['error']}"]
+            elif "gpt_model" not in result:
+                # GPT'siz hızlı yol (structured data / kural tabanlı): yükseltme anlamsız
+                return result
+            else:
+                issues = self.router.validate(to_v1(result) if to_v1 else result["accounting_data"])
+            
+            attempts.append({"gpt_model": gpt_model, "issues": issues})
+            if not issues:
+                break
+            logger.info(f"⬆️ {ocr_model_name}: {gpt_model} doğrulanamadı ({'; '.join(issues)})")
+        
+        self.router.record(ocr_model_name, attempts)
+        
+        return {
+            **result,
+            "processing_time_ms": total_time,
+            "estimated_cost": total_cost,
+            "token_usage": token_usage,
+            "routing": {
+                "attempts": attempts,
+                "escalated": len(attempts) > 1
+            }
+        }
+
+    # ==================== Ensemble (tek GPT çağrısı) ====================
+
+    ENSEMBLE_NAME = "ensemble"
+    ENSEMBLE_PROMPT_VERSION = 1
+
+    async def extract_ensemble(self, ocr_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Tüm OCR çıktılarını tek GPT isteğinde uzlaştır
+
+        Model bazında karşılaştırma gerekmediğinde kullanılır: sistem prompt'u bir kez
+        gönderilir, tek round trip yapılır. Sonuç tek bir V2 muhasebe verisi ve her alan
+        için hangi OCR kaynaklarından geldiğini gösteren provenance'tır.
+
+        Args:
+            ocr_results: {model_name, text_content, entities, structured_data, error} listesi
+
+        Returns:
+            {accounting_data (V2), provenance, conflicts, sources, token_usage, estimated_cost, ...}
+        """
+        sources = [
+            r for r in ocr_results
+            if not r.get("error") and (
+                (r.get("text_content") or "").strip() or isinstance(r.get("structured_data"), dict)
+            )
+        ]
+
+        if not sources:
+            return {
+                **self._empty_result(self.ENSEMBLE_NAME, "Kullanılabilir OCR çıktısı bulunamadı"),
+                "accounting_data": {},
+                "provenance": {},
+                "conflicts": [],
+                "sources": []
+            }
+
+        def extract(gpt_model: Optional[str] = None) -> Awaitable[Dict[str, Any]]:
+            return self._extract_ensemble_with_model(sources, gpt_model)
+
+        if self.router is not None:
+            return await self._extract_with_routing(
+                self.ENSEMBLE_NAME,
+                extract,
+                to_v1=lambda r: self._convert_v2_to_v1_format(self._parse_to_accounting_data(r["accounting_data"]))
+            )
+        return await extract()
+
+    async def _extract_ensemble_with_model(
+        self,
+        sources: List[Dict[str, Any]],
+        gpt_model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Ensemble çağrısını tek bir GPT modeli ile yap (cache dahil)"""
+        start_time = time.time()
+        gpt_model = gpt_model or self.model
+        source_names = [r.get("model_name", "Unknown") for r in sources]
+        sources_section = self._create_ensemble_sources_section(sources)
+
+        # Aynı OCR çıktıları seti daha önce uzlaştırıldıysa tekrar ödeme yapma
+        cache_key = None
+        cache_meta: Dict[str, Any] = {}
+        if self.result_cache is not None:
+            cache_meta = {
+                "model_name": self.ENSEMBLE_NAME,
+                "gpt_model": gpt_model,
+                "prompt_version": self.ENSEMBLE_PROMPT_VERSION,
+                "temperature": self.temperature
+            }
+            cache_key = self.result_cache.make_key(sources_section, **cache_meta)
+            cached_result = await self.result_cache.aget(cache_key)
+            if cached_result is not None:
+                logger.info(f"♻️ Ensemble muhasebe cache hit ({', '.join(source_names)}), GPT çağrısı atlandı")
+                return {
+                    **cached_result,
+                    "gpt_model": gpt_model,
+                    "processing_time_ms": (time.time() - start_time) * 1000,
+                    "estimated_cost": 0.0,
+                    "cached": True
+                }
+
+        messages = [
+            {"role": "system", "content": self._create_ensemble_system_prompt()},
+            {"role": "user", "content": sources_section}
+        ]
+
+        logger.info(f"🧩 Ensemble accounting ({gpt_model}): {len(sources)} OCR kaynağı tek istekte ({', '.join(source_names)})")
+
+        try:
+            response = await self._call_gpt(messages, gpt_model)
+            raw_response = response.choices[0].message.content
+
+            try:
+                parsed, repair_flags = parse_gpt_json(raw_response, f"accounting/{self.ENSEMBLE_NAME}")
+            except json.JSONDecodeError as e:
+                logger.error(f"❌ Ensemble JSON parse error: {e}")
+                raise Exception(f"GPT invalid JSON döndürdü: {str(e)}")
+
+            result_data = parsed.get("result") if isinstance(parsed.get("result"), dict) else parsed
+            normalized_data = get_schema_registry().parse_with_auto_detection(result_data)
+            self._add_validation_flags(normalized_data, repair_flags)
+            accounting_data = self._parse_to_accounting_data(normalized_data)
+
+            token_usage = self._token_usage(response.usage)
+
+            result = {
+                "model_name": self.ENSEMBLE_NAME,
+                "accounting_data": accounting_data.model_dump(by_alias=True),
+                "provenance": self._clean_provenance(parsed.get("provenance"), source_names),
+                "conflicts": [str(c) for c in parsed.get("conflicts") or []],
+                "sources": source_names,
+                "gpt_model": gpt_model,
+                "raw_gpt_response": raw_response,
+                "processing_time_ms": (time.time() - start_time) * 1000,
+                "estimated_cost": self._calculate_cost(
+                    token_usage["input"], token_usage["output"], gpt_model, token_usage["cached"]
+                ),
+                "token_usage": token_usage
+            }
+
+            logger.info(f"✅ Ensemble: {len(accounting_data.items)} items, "
+                       f"{len(result['provenance'])} alan provenance, {len(result['conflicts'])} çelişki")
+
+            if cache_key is not None:
+                try:
+                    await self.result_cache.aput(cache_key, result, **cache_meta)
+                except Exception as cache_error:
+                    logger.warning(f"⚠️ Accounting cache write failed: {cache_error}")
+
+            return result
+
+        except Exception as e:
+            logger.error(f"❌ Ensemble accounting extraction error: {str(e)}")
+            return {
+                **self._empty_result(self.ENSEMBLE_NAME, str(e)),
+                "accounting_data": {},
+                "provenance": {},
+                "conflicts": [],
+                "sources": source_names,
+                "processing_time_ms": (time.time() - start_time) * 1000
+            }
+
+    def _create_ensemble_sources_section(self, sources: List[Dict[str, Any]]) -> str:
+        """Her OCR kaynağını (metin + entity + structured data) etiketli blok olarak birleştir"""
+        blocks = []
+        for source in sources:
+            model_name = source.get("model_name", "Unknown")
+            text = source.get("text_content") or ""
+            entities = source.get("entities")
+            structured_data = source.get("structured_data")
+
+            if self.text_compactor is not None:
+                text, _ = self.text_compactor.compact(text)
+
+            block = [f"### KAYNAK: {model_name}", "OCR METNİ:", text]
+            if entities:
+                if self.text_compactor is not None:
+                    entities_json = self.text_compactor.serialize_entities(entities)
+                else:
+                    entities_json = json.dumps(entities, ensure_ascii=False, separators=(",", ":"))
+                block += ["ENTİTİLER:", entities_json]
+            if isinstance(structured_data, dict):
+                block += ["YAPISAL VERİ:", json.dumps(structured_data, ensure_ascii=False, separators=(",", ":"))]
+            blocks.append("\n".join(block))
+
+        return "\n\n".join(blocks)
+
+    @staticmethod
+    def _create_ensemble_system_prompt() -> str:
+        """Uzlaştırma (reconciliation) sistem prompt'u"""
+        return """Sen elit seviye bir Türk muhasebe uzmanısın. Aynı fişin/faturanın FARKLI OCR
+modelleriyle okunmuş çıktılarını alacaksın (her biri "### KAYNAK: <model>" başlığıyla).
+
+📋 GÖREVİN:
+1. Tüm kaynakları karşılaştır, her alan için en güvenilir değeri seç
+2. Kaynaklar çelişiyorsa çoğunluğa ve matematiksel tutarlılığa göre karar ver
+   (ör. grand total = kalemler toplamı, KDV dökümü = toplam KDV)
+3. YAPISAL VERİ içeren kaynaklar genelde daha güvenilirdir, ama metinle çelişirse metni kontrol et
+4. Türkçe karakter ve rakam OCR hatalarını diğer kaynaklarla düzelt
+5. Sonucu V2 muhasebe şemasında döndür
+
+📦 ÇIKTI (SADECE JSON):
+{
+  "result": {
+    "metadata": {"source", "ocrQualityScore", "classification", "vatTreatment", "notes"},
+    "document": {"merchantName", "merchantVKN", "merchantTCKN", "address", "date" (DD/MM/YYYY),
+                 "time" (HH:MM), "receiptNo", "plate", "invoiceNo", "mersisNo"},
+    "items": [{"description", "quantity", "unitPrice", "grossAmount", "netAmount", "vatRate",
+               "vatAmount", "discountAmount", "accountCode", "itemType", "confidence"}],
+    "extraTaxes": [{"type", "amount"}],
+    "totals": {"vatBreakdown": [{"vatRate", "taxBase", "vatAmount"}], "totalVat", "totalAmount",
+               "paymentAccountCode", "currency"},
+    "paymentLines": [{"method", "amount", "accountCode"}],
+    "entryLines": [{"accountCode", "debit", "credit", "description"}],
+    "validationFlags": [], "errorFlags": []
+  },
+  "provenance": {
+    "document.merchantName": ["<değeri destekleyen kaynak model adları>"],
+    "document.date": ["..."],
+    "totals.totalAmount": ["..."],
+    "items[0]": ["..."]
+  },
+  "conflicts": ["<alan>: <kaynak>=<değer> vs <kaynak>=<değer> -> <seçilen ve nedeni>"]
+}
+
+⚠️ KURALLAR:
+- provenance: result içindeki her dolu document/totals alanı ve her item için, değeri destekleyen kaynakları listele
+- Kaynak adlarını başlıklarda yazdığı gibi kullan
+- Sayısal değerler number tipinde, bulunamayan değerler null
+- KDV oranları: 0, 1, 10, 20 (eski %8 → %10, %18 → %20)"""
+
+    @staticmethod
+    def _clean_provenance(provenance: Any, source_names: List[str]) -> Dict[str, List[str]]:
+        """Provenance'tan bilinmeyen kaynak adlarını ve boş alanları at"""
+        if not isinstance(provenance, dict):
+            return {}
+
+        known = set(source_names)
+        cleaned = {}
+        for field, models in provenance.items():
+            if isinstance(models, str):
+                models = [models]
+            if not isinstance(models, list):
+                continue
+            models = [m for m in models if m in known]
+            if models:
+                cleaned[str(field)] = models
+        return cleaned
+
     async def _extract_for_single_model(
         self,
         model_name: str,
         text_content: str,
         entities: Optional[List[Dict]] = None,
-        structured_data: Optional[Dict] = None
+        structured_data: Optional[Dict] = None,
+        gpt_model: Optional[str] = None,
+        on_partial: Optional[PartialCallback] = None
     ) -> Dict[str, Any]:
         """
         Tek bir model için muhasebe verisi çıkar
@@ -121,11 +895,14 @@ class AccountingService:
             text_content: OCR metni
             entities: Entities (Google DocAI için)
             structured_data: Yapılandırılmış veri (OpenAI Vision için)
+            gpt_model: GPT modeli (None = self.model; yönlendirici her kademe için verir)
+            on_partial: Streaming callback (None = tam yanıtı bekle)
             
         Returns:
             Dict containing accounting data for this model
         """
         start_time = time.time()
+        gpt_model = gpt_model or self.model
         
         # ⚡ OPTIMIZATION: Eğer model zaten V2 formatında structured data döndürmüşse, direkt kullan!
         if structured_data:
@@ -133,7 +910,9 @@ class AccountingService:
             logger.debug(f"   Keys: {list(structured_data.keys()) if isinstance(structured_data, dict) else 'Not a dict'}")
         
         if structured_data and isinstance(structured_data, dict):
-            if all(key in structured_data for key in ["metadata", "document", "items", "totals"]):
+            # Kesilmiş yanıttan kısmen kurtarılmış veri direkt kullanılmaz, GPT ile tamamlanır
+            partial = FLAG_PARTIAL in (structured_data.get("validationFlags") or [])
+            if not partial and all(key in structured_data for key in ["metadata", "document", "items", "totals"]):
                 logger.info(f"🚀 {model_name} zaten V2 formatında JSON döndürmüş, GPT'ye göndermeden direkt kullanıyorum!")
                 
                 # Model-specific parser ile normalize et
@@ -176,127 +955,84 @@ class AccountingService:
                     }
                 }
         
-        # GPT'ye gönderilecek prompt (entities ve structured_data dahil)
-        prompt = self._create_accounting_prompt_single(model_name, text_content, entities, structured_data)
+        prompt_entities = entities
         
-        # DEBUG: Hangi prompt kullanıldığını logla
-        logger.info(f"🎯 Creating prompt for model: {model_name}")
-        logger.debug(f"   Prompt preview (first 100 chars): {prompt[:100]}")
+        # ⚡ Sağlayıcı yapısal çıktısı: doğrulanırsa GPT'ye gitme, aksi halde GPT sadece eksikleri tamamlar
+        if self.provider_validator is not None:
+            provider_data = map_provider_output(model_name, entities, structured_data)
+            if provider_data is not None:
+                provider_result, missing_fields = self._try_provider_mapping(model_name, provider_data, start_time)
+                if provider_result is not None:
+                    return provider_result
+                # Entity'ler eşlenmiş veride zaten var, prompt'a ikinci kez girmesin
+                structured_data = {**provider_data, "missingFields": missing_fields}
+                prompt_entities = None
+        
+        # ⚡ Kural tabanlı hızlı yol: zorunlu alanlar doğrulanırsa GPT'ye gitme
+        if self.local_extractor is not None:
+            local_result = self._try_local_extraction(model_name, text_content, start_time)
+            if local_result is not None:
+                return local_result
+        
+        # Aynı OCR metni daha önce aynı model/prompt/GPT ayarlarıyla işlendiyse tekrar ödeme yapma
+        cache_key = None
+        cache_meta: Dict[str, Any] = {}
+        if self.result_cache is not None:
+            cache_meta = {
+                "model_name": model_name,
+                "gpt_model": gpt_model,
+                "prompt_version": self.prompt_manager.get_prompt(model_name).get("version", 1),
+                "temperature": self.temperature
+            }
+            # Prompt metnini / response_format'ı değiştiren ayarlar da anahtara girer
+            variant = {
+                "structured_output": self.structured_output,
+                "compaction": self.text_compactor.settings() if self.text_compactor is not None else None,
+                "prompt_entities": prompt_entities is not None,
+                "structured_data": structured_data
+            }
+            cache_key = self.result_cache.make_key(text_content, entities=entities, variant=variant, **cache_meta)
+            cached_result = await self.result_cache.aget(cache_key)
+            if cached_result is not None:
+                logger.info(f"♻️ {model_name} muhasebe cache hit, GPT çağrısı atlandı")
+                return {
+                    **cached_result,
+                    "model_name": model_name,
+                    "gpt_model": gpt_model,
+                    "processing_time_ms": (time.time() - start_time) * 1000,
+                    "estimated_cost": 0.0,
+                    "token_usage": {"input": 0, "output": 0, "total": 0},
+                    "cached": True
+                }
+        
+        # OCR metnini sıkıştır (tekrar/süs satırları, sayı formatları) - input token tasarrufu
+        compaction_stats = None
+        if self.text_compactor is not None:
+            text_content, compaction_stats = self._compact_ocr_input(model_name, text_content, prompt_entities)
         
         try:
-            # GPT API çağrısı (structured output)
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"""Sen elit seviye bir Türk muhasebe ve finansal analiz uzmanısın.
-
-🎯 UZMANLIKLARIN:
-- Fiş/Fatura OCR çıktılarını analiz etme
-- Yapılandırılmış muhasebe verisi çıkarma
-- KDV hesaplamaları ve vergi mevzuatı
-- Hata düzeltme ve veri doğrulama
-- Akıllı veri yorumlama
-
-📋 GÖREVİN:
-1. **OCR Metni Analizi**: OCR çıktısını dikkatlice oku (kaynak: {model_name})
-2. **Veri Çıkarımı**: Tüm kritik bilgileri çıkar (VKN, firma, tarih, ürünler, tutarlar)
-3. **KDV Ayrıştırma**: Her KDV oranı için (0%, 1%, 10%, 20%) ayrı breakdown oluştur
-4. **Doğrulama**: Matematiksel tutarlılık kontrol et
-5. **JSON Dönüşümü**: Belirtilen şemaya uygun JSON döndür
-
-⚠️ KRİTİK KURALLAR:
-- Sayısal değerler MUTLAKA number tipinde ("123.45" YANLIŞ, 123.45 DOĞRU)
-- Bulunamayan veya şüpheli değerler için null kullan (boş string "" YASAK)
-- Tüm tutarlar TL cinsinden decimal olmalı
-- JSON şemasına TAM UYUM (eksik veya fazla field YASAK)
-
-🧮 MATEMATİK KONTROL:
-- Hedef: grand_total = subtotal + total_vat
-- Her line_item: total_price = unit_price * quantity
-- OCR kalitesi düşükse, fişte basılı toplam tutara öncelik ver
-- Tutarsızlık varsa, en güvenilir değeri kullan (genelde fiş altındaki toplam)
-- vat_breakdown toplamı ~= total_vat olmalı (küçük yuvarlama farkları kabul edilebilir)
-
-🎯 MODEL-SPECIFIC TALİMATLAR ÖNCELİKLİDİR:
-Aşağıdaki user mesajında bu OCR modeline özel talimatlar var.
-O talimatlara MUTLAKA uy - bu genel kurallardan daha ÖNCELİKLİDİR.
-Her OCR modelinin farklı güçlü/zayıf yönleri var, buna göre uyarla.
-
-🎓 KALİTE STANDARDI:
-Senin çıktın muhasebe analizine gidecek. Mümkün olan en yüksek doğruluk ve tutarlılık gerekli."""
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                response_format={"type": "json_object"},
-                temperature=self.temperature,  # Tam deterministik
-                max_tokens=self.max_tokens,  # Büyük fişler için
-                top_p=1.0,  # Determinizm için
-                frequency_penalty=0.0,  # Tekrarlara izin ver (sayılar için önemli)
-                presence_penalty=0.0  # Yeni token cezası yok
-            )
-            
-            # Yanıtı parse et
-            raw_response = response.choices[0].message.content
-            
-            # JSON'u temizle (markdown code blocks vb.)
-            cleaned_json = self._clean_json_response(raw_response)
-            
-            try:
-                parsed_data = json.loads(cleaned_json)
-            except json.JSONDecodeError as e:
-                logger.error(f"❌ JSON parse error: {e}")
-                logger.error(f"📝 Raw response (first 500 chars): {raw_response[:500]}")
-                raise Exception(f"GPT invalid JSON döndürdü: {str(e)}")
-            
-            # Model-specific parser ile dönüştür
-            prompt_data = self.prompt_manager.get_prompt(model_name)
-            prompt_version = prompt_data.get("version", 1)
-            schema_version = prompt_data.get("schema_version", "v1")
-            
-            logger.info(f"📦 Model: {model_name}, Prompt v{prompt_version}, Schema: {schema_version}")
-            
-            # Model-specific parser kullan
-            model_parser = get_model_parser(model_name)
-            normalized_data = model_parser.parse(parsed_data, prompt_version)
-            
-            # Parse sonrası kontrol
-            logger.info(f"✅ Schema parsed: {len(normalized_data.get('items', []))} items, "
-                       f"totals: {normalized_data.get('totals', {}).get('totalAmount')}")
-            logger.debug(f"   Document: {normalized_data.get('document', {}).get('merchantName')}")
-            
-            # 2. VEYA otomatik tespit (fallback)
-            # normalized_data = registry.parse_with_auto_detection(parsed_data)
-            
-            # AccountingData modeline çevir
-            accounting_data = self._parse_to_accounting_data(normalized_data)
-            
-            # ⚡ CRITICAL: Frontend V1 formatı bekliyor, V2'yi V1'e çevir
-            accounting_data_v1 = self._convert_v2_to_v1_format(accounting_data)
+            messages = self._build_messages(model_name, text_content, prompt_entities, structured_data)
+            response_format = self._response_format()
+            if on_partial is not None:
+                # Streaming: document alanları ve kalemler tamamlandıkça callback'e gider
+                raw_response, usage = await self._call_gpt_stream(
+                    messages, on_partial, gpt_model, response_format
+                )
+            else:
+                response = await self._call_gpt(messages, gpt_model, response_format)
+                raw_response, usage = response.choices[0].message.content, response.usage
             
-            # Maliyet hesapla
-            input_tokens = response.usage.prompt_tokens
-            output_tokens = response.usage.completion_tokens
-            cost = self._calculate_cost(input_tokens, output_tokens)
+            result = self.build_result(model_name, gpt_model, raw_response, usage, start_time)
+            if compaction_stats:
+                result["compaction"] = compaction_stats
             
-            processing_time = (time.time() - start_time) * 1000
+            if cache_key is not None:
+                try:
+                    await self.result_cache.aput(cache_key, result, **cache_meta)
+                except Exception as cache_error:
+                    logger.warning(f"⚠️ Accounting cache write failed: {cache_error}")
             
-            return {
-                "model_name": model_name,
-                "accounting_data": accounting_data_v1,  # ← V1 format (dict)
-                "raw_gpt_response": raw_response,
-                "processing_time_ms": processing_time,
-                "estimated_cost": cost,
-                "token_usage": {
-                    "input": input_tokens,
-                    "output": output_tokens,
-                    "total": input_tokens + output_tokens
-                }
-            }
+            return result
             
         except Exception as e:
             processing_time = (time.time() - start_time) * 1000
@@ -316,6 +1052,392 @@ Senin çıktın muhasebe analizine gidecek. Mümkün olan en yüksek doğruluk v
                 "error": str(e)
             }
     
+    def build_request(
+        self,
+        model_name: str,
+        text_content: str,
+        entities: Optional[List[Dict]] = None,
+        structured_data: Optional[Dict] = None,
+        gpt_model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Tek OCR sonucu için chat.completions.create parametreleri (Batch API satırı)
+        
+        İnteraktif yol ile aynı sıkıştırma, prompt ve response_format kullanılır;
+        yanıt build_result ile aynı şekilde sonuca çevrilir.
+        """
+        if self.text_compactor is not None:
+            text_content, _ = self._compact_ocr_input(model_name, text_content, entities)
+        messages = self._build_messages(model_name, text_content, entities, structured_data)
+        return self._completion_options(messages, gpt_model or self.model, self._response_format())
+    
+    def build_result(
+        self,
+        model_name: str,
+        gpt_model: str,
+        raw_response: str,
+        usage: Any,
+        start_time: float
+    ) -> Dict[str, Any]:
+        """
+        GPT yanıtını V1 muhasebe sonucuna çevir (interaktif, streaming ve Batch API ortak)
+        
+        Raises:
+            Exception: Yanıt JSON olarak kurtarılamazsa
+        """
+        # JSON'u temizle (markdown code blocks vb.), bozuk/kesilmiş ise yerel olarak onar
+        try:
+            parsed_data, repair_flags = parse_gpt_json(raw_response, f"accounting/{model_name}")
+        except json.JSONDecodeError as e:
+            logger.error(f"❌ JSON parse error: {e}")
+            logger.error(f"📝 Raw response (first 500 chars): {(raw_response or '')[:500]}")
+            raise Exception(f"GPT invalid JSON döndürdü: {str(e)}")
+        
+        # Model-specific parser ile dönüştür
+        prompt_data = self.prompt_manager.get_prompt(model_name)
+        prompt_version = prompt_data.get("version", 1)
+        schema_version = prompt_data.get("schema_version", "v1")
+        
+        logger.info(f"📦 Model: {model_name}, Prompt v{prompt_version}, Schema: {schema_version}")
+        
+        if self.structured_output:
+            # Çıktı şema gereği zaten V2, V1 prompt'una göre yazılmış model parser'ı atla
+            normalized_data = get_schema_registry().parse_with_auto_detection(parsed_data)
+        else:
+            # Model-specific parser kullan
+            model_parser = get_model_parser(model_name)
+            normalized_data = model_parser.parse(parsed_data, prompt_version)
+        
+        # Parse sonrası kontrol
+        logger.info(f"✅ Schema parsed: {len(normalized_data.get('items', []))} items, "
+                   f"totals: {normalized_data.get('totals', {}).get('totalAmount')}")
+        logger.debug(f"   Document: {normalized_data.get('document', {}).get('merchantName')}")
+        self._add_validation_flags(normalized_data, repair_flags)
+        
+        # 2. VEYA otomatik tespit (fallback)
+        # normalized_data = registry.parse_with_auto_detection(parsed_data)
+        
+        # AccountingData modeline çevir
+        accounting_data = self._parse_to_accounting_data(normalized_data)
+        
+        # ⚡ CRITICAL: Frontend V1 formatı bekliyor, V2'yi V1'e çevir
+        accounting_data_v1 = self._convert_v2_to_v1_format(accounting_data)
+        
+        # Maliyet hesapla (prefix cache'ten gelen input token'lar indirimli)
+        token_usage = self._token_usage(usage)
+        cost = self._calculate_cost(
+            token_usage["input"], token_usage["output"], gpt_model, token_usage["cached"]
+        )
+        
+        return {
+            "model_name": model_name,
+            "gpt_model": gpt_model,
+            "accounting_data": accounting_data_v1,  # ← V1 format (dict)
+            "raw_gpt_response": raw_response,
+            "processing_time_ms": (time.time() - start_time) * 1000,
+            "estimated_cost": cost,
+            "token_usage": token_usage
+        }
+    
+    def _build_messages(
+        self,
+        model_name: str,
+        text_content: str,
+        entities: Optional[List[Dict]] = None,
+        structured_data: Optional[Dict] = None
+    ) -> List[Dict[str, str]]:
+        """System + user mesajları (statik içerik önde, fişe özel içerik sonda)"""
+        # GPT'ye gönderilecek prompt: statik model prefix'i + fişe özel kısım (entities, structured_data, OCR metni)
+        prompt = (
+            self._create_accounting_prompt_prefix(model_name)
+            + self._create_accounting_prompt_single(model_name, text_content, entities, structured_data)
+        )
+        
+        # DEBUG: Hangi prompt kullanıldığını logla
+        logger.info(f"🎯 Creating prompt for model: {model_name}")
+        logger.debug(f"   Prompt preview (first 100 chars): {prompt[:100]}")
+        
+        # Sağlayıcı tarafı prefix cache aynı OCR modelinin tüm isteklerinde devreye girer
+        return [
+            {"role": "system", "content": ACCOUNTING_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _response_format(self) -> Optional[Dict[str, Any]]:
+        """Structured output açıksa strict V2 JSON şeması (None = json_object)"""
+        return accounting_response_format() if self.structured_output else None
+    
+    def _try_local_extraction(
+        self,
+        model_name: str,
+        text_content: str,
+        start_time: float
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Kural tabanlı çıkarımı dene; doğrulama geçerse sonuç döner, aksi halde None
+        
+        Zorunlu kontroller: geçerli VKN/TCKN, tarih, toplam, KDV dökümü ve
+        kalemlerin KDV/toplam ile uzlaşması (bkz. RuleBasedExtractor.validate).
+        """
+        try:
+            local_data = self.local_extractor.extract(text_content)
+            passed, issues = self.local_extractor.validate(local_data)
+        except Exception as e:
+            logger.warning(f"⚠️ Rule-based extraction error for {model_name}: {e}")
+            return None
+        
+        if not passed:
+            logger.debug(f"   Rule-based extraction rejected for {model_name}: {issues}")
+            return None
+        
+        accounting_data = self._parse_to_accounting_data(local_data)
+        accounting_data_v1 = self._convert_v2_to_v1_format(accounting_data)
+        processing_time = (time.time() - start_time) * 1000
+        
+        logger.info(f"⚡ {model_name} kural tabanlı çıkarım doğrulandı, GPT atlandı "
+                   f"({len(local_data['items'])} items, {processing_time:.1f}ms)")
+        
+        return {
+            "model_name": model_name,
+            "accounting_data": accounting_data_v1,
+            "raw_gpt_response": json.dumps(local_data, ensure_ascii=False),
+            "processing_time_ms": processing_time,
+            "estimated_cost": 0.0,
+            "token_usage": {"input": 0, "output": 0, "total": 0},
+            "extraction_method": "rule_based",
+            "field_confidence": local_data["fieldConfidence"]
+        }
+    
+    def _try_provider_mapping(
+        self,
+        model_name: str,
+        provider_data: Dict[str, Any],
+        start_time: float
+    ) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """
+        Sağlayıcıdan eşlenen V2 veriyi kural tabanlı çıkarımla aynı kontrollerden geçir
+        
+        Returns:
+            (doğrulandıysa sonuç, aksi halde None; başarısız kontrol listesi)
+        """
+        passed, issues = self.provider_validator.validate(provider_data)
+        if not passed:
+            logger.info(f"🧩 {model_name} sağlayıcı çıktısı eksik ({', '.join(issues)}), GPT tamamlayacak")
+            return None, issues
+        
+        accounting_data = self._parse_to_accounting_data(provider_data)
+        accounting_data_v1 = self._convert_v2_to_v1_format(accounting_data)
+        processing_time = (time.time() - start_time) * 1000
+        
+        logger.info(f"⚡ {model_name} sağlayıcı alanları doğrulandı, GPT atlandı "
+                   f"({len(provider_data['items'])} items, {processing_time:.1f}ms)")
+        
+        return {
+            "model_name": model_name,
+            "accounting_data": accounting_data_v1,
+            "raw_gpt_response": json.dumps(provider_data, ensure_ascii=False),
+            "processing_time_ms": processing_time,
+            "estimated_cost": 0.0,
+            "token_usage": {"input": 0, "output": 0, "total": 0},
+            "extraction_method": "provider_native",
+            "field_confidence": provider_data["fieldConfidence"]
+        }, []
+    
+    def _compact_ocr_input(
+        self,
+        model_name: str,
+        text_content: str,
+        entities: Optional[List[Dict]] = None
+    ) -> tuple[str, Dict[str, Any]]:
+        """
+        OCR metnini sıkıştır ve token tasarrufunu ölç
+        
+        Ölçüm, prompt'a giren OCR metni + entity JSON'u üzerinden yapılır
+        (eski: ham metin + indent=2 JSON, yeni: sıkıştırılmış metin + kompakt JSON).
+        """
+        compacted_text, line_stats = self.text_compactor.compact(text_content)
+        
+        original = text_content
+        compacted = compacted_text
+        if entities:
+            original += json.dumps(entities, ensure_ascii=False, indent=2)
+            compacted += self.text_compactor.serialize_entities(entities)
+        
+        original_tokens = self.prompt_manager.count_tokens(original)
+        compacted_tokens = self.prompt_manager.count_tokens(compacted)
+        stats = {
+            **line_stats,
+            "original_tokens": original_tokens,
+            "compacted_tokens": compacted_tokens,
+            "tokens_saved": original_tokens - compacted_tokens
+        }
+        
+        logger.info(f"✂️ {model_name} OCR compaction: {original_tokens} → {compacted_tokens} tokens "
+                   f"(-{stats['tokens_saved']}), {line_stats['lines_in']} → {line_stats['lines_out']} lines")
+        return compacted_text, stats
+
+    async def _call_gpt(
+        self,
+        messages: List[Dict[str, str]],
+        gpt_model: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Scheduler üzerinden GPT çağrısı (JSON output)
+        
+        TPM/RPM bütçesinden yer ayırır (limit doluysa öncelik sırasına göre bekler),
+        yanıt gelince rezervasyonu gerçek kullanım ile günceller. Hata olursa tahmini
+        tüketim pencerede kalır (429 sonrası doğal geri çekilme).
+        
+        response_format verilmezse json_object kullanılır (structured output için json_schema).
+        """
+        gpt_model = gpt_model or self.model
+        reservation = await self.scheduler.acquire(
+            gpt_model, self._estimate_request_tokens(messages), self.priority
+        )
+        response = await self.client.chat.completions.create(
+            **self._completion_options(messages, gpt_model, response_format)
+        )
+        self.scheduler.settle(reservation, response.usage.total_tokens if response.usage else None)
+        return response
+    
+    async def _call_gpt_stream(
+        self,
+        messages: List[Dict[str, str]],
+        on_partial: PartialCallback,
+        gpt_model: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, Any]:
+        """
+        _call_gpt'nin streaming versiyonu
+        
+        Token akışı artımlı JSON parser'dan geçer; tamamlanan document alanları,
+        items[] elemanları ve üst seviye bölümler anında on_partial'a iletilir.
+        
+        Returns:
+            (tam yanıt metni, usage) - usage son chunk'ta gelir (include_usage)
+        """
+        gpt_model = gpt_model or self.model
+        reservation = await self.scheduler.acquire(
+            gpt_model, self._estimate_request_tokens(messages), self.priority
+        )
+        stream = await self.client.chat.completions.create(
+            **self._completion_options(messages, gpt_model, response_format),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        
+        parser = IncrementalJSONParser()
+        usage = None
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                for event, data in parser.feed(delta):
+                    await on_partial(event, data)
+        
+        self.scheduler.settle(reservation, usage.total_tokens if usage else None)
+        return parser.text, usage
+    
+    def _completion_options(
+        self,
+        messages: List[Dict[str, str]],
+        gpt_model: str,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """chat.completions.create ortak parametreleri (normal ve streaming çağrı)"""
+        return {
+            "model": gpt_model,
+            "messages": messages,
+            "response_format": response_format or {"type": "json_object"},
+            "temperature": self.temperature,  # Tam deterministik
+            "max_tokens": self.max_tokens,  # Büyük fişler için
+            "top_p": 1.0,  # Determinizm için
+            "frequency_penalty": 0.0,  # Tekrarlara izin ver (sayılar için önemli)
+            "presence_penalty": 0.0  # Yeni token cezası yok
+        }
+    
+    def _estimate_request_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Scheduler için istek başına token tahmini: tiktoken prompt + mesaj overhead'i + max_tokens"""
+        prompt_tokens = sum(self.prompt_manager.count_tokens(m["content"]) + 4 for m in messages)
+        return prompt_tokens + self.max_tokens
+
+    def _create_accounting_prompt_prefix(self, model_name: str) -> str:
+        """
+        Muhasebe prompt'unun statik kısmı (model talimatları, şema, kurallar, örnek)
+        
+        Fişten bağımsızdır; user mesajının başında durduğu için aynı OCR modelinin
+        ardışık isteklerinde sağlayıcı tarafı prefix cache'e girer.
+        """
+        
+        # PromptManager'dan model bazında özel prompt'u al
+        prompt_data = self.prompt_manager.get_prompt(model_name)
+        model_specific_instructions = prompt_data.get("prompt", "")
+        
+        # Structured output: şema response_format ile gidiyor, prompt'taki şema/örnekler gereksiz
+        if self.structured_output:
+            model_specific_instructions = strip_json_schema_blocks(model_specific_instructions)
+            schema_section = ""
+            example_section = ""
+        else:
+            schema_section = V2_SCHEMA_PROMPT_SECTION
+            example_section = V2_EXAMPLE_PROMPT_SECTION
+        
+        return f"""📄 FİŞ ANALİZİ GÖREVİ
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+🔍 OCR KAYNAK: {model_name}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+{model_specific_instructions}
+
+{schema_section}━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+⚠️ KRİTİK KURALLAR
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+1. 🔢 TİP KURALLARI:
+   ✅ Sayılar: number (123.45) ← DOĞRU
+   ❌ Sayılar: string ("123.45") ← YANLIŞ
+   ✅ Bulunamayan: null ← DOĞRU
+   ❌ Bulunamayan: "" veya "N/A" ← YANLIŞ
+
+2. 📊 ARRAY KURALLARI:
+   ✅ line_items: [] ← Boş array DOĞRU
+   ❌ line_items: null ← YANLIŞ
+   ✅ vat_breakdown: [] ← Boş array DOĞRU
+   ❌ vat_breakdown: null ← YANLIŞ
+
+3. 🧮 MATEMATİK KURALLARI:
+   - grand_total ≈ subtotal + total_vat (±0.01 TL hata payı)
+   - line_items toplamı ≈ grand_total (±0.01 TL hata payı)
+   - Her line_item: total_price ≈ unit_price × quantity
+   - Her line_item: vat_amount ≈ total_price × (vat_rate / (100 + vat_rate))
+   
+   💡 İNDİRİM HESAPLAMA:
+   - Eğer (unit_price × quantity) > grossAmount ise:
+     discountAmount = (unit_price × quantity) - grossAmount
+   - Örnek: Birim fiyat ₺1199.99, Miktar 1, Toplam ₺839.99
+     → discountAmount = 1199.99 - 839.99 = 360.00
+   - İndirim yoksa: discountAmount = 0.0
+
+4. 📅 FORMAT KURALLARI:
+   ✅ Tarih: "14/09/2023" (DD/MM/YYYY)
+   ❌ Tarih: "2023-09-14" veya "14.09.2023"
+   ✅ VKN: "1234567890" (10 haneli, boşluksuz)
+   ❌ VKN: "123 456 7890" veya "123-456-7890"
+
+5. 🎯 KDV ORANLARI (Türkiye):
+   - %1: İhraç kayıtlı teslimlerde
+   - %8: Temel gıda, kitap, gazete
+   - %10: Akaryakıt, doğalgaz, elektrik
+   - %18: Genel oran (2018 öncesi)
+   - %20: Genel oran (2018 sonrası, güncel)
+
+{example_section}"""
+    
     def _create_accounting_prompt_single(
         self, 
         model_name: str, 
@@ -323,11 +1445,7 @@ Senin çıktın muhasebe analizine gidecek. Mümkün olan en yüksek doğruluk v
         entities: Optional[List[Dict]] = None,
         structured_data: Optional[Dict] = None
     ) -> str:
-        """Muhasebe analizi için prompt oluştur - Model bazında özelleştirilmiş"""
-        
-        # PromptManager'dan model bazında özel prompt'u al
-        prompt_data = self.prompt_manager.get_prompt(model_name)
-        model_specific_instructions = prompt_data.get("prompt", "")
+        """Muhasebe prompt'unun fişe özel kısmı (entities, structured data, OCR metni) - prefix'ten sonra gelir"""
         
         # OCR metninin uzunluğunu kontrol et
         text_preview = ocr_text[:500] if len(ocr_text) > 500 else ocr_text
@@ -336,7 +1454,10 @@ Senin çıktın muhasebe analizine gidecek. Mümkün olan en yüksek doğruluk v
         # Entities bilgisini hazırla (Google DocAI için)
         entities_section = ""
         if entities and len(entities) > 0:
-            entities_json = json.dumps(entities, ensure_ascii=False, indent=2)
+            if self.text_compactor is not None:
+                entities_json = self.text_compactor.serialize_entities(entities)
+            else:
+                entities_json = json.dumps(entities, ensure_ascii=False, indent=2)
             entities_section = f"""
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 🎯 ÇIKARILMIŞ ENTİTİLER (Google DocAI Otomatik Algılama)
@@ -355,7 +1476,17 @@ Tarih, tutar, firma adı gibi bilgiler için öncelikle bunlara bak!
             if all(key in structured_data for key in ["metadata", "document", "items", "totals"]):
                 # Direkt V2 formatı var, bunu kullan!
                 logger.info(f"✅ {model_name} zaten V2 formatında structured data döndürmüş, direkt kullanıyorum!")
-                structured_json = json.dumps(structured_data, ensure_ascii=False, indent=2)
+                missing_fields = structured_data.get("missingFields")
+                structured_json = json.dumps(
+                    {k: v for k, v in structured_data.items() if k not in ("missingFields", "fieldConfidence")},
+                    ensure_ascii=False, indent=2
+                )
+                missing_section = ""
+                if missing_fields:
+                    missing_section = f"""
+❗ EKSİK/TUTARSIZ ALANLAR: {', '.join(missing_fields)}
+Sadece bu alanları OCR metninden tamamla/düzelt; diğer alanları AYNEN koru.
+"""
                 structured_section = f"""
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 ✅ ÖN-PARSE EDİLMİŞ YAPISAL VERİ ({model_name})
@@ -366,17 +1497,9 @@ Tarih, tutar, firma adı gibi bilgiler için öncelikle bunlara bak!
 ⚡ BU VERİYİ DOĞRULA VE DÜZELT: {model_name} modeli zaten yapısal analiz yapmış.
 Bu JSON'u kontrol et, eksik/hatalı alanları düzelt, ve aynı formatta döndür.
 OCR metnini sadece eksik bilgileri tamamlamak için kullan.
-"""
+{missing_section}"""
         
-        return f"""📄 FİŞ ANALİZİ GÖREVİ
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-🔍 OCR KAYNAK: {model_name}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-{model_specific_instructions}
-
-{entities_section}
+        return f"""{entities_section}
 
 {structured_section}
 
@@ -386,278 +1509,6 @@ OCR metnini sadece eksik bilgileri tamamlamak için kullan.
 
 {ocr_text}
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📋 ZORUNLU JSON ŞEMASI
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-{{
-  "metadata": {{
-    "source": "string",                    // OCR model adı
-    "ocrQualityScore": number,            // 0.0-1.0
-    "classification": "string",           // grocery, fuel, restaurant, etc.
-    "vatTreatment": "string",             // "VAT included" veya "VAT excluded"
-    "notes": "string"
-  }},
-  
-  "document": {{
-    "merchantName": "string | null",      // Firma adı
-    "merchantVKN": "string | null",       // 10 haneli VKN
-    "merchantTCKN": "string | null",      // 11 haneli TCKN
-    "address": "string | null",
-    "date": "string | null",              // DD.MM.YYYY
-    "time": "string | null",              // HH:MM
-    "receiptNo": "string | null",
-    "plate": "string | null",
-    "invoiceNo": "string | null",
-    "mersisNo": "string | null"
-  }},
-  
-  "items": [                              // ✅ "line_items" DEĞİL "items"
-    {{
-      "description": "string",           // ✅ "name" DEĞİL "description"
-      "quantity": number,
-      "unitPrice": number,                // ✅ camelCase
-      "grossAmount": number,              // ✅ KDV dahil tutar
-      "netAmount": number,                // ✅ KDV hariç tutar
-      "vatRate": integer,                 // ✅ 0, 1, 10, 20
-      "vatAmount": number,
-      "discountAmount": number,
-      "accountCode": "string",
-      "itemType": "string",               // food, drink, fuel, etc.
-      "confidence": number                // 0.0-1.0
-    }}
-  ],
-  
-  "extraTaxes": [                         // Ek vergiler (konaklama vergisi gibi)
-    {{
-      "type": "string",
-      "amount": number
-    }}
-  ],
-  
-  "totals": {{
-    "vatBreakdown": [                     // KDV dağılımı
-      {{
-        "vatRate": integer,               // ✅ "rate" DEĞİL "vatRate"
-        "taxBase": number,                // ✅ "base_amount" DEĞİL "taxBase"
-        "vatAmount": number
-      }}
-    ],
-    "totalVat": number,
-    "totalAmount": number,                // Genel toplam
-    "paymentAccountCode": "string",
-    "currency": "TRY"
-  }},
-  
-  "paymentLines": [                       // Ödeme satırları
-    {{
-      "method": "string",                 // cash, credit_card, bank_transfer
-      "amount": number,
-      "accountCode": "string"             // 100, 108, 102
-    }}
-  ],
-  
-  "entryLines": [                         // Muhasebe yevmiye kayıtları
-    {{
-      "accountCode": "string",
-      "debit": number,
-      "credit": number,
-      "description": "string"
-    }}
-  ],
-  
-  "unprocessedLines": ["string"],       // İşlenemeyen OCR satırları
-  "validationFlags": ["string"],         // Uyarılar (ROUNDING_APPLIED, etc.)
-  "errorFlags": ["string"],              // Hatalar (TOTAL_MISMATCH, etc.)
-  
-  "stats": {{
-    "itemCount": integer,
-    "parsedLines": integer,
-    "unprocessedCount": integer
-  }}
-}}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-⚠️ KRİTİK KURALLAR
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-1. 🔢 TİP KURALLARI:
-   ✅ Sayılar: number (123.45) ← DOĞRU
-   ❌ Sayılar: string ("123.45") ← YANLIŞ
-   ✅ Bulunamayan: null ← DOĞRU
-   ❌ Bulunamayan: "" veya "N/A" ← YANLIŞ
-
-2. 📊 ARRAY KURALLARI:
-   ✅ line_items: [] ← Boş array DOĞRU
-   ❌ line_items: null ← YANLIŞ
-   ✅ vat_breakdown: [] ← Boş array DOĞRU
-   ❌ vat_breakdown: null ← YANLIŞ
-
-3. 🧮 MATEMATİK KURALLARI:
-   - grand_total ≈ subtotal + total_vat (±0.01 TL hata payı)
-   - line_items toplamı ≈ grand_total (±0.01 TL hata payı)
-   - Her line_item: total_price ≈ unit_price × quantity
-   - Her line_item: vat_amount ≈ total_price × (vat_rate / (100 + vat_rate))
-   
-   💡 İNDİRİM HESAPLAMA:
-   - Eğer (unit_price × quantity) > grossAmount ise:
-     discountAmount = (unit_price × quantity) - grossAmount
-   - Örnek: Birim fiyat ₺1199.99, Miktar 1, Toplam ₺839.99
-     → discountAmount = 1199.99 - 839.99 = 360.00
-   - İndirim yoksa: discountAmount = 0.0
-
-4. 📅 FORMAT KURALLARI:
-   ✅ Tarih: "14/09/2023" (DD/MM/YYYY)
-   ❌ Tarih: "2023-09-14" veya "14.09.2023"
-   ✅ VKN: "1234567890" (10 haneli, boşluksuz)
-   ❌ VKN: "123 456 7890" veya "123-456-7890"
-
-5. 🎯 KDV ORANLARI (Türkiye):
-   - %1: İhraç kayıtlı teslimlerde
-   - %8: Temel gıda, kitap, gazete
-   - %10: Akaryakıt, doğalgaz, elektrik
-   - %18: Genel oran (2018 öncesi)
-   - %20: Genel oran (2018 sonrası, güncel)
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📌 ÖRNEK ÇIKTI (Referans)
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-{{
-  "metadata": {{
-    "source": "paddle_ocr",
-    "ocrQualityScore": 0.85,
-    "classification": "fuel_station",
-    "vatTreatment": "VAT included",
-    "notes": ""
-  }},
-  "document": {{
-    "merchantName": "ABC Petrol A.Ş.",
-    "merchantVKN": "1234567890",
-    "merchantTCKN": null,
-    "address": "İstanbul Cad. No:15",
-    "date": "14.09.2023",
-    "time": "15:30",
-    "receiptNo": "FIS-0040",
-    "plate": "34ABC123",
-    "invoiceNo": null,
-    "mersisNo": null
-  }},
-  "items": [
-    {{
-      "description": "Motorin",
-      "quantity": 50.5,
-      "unitPrice": 34.50,
-      "grossAmount": 1742.25,
-      "netAmount": 1583.84,
-      "vatRate": 10,
-      "vatAmount": 158.41,
-      "discountAmount": 0.0,
-      "accountCode": "153",
-      "itemType": "fuel",
-      "confidence": 0.95
-    }},
-    {{
-      "description": "Kısa kol gömlek",
-      "quantity": 1.0,
-      "unitPrice": 1199.99,
-      "grossAmount": 839.99,
-      "netAmount": 763.63,
-      "vatRate": 10,
-      "vatAmount": 76.36,
-      "discountAmount": 360.0,
-      "accountCode": "153",
-      "itemType": "clothing",
-      "confidence": 0.90
-    }},
-    {{
-      "description": "Yıkama Hizmeti",
-      "quantity": 1.0,
-      "unitPrice": 100.0,
-      "grossAmount": 100.0,
-      "netAmount": 83.33,
-      "vatRate": 20,
-      "vatAmount": 16.67,
-      "discountAmount": 0.0,
-      "accountCode": "770",
-      "itemType": "service",
-      "confidence": 0.90
-    }}
-  ],
-  "extraTaxes": [],
-  "totals": {{
-    "vatBreakdown": [
-      {{
-        "vatRate": 10,
-        "taxBase": 2347.47,
-        "vatAmount": 234.77
-      }},
-      {{
-        "vatRate": 20,
-        "taxBase": 83.33,
-        "vatAmount": 16.67
-      }}
-    ],
-    "totalVat": 251.44,
-    "totalAmount": 2682.24,
-    "paymentAccountCode": "108",
-    "currency": "TRY"
-  }},
-  "paymentLines": [
-    {{
-      "method": "credit_card",
-      "amount": 2682.24,
-      "accountCode": "108"
-    }}
-  ],
-  "entryLines": [
-    {{
-      "accountCode": "153",
-      "debit": 1583.84,
-      "credit": 0.0,
-      "description": "Motorin alışı"
-    }},
-    {{
-      "accountCode": "153",
-      "debit": 763.63,
-      "credit": 0.0,
-      "description": "Gömlek alışı (İndirimli)"
-    }},
-    {{
-      "accountCode": "191",
-      "debit": 234.77,
-      "credit": 0.0,
-      "description": "İndirilecek KDV %10"
-    }},
-    {{
-      "accountCode": "770",
-      "debit": 83.33,
-      "credit": 0.0,
-      "description": "Yıkama hizmeti"
-    }},
-    {{
-      "accountCode": "191",
-      "debit": 16.67,
-      "credit": 0.0,
-      "description": "İndirilecek KDV %20"
-    }},
-    {{
-      "accountCode": "108",
-      "debit": 0.0,
-      "credit": 2682.24,
-      "description": "Kredi kartı ile ödeme"
-    }}
-  ],
-  "unprocessedLines": [],
-  "validationFlags": [],
-  "errorFlags": [],
-  "stats": {{
-    "itemCount": 3,
-    "parsedLines": 15,
-    "unprocessedCount": 0
-  }}
-}}
-
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 🎯 GÖREV: ŞİMDİ ANALİZ ET!
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -766,15 +1617,41 @@ Yukarıdaki OCR metnini analiz et ve SADECE JSON çıktı ver.
             stats=stats
         )
     
-    def _calculate_cost(self, input_tokens: int, output_tokens: int) -> float:
+    def _calculate_cost(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        gpt_model: Optional[str] = None,
+        cached_tokens: int = 0
+    ) -> float:
         """
         Seçili GPT modelinin maliyetini hesapla
         Model bazlı fiyatlandırma kullanır
+        
+        cached_tokens, input_tokens'ın prefix cache'ten gelen kısmıdır (indirimli fiyat).
         """
-        pricing = self.MODEL_PRICING.get(self.model, self.MODEL_PRICING["gpt-4o-mini"])
-        input_cost = (input_tokens / 1_000_000) * pricing["input"]
+        pricing = self.MODEL_PRICING.get(gpt_model or self.model, self.MODEL_PRICING["gpt-4o-mini"])
+        cached_tokens = min(cached_tokens or 0, input_tokens)
+        input_cost = ((input_tokens - cached_tokens) / 1_000_000) * pricing["input"]
+        cached_cost = (cached_tokens / 1_000_000) * pricing.get("cached_input", pricing["input"])
         output_cost = (output_tokens / 1_000_000) * pricing["output"]
-        return input_cost + output_cost
+        return input_cost + cached_cost + output_cost
+    
+    @staticmethod
+    def _token_usage(usage: Any) -> Dict[str, int]:
+        """OpenAI usage objesini token_usage dict'ine çevir (cached = prefix cache'ten gelen input)"""
+        if usage is None:
+            # Stream usage chunk'ı gelmeden kapandıysa
+            return {"input": 0, "output": 0, "total": 0, "cached": 0}
+        input_tokens = usage.prompt_tokens
+        output_tokens = usage.completion_tokens
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "input": input_tokens,
+            "output": output_tokens,
+            "total": input_tokens + output_tokens,
+            "cached": getattr(details, "cached_tokens", None) or 0
+        }
     
     def _calculate_vat_from_items(self, line_items: List[Dict[str, Any]]) -> tuple[List[Dict[str, Any]], Dict[str, float]]:
         """
@@ -956,6 +1833,10 @@ Yukarıdaki OCR metnini analiz et ve SADECE JSON çıktı ver.
         logger.debug(f"💰 Totals - GPT: subtotal={v1_data.get('subtotal_gpt')}, vat={v1_data.get('total_vat_gpt')}, grand={v1_data.get('grand_total_gpt')}")
         logger.debug(f"💰 Totals - Calculated: subtotal={v1_data['subtotal_calculated']}, vat={v1_data['total_vat_calculated']}, grand={v1_data['grand_total_calculated']}")
         
+        # Uyarı bayrakları (JSON onarımı vb.)
+        if accounting_data.validation_flags:
+            v1_data["validation_flags"] = list(accounting_data.validation_flags)
+        
         # Payment method (ilk payment line'dan al)
         if accounting_data.payment_lines and len(accounting_data.payment_lines) > 0:
             payment = accounting_data.payment_lines[0]
@@ -964,44 +1845,8 @@ Yukarıdaki OCR metnini analiz et ve SADECE JSON çıktı ver.
         logger.debug(f"✅ V2 -> V1 conversion complete: {len(line_items)} items")
         return v1_data
     
-    def _clean_json_response(self, response: str) -> str:
-        """
-        GPT yanıtını temizleyerek saf JSON elde eder
-        
-        GPT bazen şunları döndürebilir:
-        - ```json ... ``` (markdown code block)
-        - Açıklama metni + JSON
-        - Ekstra whitespace
-        
-        Bu metod bunları temizler.
-        """
-        import re
-        
-        # Markdown code block varsa temizle
-        if "```json" in response:
-            # ```json ve ``` arasındaki kısmı al
-            match = re.search(r'```json\s*\n(.*?)\n```', response, re.DOTALL)
-            if match:
-                response = match.group(1)
-        elif "```" in response:
-            # Sadece ``` varsa (json prefix olmadan)
-            match = re.search(r'```\s*\n(.*?)\n```', response, re.DOTALL)
-            if match:
-                response = match.group(1)
-        
-        # JSON'un başlangıcını bul ({ ile başlayan)
-        start_idx = response.find('{')
-        if start_idx == -1:
-            logger.warning("⚠️ JSON başlangıcı bulunamadı, tüm response'u kullanıyorum")
-            return response.strip()
-        
-        # JSON'un sonunu bul (son } karakteri)
-        end_idx = response.rfind('}')
-        if end_idx == -1:
-            logger.warning("⚠️ JSON sonu bulunamadı, tüm response'u kullanıyorum")
-            return response.strip()
-        
-        # Sadece JSON kısmını al
-        cleaned = response[start_idx:end_idx+1]
-        
-        return cleaned.strip()
+    @staticmethod
+    def _add_validation_flags(normalized_data: Dict[str, Any], flags: List[str]):
+        """JSON onarım bayraklarını V2 veriye ekle (kısmi kurtarılan sonuçlar işaretli kalsın)"""
+        if flags:
+            normalized_data["validationFlags"] = list(normalized_data.get("validationFlags") or []) + flags
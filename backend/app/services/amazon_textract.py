@@ -1,8 +1,8 @@
 """
 Amazon Textract Servisi - TEMİZ ve BASİT VERSİYON
-Karmaşık özellikler kaldırıldı, sadece temel OCR
+Temel OCR (detect_document_text) veya fiş analizi (analyze_expense)
 """
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import logging
 from .base import BaseOCRService
 import boto3
@@ -14,13 +14,23 @@ logger = logging.getLogger(__name__)
 class AmazonTextractService(BaseOCRService):
     """Amazon Textract servisi - Sıfırdan yazıldı"""
     
+    # Sayfa fiyatı: detect_document_text $1.50/1000 sayfa, analyze_expense $10/1000 sayfa
+    PRICE_PER_PAGE = {
+        "detect_document_text": 0.0015,
+        "analyze_expense": 0.01
+    }
+    
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.model_name = "amazon_textract"
         
-        # Fiyatlandırma
+        # AnalyzeExpense (opt-in): tipli özet alanları + kalemler (muhasebede GPT'siz V2'ye eşlenir)
+        self.expense_analysis = config.get("expense_analysis", False)
+        self.method = "analyze_expense" if self.expense_analysis else "detect_document_text"
+        
+        # Fiyatlandırma (aktif API'ye göre)
         self.pricing = {
-            "per_page": 0.0015,  # detect_document_text: $1.50/1000 sayfa
+            "per_page": self.PRICE_PER_PAGE[self.method],
             "per_1k_tokens": 0.0
         }
         
@@ -50,10 +60,14 @@ class AmazonTextractService(BaseOCRService):
     ) -> Dict[str, Any]:
         """
         Basit text extraction - detect_document_text API
+        (expense_analysis açıksa analyze_expense)
         """
         logger.info(f"Amazon Textract analysis started (image size: {len(image_bytes):,} bytes)")
         
         try:
+            if self.expense_analysis:
+                return self._analyze_expense(image_bytes)
+            
             # API çağrısı
             logger.debug("Calling detect_document_text API")
             
@@ -109,3 +123,75 @@ class AmazonTextractService(BaseOCRService):
             # Diğer hatalar
             logger.error(f"Amazon Textract unexpected error: {type(e).__name__} - {str(e)}", exc_info=True)
             raise Exception(f"Amazon Textract hatası: {str(e)}")
+    
+    def _analyze_expense(self, image_bytes: bytes) -> Dict[str, Any]:
+        """analyze_expense API: metin + tipli özet alanları ve kalem grupları"""
+        logger.debug("Calling analyze_expense API")
+        
+        response = self.client.analyze_expense(
+            Document={'Bytes': image_bytes}
+        )
+        expense_documents = response.get('ExpenseDocuments', [])
+        
+        text_lines = []
+        block_count = 0
+        for expense in expense_documents:
+            blocks = expense.get('Blocks', [])
+            block_count += len(blocks)
+            for block in blocks:
+                if block['BlockType'] == 'LINE':
+                    text_lines.append(block.get('Text', ''))
+        
+        final_text = '\n'.join(text_lines)
+        logger.info(f"Textract expense analysis completed: {len(expense_documents)} documents, {block_count} blocks")
+        
+        return {
+            "text": final_text,
+            "structured_data": {
+                "expenseDocuments": [self._compact_expense(expense) for expense in expense_documents]
+            },
+            "confidence": 0.95,
+            "token_count": None,
+            "metadata": {
+                "block_count": block_count,
+                "page_count": 1,  # Tek sayfa işleniyor
+                "method": "analyze_expense"
+            }
+        }
+    
+    def calculate_cost(self, result: Dict[str, Any]) -> float:
+        """Maliyet: sonucu üreten API'nin sayfa fiyatı ile"""
+        metadata = result.get("metadata", {})
+        per_page = self.PRICE_PER_PAGE.get(metadata.get("method"), self.pricing["per_page"])
+        return per_page * metadata.get("page_count", 1)
+    
+    @staticmethod
+    def _compact_expense(expense: Dict[str, Any]) -> Dict[str, Any]:
+        """Geometri/blok referanslarını at; sadece tip, etiket, değer ve güven kalsın"""
+        def compact_field(field: Dict[str, Any]) -> Dict[str, Any]:
+            compacted = {}
+            for key in ('Type', 'LabelDetection', 'ValueDetection'):
+                detection = field.get(key)
+                if detection:
+                    compacted[key] = {
+                        k: v for k, v in detection.items() if k in ('Text', 'Confidence')
+                    }
+            if field.get('Currency'):
+                compacted['Currency'] = {'Code': field['Currency'].get('Code')}
+            return compacted
+        
+        def compact_fields(fields: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            return [compact_field(field) for field in fields or []]
+        
+        return {
+            "SummaryFields": compact_fields(expense.get('SummaryFields')),
+            "LineItemGroups": [
+                {
+                    "LineItems": [
+                        {"LineItemExpenseFields": compact_fields(item.get('LineItemExpenseFields'))}
+                        for item in group.get('LineItems', [])
+                    ]
+                }
+                for group in expense.get('LineItemGroups', [])
+            ]
+        }
@@ -4,6 +4,7 @@ from PIL import Image
 import io
 import time
 import logging
+from .json_stream import PartialCallback
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +12,9 @@ logger = logging.getLogger(__name__)
 class BaseOCRService(ABC):
     """Tüm OCR servisleri için base sınıf"""
     
+    # process_image'ın on_partial (streaming) parametresini destekleyip desteklemediği
+    supports_streaming = False
+    
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.model_name = "base"
@@ -86,11 +90,15 @@ class BaseOCRService(ABC):
     async def analyze(
         self,
         image_bytes: bytes,
-        prompt: Optional[str] = None
+        prompt: Optional[str] = None,
+        on_partial: Optional[PartialCallback] = None
     ) -> Dict[str, Any]:
         """
         Tam analiz: ön işleme + OCR + maliyet hesaplama
         
+        on_partial verilirse ve servis streaming destekliyorsa, tamamlanan alanlar
+        (document alanları, kalemler) yanıt bitmeden callback'e iletilir.
+        
         Returns:
             {
                 "text": str,
@@ -109,7 +117,10 @@ class BaseOCRService(ABC):
             processed_bytes, preprocess_meta = self.preprocess_image(image_bytes)
             
             # OCR işleme
-            result = await self.process_image(processed_bytes, prompt)
+            if on_partial is not None and self.supports_streaming:
+                result = await self.process_image(processed_bytes, prompt, on_partial=on_partial)
+            else:
+                result = await self.process_image(processed_bytes, prompt)
             
             # Süre hesaplama
             processing_time_ms = (time.time() - start_time) * 1000
@@ -165,6 +176,10 @@ class BaseOCRService(ABC):
         
         # Token bazlı fiyatlandırma (OpenAI Vision için)
         if self.pricing["per_1k_tokens"] > 0 and result.get("token_count"):
-            cost += (result["token_count"] / 1000) * self.pricing["per_1k_tokens"]
+            # Prefix cache'ten gelen prompt token'ları ayrı (indirimli) fiyatlanır
+            cached_tokens = min(result.get("metadata", {}).get("cached_tokens") or 0, result["token_count"])
+            cached_price = self.pricing.get("per_1k_cached_tokens", self.pricing["per_1k_tokens"])
+            cost += ((result["token_count"] - cached_tokens) / 1000) * self.pricing["per_1k_tokens"]
+            cost += (cached_tokens / 1000) * cached_price
         
         return round(cost, 6)
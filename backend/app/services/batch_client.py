@@ -0,0 +1,232 @@
+"""
+Toplu GPT istekleri için değiştirilebilir batch client
+
+- OpenAIBatchClient: OpenAI Batch API (JSONL dosyası yükle, 24 saat içinde
+  tamamlanır, %50 indirimli ve interaktif rate limit'ten ayrı kota)
+- LocalBatchClient: Aynı JSONL'i yerelde işleyen yedek (test/geliştirme);
+  istekler responder'a verilir, çıktı Batch API formatında diske yazılır
+
+Her iki client da aynı arayüzü ve aynı çıktı satırı formatını kullanır:
+    {"custom_id": str, "response": {"status_code": int, "body": dict} | None, "error": dict | None}
+"""
+
+from abc import ABC, abstractmethod
+import asyncio
+import json
+import logging
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+# Batch API sabitleri
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+BATCH_DISCOUNT = 0.5  # Batch API fiyatı interaktif fiyatın yarısı
+
+# Bitmiş sayılan batch durumları
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Tek istek gövdesini (chat.completions.create parametreleri) yanıt gövdesine çeviren fonksiyon
+Responder = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def read_jsonl(path: str) -> List[Dict[str, Any]]:
+    """JSONL dosyasını satır satır oku (boş satırlar atlanır)"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def parse_jsonl(text: str) -> List[Dict[str, Any]]:
+    """JSONL metnini (Batch API çıktı dosyası) satırlara ayır"""
+    return [json.loads(line) for line in (text or "").splitlines() if line.strip()]
+
+
+class BatchClient(ABC):
+    """Batch client arayüzü"""
+
+    name = "base"
+
+    @abstractmethod
+    async def submit(self, input_path: str, metadata: Optional[Dict[str, str]] = None) -> str:
+        """JSONL istek dosyasını gönder, batch ID döndür"""
+        pass
+
+    @abstractmethod
+    async def retrieve(self, batch_id: str, input_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Batch durumu: {"status": str, "request_counts": {...}}
+
+        input_path: Gönderilen JSONL (yerel client yeniden başlatma sonrası çıktıyı bununla bulur)
+        """
+        pass
+
+    @abstractmethod
+    async def fetch_results(self, batch_id: str, input_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Tamamlanmış batch'in çıktı (ve hata) satırları"""
+        pass
+
+
+class OpenAIBatchClient(BatchClient):
+    """OpenAI Batch API"""
+
+    name = "openai"
+
+    def __init__(self, api_key: str):
+        self.client = AsyncOpenAI(api_key=api_key)
+
+    async def submit(self, input_path: str, metadata: Optional[Dict[str, str]] = None) -> str:
+        with open(input_path, "rb") as f:
+            input_file = await self.client.files.create(file=f, purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=COMPLETION_WINDOW,
+            metadata=metadata or {}
+        )
+        logger.info(f"📦 Batch submitted: {batch.id} ({os.path.basename(input_path)})")
+        return batch.id
+
+    async def retrieve(self, batch_id: str, input_path: Optional[str] = None) -> Dict[str, Any]:
+        batch = await self.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "status": batch.status,
+            "request_counts": {
+                "total": counts.total,
+                "completed": counts.completed,
+                "failed": counts.failed
+            } if counts else {},
+            "output_file_id": batch.output_file_id,
+            "error_file_id": batch.error_file_id
+        }
+
+    async def fetch_results(self, batch_id: str, input_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        info = await self.retrieve(batch_id)
+        lines: List[Dict[str, Any]] = []
+        for file_id in (info.get("output_file_id"), info.get("error_file_id")):
+            if file_id:
+                content = await self.client.files.content(file_id)
+                lines.extend(parse_jsonl(content.text))
+        return lines
+
+
+class LocalBatchClient(BatchClient):
+    """
+    Batch API yerine geçen yerel client
+
+    submit() istekleri arka planda responder ile işler (eşzamanlılık sınırlı) ve
+    çıktıyı "<girdi>.output.jsonl" dosyasına yazar; durum bu dosyadan okunur,
+    böylece sunucu yeniden başlasa da tamamlanan işler kaybolmaz.
+
+    Args:
+        responder: İstek gövdesi -> yanıt gövdesi (testlerde sahte yanıt üretir)
+        concurrency: Aynı anda işlenen istek sayısı
+    """
+
+    name = "local"
+
+    def __init__(self, responder: Responder, concurrency: int = 4):
+        self.responder = responder
+        self.concurrency = concurrency
+        self._inputs: Dict[str, str] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _output_path(input_path: str) -> str:
+        return f"{input_path}.output.jsonl"
+
+    async def submit(self, input_path: str, metadata: Optional[Dict[str, str]] = None) -> str:
+        batch_id = f"local_{uuid.uuid4().hex[:12]}"
+        self._inputs[batch_id] = input_path
+        self._tasks[batch_id] = asyncio.create_task(self._run(input_path))
+        logger.info(f"📦 Local batch started: {batch_id} ({os.path.basename(input_path)})")
+        return batch_id
+
+    async def _run(self, input_path: str):
+        requests = read_jsonl(input_path)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def handle(request: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    body = await self.responder(request["body"])
+                    return {"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}, "error": None}
+                except Exception as e:
+                    return {"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}}
+
+        lines = await asyncio.gather(*(handle(r) for r in requests))
+        tmp_path = self._output_path(input_path) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self._output_path(input_path))
+
+    def _input_path(self, batch_id: str, input_path: Optional[str] = None) -> Optional[str]:
+        return self._inputs.get(batch_id) or input_path
+
+    async def retrieve(self, batch_id: str, input_path: Optional[str] = None) -> Dict[str, Any]:
+        path = self._input_path(batch_id, input_path)
+        if path and os.path.exists(self._output_path(path)):
+            lines = read_jsonl(self._output_path(path))
+            failed = sum(1 for line in lines if line.get("error"))
+            return {
+                "status": "completed",
+                "request_counts": {"total": len(lines), "completed": len(lines) - failed, "failed": failed}
+            }
+        task = self._tasks.get(batch_id)
+        if task is not None and not task.done():
+            return {"status": "in_progress", "request_counts": {}}
+        if task is not None and task.exception():
+            return {"status": "failed", "request_counts": {}, "error": str(task.exception())}
+        # Yeniden başlatma sonrası kaybolan yerel iş
+        return {"status": "expired", "request_counts": {}}
+
+    async def fetch_results(self, batch_id: str, input_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        path = self._input_path(batch_id, input_path)
+        return read_jsonl(self._output_path(path)) if path else []
+
+
+def openai_responder(api_key: str) -> Responder:
+    """
+    Yerel client için varsayılan responder: istekleri interaktif API'ye gönderir
+
+    Toplu öncelikle GPT scheduler'dan geçer; interaktif istekler önce sıraya alınır.
+    """
+    from .gpt_scheduler import get_gpt_scheduler, PRIORITY_BULK
+
+    client = AsyncOpenAI(api_key=api_key)
+    scheduler = get_gpt_scheduler()
+
+    async def respond(body: Dict[str, Any]) -> Dict[str, Any]:
+        estimated = len(json.dumps(body.get("messages", []), ensure_ascii=False)) // 4 + body.get("max_tokens", 0)
+        reservation = await scheduler.acquire(body["model"], estimated, PRIORITY_BULK)
+        response = await client.chat.completions.create(**body)
+        scheduler.settle(reservation, response.usage.total_tokens if response.usage else None)
+        return response.model_dump()
+
+    return respond
+
+
+# Global singleton instance
+_client_instance: Optional[BatchClient] = None
+
+
+def get_batch_client() -> BatchClient:
+    """
+    Global batch client instance'ını döner (singleton pattern)
+    """
+    global _client_instance
+    from ..core.config import settings
+
+    if _client_instance is None:
+        if settings.OPENAI_BATCH_CLIENT == LocalBatchClient.name:
+            _client_instance = LocalBatchClient(openai_responder(settings.OPENAI_API_KEY))
+        else:
+            _client_instance = OpenAIBatchClient(settings.OPENAI_API_KEY)
+        logger.info(f"✅ Batch client: {_client_instance.name}")
+    return _client_instance
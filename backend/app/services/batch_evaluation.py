@@ -0,0 +1,681 @@
+"""
+Fiş kütüphanesinin toplu yeniden değerlendirilmesi (Batch API)
+
+Yeni bir prompt versiyonunu tüm Receipt kütüphanesinde denemek için istekler
+tek tek interaktif API'ye gönderilmez:
+
+1. Her fiş için Vision OCR veya muhasebe çıkarımı isteği JSONL satırı olarak yazılır
+   (interaktif yol ile aynı prompt, response_format ve parametreler)
+2. Dosya batch client ile gönderilir (OpenAI Batch API: %50 indirim, ayrı kota;
+   interaktif istekler toplu işlerle rate limit için yarışmaz)
+3. İş periyodik olarak sorgulanır, tamamlanınca sonuçlar PromptTest / OCRResult
+   satırlarına yazılır
+
+custom_id formatı: "<kind>:<target>:<target_id>[:<source_test_id>]"
+
+Vision işlerinde OPENAI_VISION_PACK_SIZE > 1 ise K fiş tek istekte gönderilir
+(statik prompt fiş başına değil paket başına ödenir). Paket satırlarının
+hedefleri "<girdi>.packs.json" yan dosyasında tutulur; yanıttan ayrıştırılamayan
+görseller tekli isteklerle bir takip batch işine (parent_job_id) alınır.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from openai.types.chat import ChatCompletion
+from sqlalchemy import select, desc, and_, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import Analysis, BatchJob, OCRResult, PromptTest, Receipt
+from ..models.schemas import OCRModelType
+from .accounting_service import AccountingService
+from .batch_client import BATCH_ENDPOINT, BATCH_DISCOUNT, TERMINAL_STATUSES, get_batch_client
+from .model_router import get_model_router, ROUTER_AUTO
+from .openai_vision import OpenAIVisionService
+from .prompt_manager import get_prompt_manager
+
+logger = logging.getLogger(__name__)
+
+
+# İş tipleri
+KIND_VISION = "vision"          # Görsel -> OpenAI Vision OCR
+KIND_ACCOUNTING = "accounting"  # Kayıtlı OCR metni -> GPT muhasebe çıkarımı
+
+# custom_id hedefleri
+TARGET_RECEIPT = "receipt"    # Sonuç PromptTest satırına yazılır
+TARGET_ANALYSIS = "analysis"  # Sonuç OCRResult satırına yazılır
+TARGET_PACK = "pack"          # Vision: K görsel tek istekte, hedefler yan dosyada
+
+VISION_MODEL_NAME = OCRModelType.OPENAI_VISION.value
+
+# Sonuçları yazma hakkını alan çağıran işi bu duruma çeker (manuel /poll ile arka plan
+# sorgulayıcısı aynı anda "completed" görse bile sonuçlar tek kez yazılır)
+STATUS_INGESTING = "ingesting"
+
+
+def make_custom_id(kind: str, target: str, target_id: str, source_id: Optional[str] = None) -> str:
+    return ":".join(part for part in (kind, target, target_id, source_id) if part)
+
+
+def parse_custom_id(custom_id: str) -> Tuple[str, str, str, Optional[str]]:
+    """custom_id -> (kind, target, target_id, source_test_id)"""
+    parts = custom_id.split(":")
+    return parts[0], parts[1], parts[2], parts[3] if len(parts) > 3 else None
+
+
+def _request_line(custom_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def _vision_service(gpt_model: Optional[str] = None) -> OpenAIVisionService:
+    from ..core.config import settings
+
+    config = settings.get_openai_config()
+    if gpt_model:
+        config = {**config, "model": gpt_model}
+    return OpenAIVisionService(config)
+
+
+def _accounting_service(gpt_model: str) -> AccountingService:
+    from ..core.config import settings
+
+    # Kural tabanlı yerel çıkarım kapalı: yeni prompt her fişte gerçekten GPT ile denenir
+    return AccountingService(api_key=settings.OPENAI_API_KEY, gpt_model=gpt_model, use_local_extractor=False)
+
+
+def _resolve_gpt_model(kind: str, gpt_model: Optional[str]) -> str:
+    """Batch'te yönlendirme yapılamaz: "auto" zincirin en ucuz modeline çevrilir"""
+    from ..core.config import settings
+
+    if kind == KIND_VISION:
+        return gpt_model or settings.OPENAI_MODEL
+    if not gpt_model or gpt_model == ROUTER_AUTO:
+        return get_model_router().chain[0]
+    return gpt_model
+
+
+def _packs_path(input_path: str) -> str:
+    return f"{input_path}.packs.json"
+
+
+def _read_packs(input_path: Optional[str]) -> Dict[str, List[List[str]]]:
+    """Paket no -> [[target, target_id, image_path], ...]"""
+    if not input_path or not os.path.exists(_packs_path(input_path)):
+        return {}
+    with open(_packs_path(input_path), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def _build_vision_lines(
+    db: AsyncSession,
+    service: OpenAIVisionService,
+    prompt: str,
+    receipt_ids: Optional[List[str]],
+    analysis_ids: Optional[List[str]],
+    pack_size: int = 1
+) -> Tuple[List[Dict[str, Any]], Dict[str, List[List[str]]], int]:
+    """
+    Fiş (ve istenirse analiz) görsellerinden Vision istek satırları
+
+    Returns:
+        (satırlar, paket hedefleri, görsel sayısı)
+    """
+    targets: List[Tuple[str, str, str]] = []
+
+    if analysis_ids:
+        result = await db.execute(select(Analysis).where(Analysis.id.in_(analysis_ids)))
+        targets += [(TARGET_ANALYSIS, a.id, a.file_path) for a in result.scalars().all()]
+    if receipt_ids is not None or not analysis_ids:
+        query = select(Receipt)
+        if receipt_ids:
+            query = query.where(Receipt.id.in_(receipt_ids))
+        result = await db.execute(query)
+        targets += [
+            (TARGET_RECEIPT, r.id, r.cropped_image_path or r.original_image_path)
+            for r in result.scalars().all()
+        ]
+    return _vision_request_lines(service, prompt, targets, pack_size)
+
+
+def _vision_request_lines(
+    service: OpenAIVisionService,
+    prompt: str,
+    targets: List[Tuple[str, str, str]],
+    pack_size: int = 1
+) -> Tuple[List[Dict[str, Any]], Dict[str, List[List[str]]], int]:
+    """
+    (hedef, hedef ID, görsel yolu) listesinden Vision istek satırları
+
+    Returns:
+        (satırlar, paket hedefleri, okunabilen görsel sayısı)
+    """
+    images: List[Tuple[Tuple[str, str, str], bytes]] = []
+    for target, target_id, image_path in targets:
+        try:
+            with open(image_path, "rb") as f:
+                processed_bytes, _ = service.preprocess_image(f.read())
+        except Exception as e:
+            logger.warning(f"⚠️ Batch: görsel okunamadı, atlanıyor ({target}:{target_id}): {e}")
+            continue
+        images.append(((target, target_id, image_path), processed_bytes))
+
+    lines = []
+    packs: Dict[str, List[List[str]]] = {}
+    pack_size = max(pack_size, 1)
+    for start in range(0, len(images), pack_size):
+        chunk = images[start:start + pack_size]
+        if len(chunk) == 1:
+            (target, target_id, _), processed_bytes = chunk[0]
+            body = service.build_request(processed_bytes, prompt)
+            lines.append(_request_line(make_custom_id(KIND_VISION, target, target_id), body))
+            continue
+        pack_id = str(len(packs))
+        packs[pack_id] = [list(entry) for entry, _ in chunk]
+        body = service.build_packed_request([processed_bytes for _, processed_bytes in chunk], prompt)
+        lines.append(_request_line(make_custom_id(KIND_VISION, TARGET_PACK, pack_id), body))
+    return lines, packs, len(images)
+
+
+async def _build_accounting_lines(
+    db: AsyncSession,
+    service: AccountingService,
+    model_name: str,
+    gpt_model: str,
+    receipt_ids: Optional[List[str]]
+) -> List[Dict[str, Any]]:
+    """Her fişin bu OCR modeline ait en güncel OCR metninden muhasebe istek satırları"""
+    query = (
+        select(PromptTest)
+        .where(
+            and_(
+                PromptTest.model_name == model_name,
+                PromptTest.receipt_id.isnot(None),
+                PromptTest.ocr_text.isnot(None)
+            )
+        )
+        .order_by(desc(PromptTest.created_at))
+    )
+    if receipt_ids:
+        query = query.where(PromptTest.receipt_id.in_(receipt_ids))
+    result = await db.execute(query)
+
+    lines = []
+    seen = set()
+    for test in result.scalars().all():
+        if test.receipt_id in seen or not test.ocr_text.strip():
+            continue
+        seen.add(test.receipt_id)
+        ocr_metadata = test.ocr_metadata or {}
+        body = service.build_request(
+            model_name,
+            test.ocr_text,
+            ocr_metadata.get("entities"),
+            ocr_metadata.get("structured_data"),
+            gpt_model
+        )
+        custom_id = make_custom_id(KIND_ACCOUNTING, TARGET_RECEIPT, test.receipt_id, test.id)
+        lines.append(_request_line(custom_id, body))
+    return lines
+
+
+async def create_batch_job(
+    db: AsyncSession,
+    kind: str,
+    model_name: Optional[str] = None,
+    gpt_model: Optional[str] = None,
+    receipt_ids: Optional[List[str]] = None,
+    analysis_ids: Optional[List[str]] = None
+) -> BatchJob:
+    """
+    İstek dosyasını oluştur, batch client'a gönder ve işi kaydet
+
+    Args:
+        kind: "vision" (görsel -> OCR) veya "accounting" (OCR metni -> muhasebe)
+        model_name: Muhasebe için prompt'u değerlendirilen OCR modeli (vision'da openai_vision)
+        gpt_model: GPT modeli (None = varsayılan; muhasebede "auto" en ucuz modele çevrilir)
+        receipt_ids: Sadece bu fişler (None = tüm kütüphane)
+        analysis_ids: Vision: bu analizlerin görselleri de işlenir (sonuç OCRResult'a)
+
+    Raises:
+        ValueError: Geçersiz tip veya değerlendirilecek kayıt yoksa
+    """
+    from ..core.config import settings
+
+    if kind not in (KIND_VISION, KIND_ACCOUNTING):
+        raise ValueError(f"Geçersiz batch tipi: {kind}")
+    if kind == KIND_ACCOUNTING and not model_name:
+        raise ValueError("Muhasebe batch'i için model_name gerekli")
+
+    model_name = VISION_MODEL_NAME if kind == KIND_VISION else model_name
+    gpt_model = _resolve_gpt_model(kind, gpt_model)
+    prompt_version = get_prompt_manager().get_prompt(model_name).get("version", 1)
+
+    packs: Dict[str, List[List[str]]] = {}
+    if kind == KIND_VISION:
+        service = _vision_service(gpt_model)
+        lines, packs, item_count = await _build_vision_lines(
+            db, service, service.resolve_prompt(), receipt_ids, analysis_ids,
+            settings.OPENAI_VISION_PACK_SIZE
+        )
+    else:
+        service = _accounting_service(gpt_model)
+        lines = await _build_accounting_lines(db, service, model_name, gpt_model, receipt_ids)
+        item_count = len(lines)
+
+    if not lines:
+        raise ValueError("Değerlendirilecek kayıt bulunamadı")
+
+    client = get_batch_client()
+    job = BatchJob(
+        kind=kind,
+        model_name=model_name,
+        prompt_version=prompt_version,
+        gpt_model=gpt_model,
+        client=client.name,
+        status="created",
+        request_count=item_count,
+        succeeded_count=0,
+        failed_count=0,
+        estimated_cost=0.0
+    )
+    db.add(job)
+    await db.flush()
+
+    await _submit_job(job, lines, packs)
+    logger.info(f"📦 Batch job {job.id}: {kind}/{model_name} v{prompt_version}, {item_count} kayıt, {len(lines)} istek ({client.name})")
+    return job
+
+
+async def _submit_job(job: BatchJob, lines: List[Dict[str, Any]], packs: Optional[Dict[str, List[List[str]]]] = None):
+    """İstek dosyasını (ve paket yan dosyasını) yaz, batch client'a gönder"""
+    from ..core.config import settings
+
+    os.makedirs(settings.BATCH_DIR, exist_ok=True)
+    job.input_path = os.path.join(settings.BATCH_DIR, f"{job.id}.jsonl")
+    with open(job.input_path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    if packs:
+        with open(_packs_path(job.input_path), "w", encoding="utf-8") as f:
+            json.dump(packs, f)
+
+    job.batch_id = await get_batch_client().submit(
+        job.input_path,
+        metadata={"job_id": job.id, "kind": job.kind, "model_name": job.model_name}
+    )
+    job.status = "submitted"
+
+
+async def _create_followup_job(
+    db: AsyncSession,
+    job: BatchJob,
+    service: OpenAIVisionService,
+    prompt_used: str,
+    fallbacks: List[List[str]]
+) -> Tuple[Optional[BatchJob], int]:
+    """
+    Paket yanıtından ayrıştırılamayan görselleri tekli isteklerle yeni batch işine al
+
+    Returns:
+        (takip işi veya None, okunamayan görsel sayısı)
+    """
+    lines, _, item_count = _vision_request_lines(service, prompt_used, [tuple(entry) for entry in fallbacks])
+    if not lines:
+        return None, len(fallbacks)
+
+    followup = BatchJob(
+        id=str(uuid.uuid4()),
+        kind=job.kind,
+        model_name=job.model_name,
+        prompt_version=job.prompt_version,
+        gpt_model=job.gpt_model,
+        client=get_batch_client().name,
+        status="created",
+        request_count=item_count,
+        succeeded_count=0,
+        failed_count=0,
+        estimated_cost=0.0,
+        parent_job_id=job.id
+    )
+    # Önce gönder: gönderim başarısızsa sorgulanamayacak yarım iş kaydı kalmaz
+    await _submit_job(followup, lines)
+    db.add(followup)
+    logger.info(f"♻️ Batch job {job.id}: {item_count} görsel tekli isteklerle takip işine alındı ({followup.id})")
+    return followup, len(fallbacks) - item_count
+
+
+async def poll_batch_job(db: AsyncSession, job: BatchJob) -> BatchJob:
+    """Batch durumunu sorgula; tamamlandıysa sonuçları yaz"""
+    if job.status in TERMINAL_STATUSES or job.status == STATUS_INGESTING or not job.batch_id:
+        return job
+
+    client = get_batch_client()
+    info = await client.retrieve(job.batch_id, job.input_path)
+    status = info.get("status", job.status)
+
+    if status == "completed":
+        job_id, previous_status = job.id, job.status
+        if not await _claim_ingest(db, job):
+            logger.info(f"⏭️ Batch job {job.id} sonuçları başka bir çağrı tarafından yazılıyor")
+            return job
+        try:
+            lines = await client.fetch_results(job.batch_id, job.input_path)
+            await _ingest_results(db, job, lines)
+        except BaseException:
+            # Yazma başarısız: hakkı bırak, sonraki sorgulama tekrar denesin
+            await db.rollback()
+            await _release_ingest(db, job_id, previous_status)
+            raise
+        job.completed_at = datetime.utcnow()
+        logger.info(f"✅ Batch job {job.id} tamamlandı: {job.succeeded_count} başarılı, "
+                   f"{job.failed_count} hatalı, ${job.estimated_cost:.6f}")
+    elif status in TERMINAL_STATUSES:
+        job.error = info.get("error") or f"Batch {status}"
+        job.completed_at = datetime.utcnow()
+        logger.error(f"❌ Batch job {job.id}: {job.error}")
+
+    job.status = status
+    return job
+
+
+async def _claim_ingest(db: AsyncSession, job: BatchJob) -> bool:
+    """
+    Sonuçları yazma hakkını satır düzeyinde al (durum -> "ingesting", hemen commit)
+
+    Returns:
+        Hak bu çağrıya verildiyse True (başka çağıran önce aldıysa False)
+    """
+    result = await db.execute(
+        update(BatchJob)
+        .where(and_(
+            BatchJob.id == job.id,
+            BatchJob.status != STATUS_INGESTING,
+            BatchJob.status.notin_(list(TERMINAL_STATUSES))
+        ))
+        .values(status=STATUS_INGESTING)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if result.rowcount != 1:
+        await db.refresh(job)
+        return False
+    job.status = STATUS_INGESTING
+    return True
+
+
+async def _release_ingest(db: AsyncSession, job_id: str, status: str):
+    """Yarıda kalan yazmanın hakkını bırak (iş tekrar sorgulanabilir olur)"""
+    await db.execute(
+        update(BatchJob)
+        .where(and_(BatchJob.id == job_id, BatchJob.status == STATUS_INGESTING))
+        .values(status=status)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+
+async def _ingest_results(db: AsyncSession, job: BatchJob, lines: List[Dict[str, Any]]):
+    """Çıktı satırlarını PromptTest / OCRResult satırlarına yaz"""
+    packs: Dict[str, List[List[str]]] = {}
+    if job.kind == KIND_VISION:
+        service = _vision_service(job.gpt_model)
+        prompt_used = service.resolve_prompt(prompt_version=job.prompt_version)
+        packs = _read_packs(job.input_path)
+    else:
+        service = _accounting_service(job.gpt_model)
+        prompt_used = get_prompt_manager().get_prompt(job.model_name, job.prompt_version).get("prompt", "")
+
+    succeeded, failed, total_cost = 0, 0, 0.0
+    fallbacks: List[List[str]] = []  # Paketten ayrıştırılamayan görseller
+    for line in lines:
+        custom_id = line.get("custom_id", "")
+        _, target, target_id, source_id = parse_custom_id(custom_id)
+        response = line.get("response") or {}
+        line_ok = not line.get("error") and response.get("status_code") == 200
+        if not line_ok:
+            logger.warning(f"⚠️ Batch satırı başarısız ({custom_id}): {line.get('error') or response.get('body')}")
+
+        if target == TARGET_PACK:
+            entries = packs.get(target_id, [])
+            results: List[Optional[Dict[str, Any]]] = [None] * len(entries)
+            if line_ok:
+                completion = ChatCompletion.model_validate(response["body"])
+                choice = completion.choices[0]
+                results = service.split_packed_result(
+                    choice.message.content or "", completion.usage, len(entries),
+                    choice.finish_reason, completion.model
+                )
+            for entry, result in zip(entries, results):
+                if result is None:
+                    fallbacks.append(entry)
+                    continue
+                try:
+                    cost = service.calculate_cost(result) * BATCH_DISCOUNT
+                    await _save_vision_result(db, job, entry[0], entry[1], result, cost, prompt_used)
+                    total_cost += cost
+                    succeeded += 1
+                except Exception as e:
+                    failed += 1
+                    logger.warning(f"⚠️ Batch sonucu yazılamadı ({custom_id}/{entry[1]}): {e}")
+            continue
+
+        if not line_ok:
+            failed += 1
+            continue
+
+        try:
+            completion = ChatCompletion.model_validate(response["body"])
+            content = completion.choices[0].message.content or ""
+
+            if job.kind == KIND_VISION:
+                result = service.build_result(
+                    content, completion.usage, completion.choices[0].finish_reason, completion.model
+                )
+                cost = service.calculate_cost(result) * BATCH_DISCOUNT
+                await _save_vision_result(db, job, target, target_id, result, cost, prompt_used)
+            else:
+                result = service.build_result(job.model_name, job.gpt_model, content, completion.usage, time.time())
+                cost = result["estimated_cost"] * BATCH_DISCOUNT
+                await _save_accounting_prompt_test(db, job, target_id, source_id, result, cost, prompt_used)
+
+            total_cost += cost
+            succeeded += 1
+        except Exception as e:
+            failed += 1
+            logger.warning(f"⚠️ Batch sonucu yazılamadı ({custom_id}): {e}")
+
+    # Paket yanıtından çıkmayan görseller: interaktif tam fiyat yerine tekli isteklerle takip batch'i
+    if fallbacks:
+        try:
+            _, unreadable = await _create_followup_job(db, job, service, prompt_used, fallbacks)
+            failed += unreadable
+        except Exception as e:
+            failed += len(fallbacks)
+            logger.warning(f"⚠️ Batch job {job.id}: takip işi oluşturulamadı ({len(fallbacks)} görsel): {e}")
+
+    job.succeeded_count = succeeded
+    job.failed_count = failed
+    job.estimated_cost = total_cost
+
+
+async def _save_vision_result(
+    db: AsyncSession,
+    job: BatchJob,
+    target: str,
+    target_id: str,
+    result: Dict[str, Any],
+    cost: float,
+    prompt_used: str
+):
+    if target == TARGET_ANALYSIS:
+        await _save_vision_ocr_result(db, target_id, result, cost)
+    else:
+        await _save_vision_prompt_test(db, job, target_id, result, cost, prompt_used)
+
+
+async def _get_receipt_test(db: AsyncSession, receipt_id: str, model_name: str, prompt_version: int) -> Optional[PromptTest]:
+    """Aynı fiş + model + versiyon için mevcut test (tekillik API seviyesinde sağlanır)"""
+    result = await db.execute(
+        select(PromptTest).where(
+            and_(
+                PromptTest.receipt_id == receipt_id,
+                PromptTest.model_name == model_name,
+                PromptTest.prompt_version == prompt_version
+            )
+        )
+    )
+    return result.scalars().first()
+
+
+async def _upsert_receipt_test(
+    db: AsyncSession,
+    receipt_id: str,
+    model_name: str,
+    prompt_version: int,
+    fields: Dict[str, Any]
+):
+    test = await _get_receipt_test(db, receipt_id, model_name, prompt_version)
+    if test is None:
+        receipt = await db.get(Receipt, receipt_id)
+        if receipt is None:
+            raise ValueError(f"Fiş bulunamadı: {receipt_id}")
+        test = PromptTest(
+            receipt_id=receipt_id,
+            model_name=model_name,
+            prompt_version=prompt_version,
+            original_image_path=receipt.original_image_path,
+            cropped_image_path=receipt.cropped_image_path
+        )
+        db.add(test)
+    for key, value in fields.items():
+        setattr(test, key, value)
+
+
+async def _save_vision_prompt_test(
+    db: AsyncSession,
+    job: BatchJob,
+    receipt_id: str,
+    result: Dict[str, Any],
+    cost: float,
+    prompt_used: str
+):
+    await _upsert_receipt_test(db, receipt_id, job.model_name, job.prompt_version, {
+        "ocr_text": result.get("text", ""),
+        "ocr_confidence": result.get("confidence"),
+        "ocr_processing_time_ms": None,  # Batch gecikmesi anlamlı değil
+        "ocr_cost": cost,
+        "gpt_prompt_used": prompt_used,
+        "ocr_metadata": {
+            **(result.get("metadata") or {}),
+            "structured_data": result.get("structured_data"),
+            "batch_job_id": job.id
+        }
+    })
+
+
+async def _save_vision_ocr_result(db: AsyncSession, analysis_id: str, result: Dict[str, Any], cost: float):
+    """Analizin openai_vision sonucunu batch sonucu ile değiştir"""
+    await db.execute(
+        delete(OCRResult).where(
+            and_(OCRResult.analysis_id == analysis_id, OCRResult.model_name == VISION_MODEL_NAME)
+        )
+    )
+    db.add(OCRResult(
+        analysis_id=analysis_id,
+        model_name=VISION_MODEL_NAME,
+        text_content=result.get("text", ""),
+        structured_data=result.get("structured_data"),
+        confidence_score=result.get("confidence"),
+        processing_time_ms=0,
+        token_count=result.get("token_count"),
+        estimated_cost=cost,
+        model_metadata=result.get("metadata")
+    ))
+
+
+async def _save_accounting_prompt_test(
+    db: AsyncSession,
+    job: BatchJob,
+    receipt_id: str,
+    source_test_id: Optional[str],
+    result: Dict[str, Any],
+    cost: float,
+    prompt_used: str
+):
+    source = await db.get(PromptTest, source_test_id) if source_test_id else None
+    fields = {
+        "gpt_model": job.gpt_model,
+        "gpt_prompt_used": prompt_used,
+        "gpt_response_raw": result.get("raw_gpt_response"),
+        "accounting_data": result.get("accounting_data"),
+        "gpt_processing_time_ms": None,
+        "gpt_cost": cost
+    }
+    if source is not None and (source.prompt_version != job.prompt_version):
+        # Yeni versiyon testi kaynak testin OCR çıktısını devralır
+        fields.update({
+            "ocr_text": source.ocr_text,
+            "ocr_confidence": source.ocr_confidence,
+            "ocr_processing_time_ms": source.ocr_processing_time_ms,
+            "ocr_cost": source.ocr_cost,
+            "ocr_metadata": {**(source.ocr_metadata or {}), "batch_job_id": job.id}
+        })
+    await _upsert_receipt_test(db, receipt_id, job.model_name, job.prompt_version, fields)
+
+
+async def run_batch_job(job_id: str, poll_interval: Optional[int] = None):
+    """İşi bitene kadar periyodik sorgula (arka plan task'i, kendi session'ı ile)"""
+    from ..core.config import settings
+    from ..database.database import AsyncSessionLocal
+
+    interval = poll_interval or settings.OPENAI_BATCH_POLL_INTERVAL
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                job = await db.get(BatchJob, job_id)
+                if job is None:
+                    return
+                await poll_batch_job(db, job)
+                await db.commit()
+                if job.status in TERMINAL_STATUSES:
+                    # Takip işi açıldıysa sorgulama onunla devam eder
+                    followup_id = await _followup_job_id(db, job.id)
+                    if followup_id is None:
+                        return
+                    job_id = followup_id
+        except Exception as e:
+            logger.error(f"❌ Batch job {job_id} sorgulanamadı: {e}")
+        await asyncio.sleep(interval)
+
+
+async def _followup_job_id(db: AsyncSession, job_id: str) -> Optional[str]:
+    """İşin bitmemiş takip işi (varsa)"""
+    result = await db.execute(
+        select(BatchJob.id).where(and_(
+            BatchJob.parent_job_id == job_id,
+            BatchJob.status.notin_(list(TERMINAL_STATUSES))
+        ))
+    )
+    return result.scalars().first()
+
+
+async def pending_batch_job_ids(db: AsyncSession) -> List[str]:
+    """Bitmemiş işler (sunucu yeniden başladığında sorgulamaya devam etmek için)"""
+    # Sonuç yazılırken kapanan işlerin hakkı bırakılır (yazma commit edilmemiştir, tekrar yazılır)
+    await db.execute(
+        update(BatchJob)
+        .where(BatchJob.status == STATUS_INGESTING)
+        .values(status="in_progress")
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    result = await db.execute(
+        select(BatchJob.id).where(BatchJob.status.notin_(list(TERMINAL_STATUSES)))
+    )
+    return list(result.scalars().all())
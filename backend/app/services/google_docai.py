@@ -83,14 +83,8 @@ class GoogleDocAIService(BaseOCRService):
                 },
                 "raw_response": {
                     "text": text,
-                    "entities": [
-                        {
-                            "type": entity.type_,
-                            "mention_text": entity.mention_text,
-                            "confidence": entity.confidence
-                        }
-                        for entity in document.entities
-                    ]
+                    # Tipli entity'ler (normalize değer + alt alanlar): muhasebede doğrudan V2'ye eşlenir
+                    "entities": [self._entity_to_dict(entity) for entity in document.entities]
                 }
             }
             
@@ -127,6 +121,20 @@ class GoogleDocAIService(BaseOCRService):
         
         return structured
     
+    def _entity_to_dict(self, entity) -> Dict[str, Any]:
+        """Entity'yi JSON'a çevir (line_item, vat gibi entity'lerin alt alanları dahil)"""
+        data = {
+            "type": entity.type_,
+            "mention_text": entity.mention_text,
+            "confidence": entity.confidence
+        }
+        normalized = entity.normalized_value.text if entity.normalized_value else ""
+        if normalized:
+            data["normalized_value"] = normalized
+        if entity.properties:
+            data["properties"] = [self._entity_to_dict(prop) for prop in entity.properties]
+        return data
+    
     def _extract_table(self, table, text: str) -> Dict[str, Any]:
         """Tablo çıkar"""
         rows = []
@@ -0,0 +1,209 @@
+"""
+Process genelinde GPT çağrı zamanlayıcısı (TPM / RPM farkında)
+
+Her istek için token tahmini (tiktoken prompt + max_tokens) yapılır ve model
+bazında 60 saniyelik kayan pencerede token ve istek bütçesine göre kabul
+edilir. Bekleyen işler önceliğe göre sıralanır: interaktif önce, toplu iş sonra.
+Böylece eşzamanlı kullanıcılar ve toplu işler OpenAI limitlerine çarpıp
+zincirleme 429 üretmez.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Öncelikler (küçük değer önce çalışır)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+WINDOW_SECONDS = 60.0
+
+
+class _ModelBudget:
+    """Tek bir GPT modeli için kayan pencere bütçesi ve bekleme kuyruğu"""
+
+    def __init__(self, tpm: int, rpm: int):
+        self.tpm = tpm
+        self.rpm = rpm
+        self.window: deque = deque()  # [timestamp, tokens, model] rezervasyonları
+        self.waiters: List[Tuple[int, int]] = []  # (priority, sequence) heap
+        self.condition = asyncio.Condition()
+
+        self.admitted = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _prune(self, now: float):
+        while self.window and now - self.window[0][0] >= WINDOW_SECONDS:
+            self.window.popleft()
+
+    def used_tokens(self) -> int:
+        return sum(entry[1] for entry in self.window)
+
+    def seconds_until_admit(self, tokens: int) -> float:
+        """Bu isteğin kabul edilebilmesi için beklenecek süre (0 = şimdi)"""
+        now = time.monotonic()
+        self._prune(now)
+
+        # Tek başına TPM'i aşan istek: pencere boşalınca kabul et
+        tokens = min(tokens, self.tpm)
+
+        used = self.used_tokens()
+        if len(self.window) < self.rpm and used + tokens <= self.tpm:
+            return 0.0
+
+        # En eski girdiler pencereden düştükçe yer açılır
+        freed = 0
+        for index, (timestamp, entry_tokens, _) in enumerate(self.window):
+            freed += entry_tokens
+            if len(self.window) - (index + 1) < self.rpm and used - freed + tokens <= self.tpm:
+                return max(0.0, timestamp + WINDOW_SECONDS - now)
+        return WINDOW_SECONDS
+
+
+class GPTScheduler:
+    """
+    Model bazında TPM/RPM bütçeli, öncelikli GPT çağrı zamanlayıcısı
+
+    Kullanım:
+        reservation = await scheduler.acquire("gpt-4o-mini", estimated_tokens, PRIORITY_INTERACTIVE)
+        response = await client.chat.completions.create(...)
+        scheduler.settle(reservation, response.usage.total_tokens)
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Tuple[int, int]]] = None,
+        default_tpm: int = 200_000,
+        default_rpm: int = 500
+    ):
+        self.limits = limits or {}
+        self.default_tpm = default_tpm
+        self.default_rpm = default_rpm
+        self._budgets: Dict[str, _ModelBudget] = {}
+        self._sequence = itertools.count()
+
+    def _budget(self, model: str) -> _ModelBudget:
+        if model not in self._budgets:
+            tpm, rpm = self.limits.get(model, (self.default_tpm, self.default_rpm))
+            self._budgets[model] = _ModelBudget(tpm, rpm)
+        return self._budgets[model]
+
+    async def acquire(self, model: str, tokens: int, priority: int = PRIORITY_INTERACTIVE) -> List[Any]:
+        """
+        Bütçe uygun olana ve sıra bu isteğe gelene kadar bekle
+
+        Returns:
+            Rezervasyon (settle() ile gerçek token sayısına güncellenir)
+        """
+        budget = self._budget(model)
+        ticket = (priority, next(self._sequence))
+        heapq.heappush(budget.waiters, ticket)
+        started = time.monotonic()
+
+        try:
+            async with budget.condition:
+                while True:
+                    timeout = None
+                    if budget.waiters[0] == ticket:
+                        timeout = budget.seconds_until_admit(tokens)
+                        if timeout <= 0:
+                            heapq.heappop(budget.waiters)
+                            reservation = [time.monotonic(), tokens, model]
+                            budget.window.append(reservation)
+                            self._record_wait(budget, time.monotonic() - started, model, tokens)
+                            budget.condition.notify_all()
+                            return reservation
+                    try:
+                        await asyncio.wait_for(budget.condition.wait(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        pass
+        except BaseException:
+            # İptal edilen/başarısız bekleyeni kuyruktan çıkar
+            if ticket in budget.waiters:
+                budget.waiters.remove(ticket)
+                heapq.heapify(budget.waiters)
+                # Sıranın başındaysa diğer bekleyenler uyanmalı (yoksa timeout'suz wait'te kalırlar)
+                await asyncio.shield(self._notify(budget))
+            raise
+
+    def settle(self, reservation: List[Any], actual_tokens: Optional[int]):
+        """Tahmini token sayısını gerçek kullanım ile değiştir (fazla rezervasyon serbest kalır)"""
+        if actual_tokens is None:
+            return
+        reservation[1] = actual_tokens
+        budget = self._budgets.get(reservation[2])
+        if budget is not None:
+            asyncio.ensure_future(self._notify(budget))
+
+    @staticmethod
+    async def _notify(budget: _ModelBudget):
+        async with budget.condition:
+            budget.condition.notify_all()
+
+    @staticmethod
+    def _record_wait(budget: _ModelBudget, waited: float, model: str, tokens: int):
+        budget.admitted += 1
+        budget.total_wait_seconds += waited
+        budget.max_wait_seconds = max(budget.max_wait_seconds, waited)
+        if waited > 1.0:
+            logger.info(f"⏳ GPT scheduler: {model} isteği {waited:.1f}s bekledi (~{tokens} token)")
+
+    def stats(self) -> Dict[str, Any]:
+        """Model bazında pencere kullanımı, kuyruk ve bekleme süreleri"""
+        now = time.monotonic()
+        result = {}
+        for model, budget in self._budgets.items():
+            budget._prune(now)
+            result[model] = {
+                "tpm_limit": budget.tpm,
+                "rpm_limit": budget.rpm,
+                "tokens_in_window": budget.used_tokens(),
+                "requests_in_window": len(budget.window),
+                "queued": len(budget.waiters),
+                "admitted": budget.admitted,
+                "avg_wait_seconds": round(budget.total_wait_seconds / budget.admitted, 3) if budget.admitted else 0.0,
+                "max_wait_seconds": round(budget.max_wait_seconds, 3)
+            }
+        return result
+
+
+def parse_rate_limits(raw: str) -> Dict[str, Tuple[int, int]]:
+    """"gpt-4o-mini:200000:500,gpt-4o:30000:500" -> {model: (tpm, rpm)}"""
+    limits = {}
+    for part in (raw or "").split(","):
+        fields = [f.strip() for f in part.split(":")]
+        if len(fields) != 3 or not fields[0]:
+            continue
+        try:
+            limits[fields[0]] = (int(fields[1]), int(fields[2]))
+        except ValueError:
+            logger.warning(f"⚠️ Geçersiz rate limit tanımı: {part}")
+    return limits
+
+
+# Global singleton instance
+_scheduler_instance: Optional[GPTScheduler] = None
+
+
+def get_gpt_scheduler() -> GPTScheduler:
+    """
+    Global GPT scheduler instance'ını döner (singleton pattern)
+    """
+    global _scheduler_instance
+    from ..core.config import settings
+
+    if _scheduler_instance is None:
+        _scheduler_instance = GPTScheduler(
+            limits=parse_rate_limits(settings.OPENAI_RATE_LIMITS),
+            default_tpm=settings.OPENAI_DEFAULT_TPM,
+            default_rpm=settings.OPENAI_DEFAULT_RPM
+        )
+    return _scheduler_instance
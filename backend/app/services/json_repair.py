@@ -0,0 +1,233 @@
+"""
+Bozuk/yarım GPT JSON çıktısı için toleranslı kurtarma
+
+GPT yanıtı max_tokens'a takılıp kesildiğinde veya küçük sözdizimi hataları
+içerdiğinde json.loads hata verir ve tüm model sonucu kaybolur. Bu modül
+pes etmeden önce yerel onarım dener:
+
+- Sondaki virgülleri temizler (",}" / ",]")
+- Kesilmiş yanıtı tamamlanmış son değere kadar keser ve parantezleri kapatır
+- Kesilmiş dizide tamamlanmış elemanları korur (ör. items)
+
+Kısmi kurtarılan sonuçlar validation flag ile işaretlenir.
+"""
+
+import json
+import logging
+import re
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Onarım bayrakları (validationFlags'e eklenir)
+FLAG_REPAIRED = "json_repaired"              # Sözdizimi düzeltildi, veri kaybı yok
+FLAG_PARTIAL = "json_partial_recovery"       # Kesilmiş yanıt, son eksik kısım atıldı
+
+# Kesme noktası denemesi üst sınırı (çok uzun yanıtlarda maliyeti sınırlar)
+MAX_CUT_ATTEMPTS = 200
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _strip_wrapping(text: str) -> str:
+    """Markdown code fence ve JSON öncesi açıklamayı at (sonu kesilmiş olabilir, rfind kullanılmaz)"""
+    text = text or ""
+    fence = re.search(r"```(?:json)?\s*\n", text)
+    if fence:
+        text = text[fence.end():]
+        end = text.find("```")
+        if end != -1:
+            text = text[:end]
+    start = text.find("{")
+    return text[start:] if start != -1 else text
+
+
+def _remove_trailing_commas(text: str) -> str:
+    """String dışında kalan ",}" ve ",]" kalıplarındaki virgülü sil"""
+    out: List[str] = []
+    in_string = False
+    escape = False
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "}]":
+            # Son anlamlı karakter virgül ise sil
+            i = len(out) - 1
+            while i >= 0 and out[i].isspace():
+                i -= 1
+            if i >= 0 and out[i] == ",":
+                del out[i]
+        out.append(ch)
+    return "".join(out)
+
+
+def _scan(text: str) -> Tuple[List[str], List[int]]:
+    """
+    Metni tara: sondaki açık parantez yığını ve güvenli kesme noktaları
+
+    Kesme noktası, string dışındaki ',' (öncesi) veya '}' / ']' (sonrası) konumudur.
+    Bir dizi elemanı olan obje (ör. items[i], vatBreakdown[i]) henüz kapanmamışsa
+    o noktada kesmek yarım kalem bırakır; bu noktalar atlanır.
+    """
+    stack: List[str] = []
+    element_flags: List[bool] = []  # Yığındaki obje bir dizi elemanı mı
+    open_elements = 0
+    cuts: List[int] = []
+    in_string = False
+    escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            is_element = ch == "{" and bool(stack) and stack[-1] == "["
+            stack.append(ch)
+            element_flags.append(is_element)
+            open_elements += is_element
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+                open_elements -= element_flags.pop()
+            if not open_elements:
+                cuts.append(i + 1)
+        elif ch == "," and not open_elements:
+            cuts.append(i)
+    return stack, cuts
+
+
+def _close(text: str) -> Optional[Any]:
+    """Açık parantezleri kapatıp parse etmeyi dene"""
+    stack, _ = _scan(text)
+    candidate = text.rstrip().rstrip(",") + "".join(_CLOSERS[b] for b in reversed(stack))
+    try:
+        return json.loads(_remove_trailing_commas(candidate))
+    except json.JSONDecodeError:
+        return None
+
+
+def repair_json(text: str) -> Tuple[Optional[Any], List[str]]:
+    """
+    Bozuk JSON'u kurtarmayı dene
+
+    Kesilmiş yanıtta yarım kalan son değer (sayı, string, dizi elemanı objesi)
+    her zaman atılır; yarım tutar muhasebede yanlış veriden daha kötüdür.
+
+    Returns:
+        (parse edilmiş veri veya None, bayraklar) - bayrak yoksa veri zaten geçerliydi
+    """
+    body = _strip_wrapping(text).strip()
+    if not body:
+        return None, []
+
+    # Geçerli JSON (sonrasında açıklama metni olabilir: son '}' ile sınırla)
+    end = body.rfind("}")
+    try:
+        return json.loads(body[:end + 1] if end != -1 else body), []
+    except json.JSONDecodeError:
+        pass
+
+    # 1. Sadece sözdizimi: sondaki virgüller
+    fixed = _remove_trailing_commas(body)
+    try:
+        return json.loads(fixed), [FLAG_REPAIRED]
+    except json.JSONDecodeError:
+        pass
+
+    # 2. Kesilmiş yanıt: sondan geriye, tamamlanmış son değere kadar kes ve kapat
+    #    (kesilmiş items dizisinde tam olan elemanlar korunur)
+    _, cuts = _scan(fixed)
+    for cut in list(reversed(cuts))[:MAX_CUT_ATTEMPTS]:
+        data = _close(fixed[:cut])
+        if isinstance(data, dict):
+            return data, [FLAG_PARTIAL]
+
+    return None, []
+
+
+class JSONRepairTracker:
+    """Kaynak (OCR modeli / çağrı tipi) bazında JSON onarım oranları"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"parsed": 0, "repaired": 0, "partial": 0, "failed": 0}
+        )
+
+    def record(self, source: str, outcome: str):
+        """outcome: parsed | repaired | partial | failed"""
+        with self._lock:
+            self._counts[source][outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for source, counts in self._counts.items():
+                total = sum(counts.values())
+                result[source] = {
+                    **counts,
+                    "total": total,
+                    "repair_rate": round((counts["repaired"] + counts["partial"]) / total, 3) if total else 0.0,
+                    "failure_rate": round(counts["failed"] / total, 3) if total else 0.0
+                }
+            return result
+
+
+def parse_gpt_json(text: str, source: str) -> Tuple[Any, List[str]]:
+    """
+    GPT yanıtını parse et, gerekirse onar ve sonucu kaydet
+
+    Returns:
+        (veri, bayraklar)
+
+    Raises:
+        json.JSONDecodeError: Onarım da başarısızsa
+    """
+    data, flags = repair_json(text)
+    tracker = get_json_repair_tracker()
+
+    if data is None:
+        tracker.record(source, "failed")
+        raise json.JSONDecodeError("JSON onarılamadı", text or "", 0)
+
+    if FLAG_PARTIAL in flags:
+        tracker.record(source, "partial")
+        logger.warning(f"🩹 {source}: kesilmiş JSON kısmen kurtarıldı")
+    elif FLAG_REPAIRED in flags:
+        tracker.record(source, "repaired")
+        logger.info(f"🩹 {source}: JSON sözdizimi onarıldı")
+    else:
+        tracker.record(source, "parsed")
+    return data, flags
+
+
+# Global singleton instance
+_tracker_instance: Optional[JSONRepairTracker] = None
+
+
+def get_json_repair_tracker() -> JSONRepairTracker:
+    """
+    Global JSON onarım tracker instance'ını döner (singleton pattern)
+    """
+    global _tracker_instance
+    if _tracker_instance is None:
+        _tracker_instance = JSONRepairTracker()
+    return _tracker_instance
@@ -0,0 +1,180 @@
+"""
+Akış halindeki GPT JSON çıktısı için artımlı parser
+
+Streaming modda completion token token gelir. Tüm yanıtı beklemek yerine
+tamamlanan parçalar anında yakalanır:
+
+- document.* alanları (firma, tarih, VKN ...) tek tek
+- items[] dizisinin her tamamlanmış elemanı
+- Diğer üst seviye bölümler (metadata, totals ...) bitince bütün olarak
+
+Parser sadece yakalanan değerleri yayar; nihai sonuç yine tam metin
+üzerinden parse_gpt_json ile üretilir (kısmi değerler önizleme içindir).
+"""
+
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Yayılan olay tipleri
+EVENT_DOCUMENT = "document"   # {"field": str, "value": Any}
+EVENT_ITEM = "item"           # {"index": int, "item": dict}
+EVENT_SECTION = "section"     # {"name": str, "value": Any}
+
+# Kısmi sonuç callback'i: (olay tipi, veri)
+PartialCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# Alan alan / eleman eleman akıtılan bölümler
+DOCUMENT_KEY = "document"
+ITEMS_KEY = "items"
+
+
+class _Frame:
+    """Açık bir obje/dizi ve içindeki o anki değerin durumu"""
+
+    __slots__ = ("is_object", "key", "index", "expect_key", "value_start")
+
+    def __init__(self, is_object: bool):
+        self.is_object = is_object
+        self.key: Optional[str] = None
+        self.index = 0
+        self.expect_key = is_object
+        self.value_start: Optional[int] = None
+
+    @property
+    def slot(self) -> Any:
+        return self.key if self.is_object else self.index
+
+
+class IncrementalJSONParser:
+    """
+    Parça parça gelen JSON metnini tarar ve tamamlanan değerleri olay olarak döner
+
+    Kullanım:
+        parser = IncrementalJSONParser()
+        for chunk in stream:
+            for event, data in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._started = False
+        self._finished = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+
+    @property
+    def text(self) -> str:
+        """Şu ana kadar gelen tüm metin"""
+        return self._buffer
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Yeni parçayı ekle, bu parçayla tamamlanan değerlerin olaylarını döndür"""
+        self._buffer += chunk or ""
+        events: List[Tuple[str, Dict[str, Any]]] = []
+        if self._finished:
+            return events
+
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+
+            # Üst seviye obje başlamadan önceki metin (```json vb.) atlanır
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._stack.append(_Frame(is_object=True))
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        top = self._stack[-1]
+                        top.key = self._loads(buffer[self._string_start:i + 1])
+                        top.expect_key = False
+                continue
+
+            if ch.isspace():
+                continue
+
+            top = self._stack[-1]
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = top.is_object and top.expect_key
+                if not self._string_is_key and top.value_start is None:
+                    top.value_start = i
+            elif ch == ":":
+                continue
+            elif ch in "{[":
+                if top.value_start is None:
+                    top.value_start = i
+                self._stack.append(_Frame(is_object=ch == "{"))
+            elif ch in "}]":
+                self._finish_scalar(top, buffer, i, events)
+                self._stack.pop()
+                if not self._stack:
+                    self._finished = True
+                    self._pos = i + 1
+                    return events
+                parent = self._stack[-1]
+                self._emit(buffer[parent.value_start:i + 1], events)
+                parent.value_start = None
+            elif ch == ",":
+                self._finish_scalar(top, buffer, i, events)
+                if top.is_object:
+                    top.expect_key = True
+                else:
+                    top.index += 1
+            elif top.value_start is None:
+                # Sayı / true / false / null başlangıcı
+                top.value_start = i
+
+        self._pos = len(buffer)
+        return events
+
+    def _finish_scalar(self, frame: _Frame, buffer: str, end: int, events: List[Tuple[str, Dict[str, Any]]]):
+        """',' veya kapanış parantezi öncesinde biten skaler değeri yay"""
+        if frame.value_start is None:
+            return
+        self._emit(buffer[frame.value_start:end], events)
+        frame.value_start = None
+
+    def _path(self) -> Tuple[Any, ...]:
+        """Tamamlanan değerin üst seviye objeden itibaren yolu (ör. ("items", 2))"""
+        return tuple(frame.slot for frame in self._stack)
+
+    def _emit(self, raw: str, events: List[Tuple[str, Dict[str, Any]]]):
+        path = self._path()
+        if len(path) > 2:
+            return
+        if len(path) == 2 and path[0] == DOCUMENT_KEY:
+            events.append((EVENT_DOCUMENT, {"field": path[1], "value": self._loads(raw)}))
+        elif len(path) == 2 and path[0] == ITEMS_KEY and isinstance(path[1], int):
+            value = self._loads(raw)
+            if isinstance(value, dict):
+                events.append((EVENT_ITEM, {"index": path[1], "item": value}))
+        elif len(path) == 1 and path[0] not in (DOCUMENT_KEY, ITEMS_KEY):
+            events.append((EVENT_SECTION, {"name": path[0], "value": self._loads(raw)}))
+
+    @staticmethod
+    def _loads(raw: str) -> Any:
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            # Bozuk skaler değer (GPT sözdizimi hatası): ham metni ilet
+            logger.debug(f"⚠️ Incremental JSON: değer parse edilemedi: {raw[:50]}")
+            return raw.strip()
@@ -0,0 +1,148 @@
+"""
+Ucuzdan pahalıya muhasebe GPT model yönlendiricisi
+
+Temiz OCR çıktılarında en ucuz model yeterli. Sonuç matematiksel olarak
+doğrulanır (KDV dökümü ↔ toplamlar, kalem toplamı ↔ genel toplam); doğrulama
+başarısızsa bir üst modele yükseltilir. Yükseltme oranı OCR modeli bazında
+tutulur: hangi OCR çıktısının pahalı modele ihtiyaç duyduğu görülür.
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# gpt_model olarak bu değer verilirse yönlendirici kullanılır
+ROUTER_AUTO = "auto"
+
+
+def validate_accounting_v1(data: Dict[str, Any], tolerance: float = 0.10) -> List[str]:
+    """
+    V1 muhasebe verisinin iç tutarlılığını kontrol et
+
+    _convert_v2_to_v1_format'ın ürettiği GPT değerleri (*_gpt) ile kalemlerden
+    hesaplanan değerler (*_calculated, _calculate_vat_from_items) karşılaştırılır.
+
+    Returns:
+        Sorun listesi (boş = geçerli)
+    """
+    issues = []
+
+    line_items = data.get("line_items") or []
+    grand_total = data.get("grand_total_gpt", data.get("grand_total"))
+    total_vat = data.get("total_vat_gpt", data.get("total_vat"))
+
+    if "json_partial_recovery" in (data.get("validation_flags") or []):
+        issues.append("json_partial_recovery")
+    if not line_items:
+        issues.append("no_line_items")
+    if not grand_total:
+        issues.append("missing_grand_total")
+        return issues
+
+    # Kalem toplamı ↔ genel toplam
+    items_total = data.get("grand_total_calculated")
+    if line_items and items_total is not None and abs(items_total - grand_total) > tolerance:
+        issues.append(f"items_total_mismatch: items={items_total:.2f} total={grand_total:.2f}")
+
+    # KDV dökümü ↔ toplamlar
+    breakdown = data.get("vat_breakdown_gpt") or data.get("vat_breakdown") or []
+    if breakdown:
+        breakdown_vat = sum(v.get("vat_amount") or 0 for v in breakdown)
+        breakdown_total = sum(v.get("total_amount") or 0 for v in breakdown)
+        if total_vat is not None and abs(breakdown_vat - total_vat) > tolerance:
+            issues.append(f"vat_breakdown_mismatch: breakdown={breakdown_vat:.2f} total_vat={total_vat:.2f}")
+        if abs(breakdown_total - grand_total) > tolerance:
+            issues.append(f"vat_base_mismatch: breakdown={breakdown_total:.2f} total={grand_total:.2f}")
+    elif total_vat:
+        issues.append("missing_vat_breakdown")
+
+    return issues
+
+
+class ModelRouter:
+    """
+    Yapılandırılmış GPT modellerini maliyet sırasına dizer ve yükseltme istatistiği tutar
+
+    Args:
+        models: Kullanılabilir GPT modelleri
+        pricing: {model: {"input", "output"}} - sıralama için (listede olmayanlar en sona)
+        tolerance: Doğrulama toleransı (TL)
+    """
+
+    def __init__(
+        self,
+        models: List[str],
+        pricing: Optional[Dict[str, Dict[str, float]]] = None,
+        tolerance: float = 0.10
+    ):
+        pricing = pricing or {}
+
+        def _cost(model: str) -> float:
+            price = pricing.get(model)
+            return price["input"] + price["output"] if price else float("inf")
+
+        self.chain = sorted(dict.fromkeys(models), key=_cost) or ["gpt-4o-mini"]
+        self.tolerance = tolerance
+
+        # OCR modeli -> sayaçlar
+        self._calls: Dict[str, int] = defaultdict(int)
+        self._escalations: Dict[str, int] = defaultdict(int)
+        self._final_model: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._unresolved: Dict[str, int] = defaultdict(int)
+
+    def validate(self, data: Dict[str, Any]) -> List[str]:
+        return validate_accounting_v1(data, self.tolerance)
+
+    def record(self, ocr_model: str, attempts: List[Dict[str, Any]]):
+        """Bir yönlendirme sonucunu kaydet (attempts: [{gpt_model, issues}, ...])"""
+        if not attempts:
+            return
+        self._calls[ocr_model] += 1
+        if len(attempts) > 1:
+            self._escalations[ocr_model] += 1
+        self._final_model[ocr_model][attempts[-1]["gpt_model"]] += 1
+        if attempts[-1]["issues"]:
+            self._unresolved[ocr_model] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """OCR modeli bazında yükseltme oranı ve son kullanılan GPT modeli dağılımı"""
+        return {
+            "chain": self.chain,
+            "tolerance": self.tolerance,
+            "per_ocr_model": {
+                ocr_model: {
+                    "calls": calls,
+                    "escalations": self._escalations[ocr_model],
+                    "escalation_rate": round(self._escalations[ocr_model] / calls, 3),
+                    "unresolved": self._unresolved[ocr_model],
+                    "final_model": dict(self._final_model[ocr_model])
+                }
+                for ocr_model, calls in self._calls.items()
+            }
+        }
+
+
+# Global singleton instance
+_router_instance: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """
+    Global model router instance'ını döner (singleton pattern)
+    """
+    global _router_instance
+    from ..core.config import settings
+    from .accounting_service import AccountingService
+
+    if _router_instance is None:
+        models = [m.strip() for m in settings.ACCOUNTING_ROUTER_MODELS.split(",") if m.strip()]
+        _router_instance = ModelRouter(
+            models=models,
+            pricing=AccountingService.MODEL_PRICING,
+            tolerance=settings.ACCOUNTING_ROUTER_TOLERANCE
+        )
+        logger.info(f"✅ Accounting model router: {' → '.join(_router_instance.chain)}")
+    return _router_instance
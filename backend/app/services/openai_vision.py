@@ -1,18 +1,40 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from .base import BaseOCRService
 from openai import AsyncOpenAI
 import base64
 import json
 import logging
-from .prompt_manager import PromptManager
+from .prompt_manager import get_prompt_manager
+from .json_repair import parse_gpt_json
+from .json_stream import IncrementalJSONParser, PartialCallback
+from .structured_output import (
+    accounting_response_format,
+    packed_response_format,
+    strip_json_schema_blocks,
+    RAW_TEXT_FIELD,
+    PACKED_RESULTS_FIELD
+)
 
 
 logger = logging.getLogger(__name__)
 
 
+# Paketlenmiş istekte yanıt üst sınırı (gpt-4o max output 16K)
+MAX_PACKED_OUTPUT_TOKENS = 16000
+
+# Paketlenmiş istekte prompt'tan sonra eklenen talimat (K sabitken statik, prefix cache'e girer)
+PACKED_PROMPT_SECTION = """📦 ÇOKLU GÖRSEL:
+Bu istekte {count} ayrı fiş görseli var, her birinin önünde etiketi yazıyor ({keys}).
+Yukarıdaki talimatları HER görsele AYRI AYRI uygula; görseller arasında bilgi karıştırma.
+Çıktıyı TEK JSON objesi olarak döndür: {{"receipts": {{"<etiket>": <o görselin JSON çıktısı>, ...}}}}
+Ham metni her görselin çıktısında "rawText" alanına yaz."""
+
+
 class OpenAIVisionService(BaseOCRService):
     """OpenAI Vision API servisi"""
     
+    supports_streaming = True
+    
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.model_name = "openai_vision"
@@ -22,7 +44,8 @@ class OpenAIVisionService(BaseOCRService):
         # Image: $0.00765 per image (1024x1024)
         self.pricing = {
             "per_page": 0.00765,  # Base image cost
-            "per_1k_tokens": 0.01
+            "per_1k_tokens": 0.01,
+            "per_1k_cached_tokens": 0.005  # Prefix cache'ten gelen prompt token'ları (%50 indirim)
         }
         
         # Client oluştur
@@ -32,15 +55,18 @@ class OpenAIVisionService(BaseOCRService):
         
         self.client = AsyncOpenAI(api_key=api_key)
         self.model = config.get("model", "gpt-4o")  # gpt-4o daha hızlı ve ucuz
+        # Strict JSON şema modu: çıktı doğrudan V2 + ham metin (rawText)
+        self.structured_output = config.get("structured_output", False)
         
         # Prompt Manager
-        self.prompt_manager = PromptManager()
+        self.prompt_manager = get_prompt_manager()
     
     async def process_image(
         self,
         image_bytes: bytes,
         prompt: Optional[str] = None,
-        prompt_version: Optional[int] = None
+        prompt_version: Optional[int] = None,
+        on_partial: Optional[PartialCallback] = None
     ) -> Dict[str, Any]:
         """
         OpenAI Vision ile görseli işle
@@ -49,27 +75,52 @@ class OpenAIVisionService(BaseOCRService):
             image_bytes: Görsel verisi
             prompt: Custom prompt (varsa kullanılır)
             prompt_version: Prompt versiyonu (None ise güncel versiyon)
+            on_partial: Verilirse yanıt stream edilir, tamamlanan alanlar callback'e gider
             
         Returns:
             OCR sonucu
         """
         try:
-            # Görseli base64'e çevir
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
+            prompt = self.resolve_prompt(prompt, prompt_version)
+            request = self.build_request(image_bytes, prompt)
             
-            # Prompt al (önce custom, yoksa prompt manager'dan)
-            if not prompt:
-                prompt_data = self.prompt_manager.get_prompt(
-                    model_name=self.model_name,
-                    version=prompt_version
-                )
-                prompt = prompt_data.get("prompt", "")
-                used_version = prompt_data.get("version")
-                logger.info(f"🤖 Using OpenAI Vision prompt v{used_version}")
+            # Streaming: usage son chunk'ta gelir
+            if on_partial is not None:
+                request["stream"] = True
+                request["stream_options"] = {"include_usage": True}
+            
+            # API çağrısı
+            response = await self.client.chat.completions.create(**request)
+            
+            # Response parse et
+            if on_partial is not None:
+                content, usage, finish_reason, response_model = await self._consume_stream(response, on_partial)
+            else:
+                content = response.choices[0].message.content
+                usage = response.usage
+                finish_reason = response.choices[0].finish_reason
+                response_model = response.model
+            
+            return self.build_result(content, usage, finish_reason, response_model)
             
-            # Fallback: Eğer hala prompt yoksa, basit bir prompt kullan
-            if not prompt:
-                prompt = """Sen bir Türk muhasebe ve OCR uzmanısın. Bu fiş/fatura görselinden EKSIKSIZ ve DOĞRU bilgi çıkaracaksın.
+        except Exception as e:
+            raise Exception(f"OpenAI Vision hatası: {str(e)}")
+    
+    def resolve_prompt(self, prompt: Optional[str] = None, prompt_version: Optional[int] = None) -> str:
+        """Kullanılacak prompt: custom > prompt manager (versiyon) > yerleşik fallback"""
+        # Prompt al (önce custom, yoksa prompt manager'dan)
+        if not prompt:
+            prompt_data = self.prompt_manager.get_prompt(
+                model_name=self.model_name,
+                version=prompt_version
+            )
+            prompt = prompt_data.get("prompt", "")
+            used_version = prompt_data.get("version")
+            logger.info(f"🤖 Using OpenAI Vision prompt v{used_version}")
+        
+        # Fallback: Eğer hala prompt yoksa, basit bir prompt kullan
+        if not prompt:
+            prompt = """Sen bir Türk muhasebe ve OCR uzmanısın. Bu fiş/fatura görselinden EKSIKSIZ ve DOĞRU bilgi çıkaracaksın.
 
 🎯 GÖREV:
 Bu görseldeki TÜM metni satır satır, kelime kelime, HARFI HARFINE oku ve çıkar.
@@ -140,96 +191,279 @@ Bu görseldeki TÜM metni satır satır, kelime kelime, HARFI HARFINE oku ve ç
 - Plaka: 34ABC123 gibi format
 
 ✅ ŞİMDİ ANALİZ ET VE JSON DÖNDÜR!"""
-            
-            # API çağrısı
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{base64_image}",
-                                    "detail": "high"  # Yüksek detay için (kritik!)
-                                }
+        
+        # Structured output: şema response_format ile gider, prompt'taki JSON şema blokları atılır
+        if self.structured_output:
+            prompt = strip_json_schema_blocks(prompt)
+        return prompt
+    
+    def build_request(self, image_bytes: bytes, prompt: str) -> Dict[str, Any]:
+        """chat.completions.create parametreleri (interaktif çağrı ve Batch API satırı ortak)"""
+        # Görseli base64'e çevir
+        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        
+        request: Dict[str, Any] = {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/png;base64,{base64_image}",
+                                "detail": "high"  # Yüksek detay için (kritik!)
                             }
-                        ]
-                    }
-                ],
-                max_tokens=3000,  # Büyük fişler için yeterli
-                temperature=0.0,  # Tam deterministik sonuçlar
-                top_p=1.0,  # Determinizm için
-                frequency_penalty=0.0,  # Tekrar eden kelimeler/sayılar için önemli
-                presence_penalty=0.0  # Yeni token cezası yok
-            )
-            
-            # Response parse et
-            content = response.choices[0].message.content
-            
-            # JSON parse etmeye çalış
-            structured_data = None
-            text = content
-            
-            try:
-                # JSON bulma ve temizleme
-                json_str = content.strip()
-                
-                # Markdown code block varsa temizle
-                if "```json" in json_str:
-                    json_str = json_str.split("```json")[1].split("```")[0].strip()
-                elif "```" in json_str:
-                    json_str = json_str.split("```")[1].split("```")[0].strip()
-                
-                # JSON parse et
-                parsed = json.loads(json_str)
-                
-                # V2 Schema formatı kontrolü
-                if isinstance(parsed, dict):
-                    # Yeni V2 format (metadata, document, items, totals)
-                    if all(key in parsed for key in ["metadata", "document", "items", "totals"]):
-                        structured_data = parsed
-                        logger.info("✅ V2 schema detected")
-                    # Eski V1 format (raw_text, structured)
-                    elif "raw_text" in parsed and "structured" in parsed:
-                        text = parsed["raw_text"]
-                        structured_data = parsed["structured"]
-                        logger.info("✅ V1 schema detected (legacy)")
-                    # Direkt structured data
-                    else:
-                        structured_data = parsed
-                        logger.info("✅ Direct JSON structure")
-                    
-            except json.JSONDecodeError as e:
-                # JSON parse edilemezse, content'i text olarak kullan
-                logger.warning(f"⚠️ JSON parse error: {str(e)}")
-                text = content
-                structured_data = None
-            
-            # Token usage
-            token_count = response.usage.total_tokens
-            
-            return {
-                "text": text,
-                "structured_data": structured_data,
-                "confidence": 0.95,  # OpenAI confidence vermiyor, sabit değer
-                "token_count": token_count,
-                "metadata": {
-                    "model": response.model,
-                    "page_count": 1,  # Her çağrı 1 görsel işliyor
-                    "finish_reason": response.choices[0].finish_reason,
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens
-                },
-                "raw_response": {
-                    "content": content[:500]  # İlk 500 karakter
+                        }
+                    ]
                 }
+            ],
+            "max_tokens": 3000,  # Büyük fişler için yeterli
+            "temperature": 0.0,  # Tam deterministik sonuçlar
+            "top_p": 1.0,  # Determinizm için
+            "frequency_penalty": 0.0,  # Tekrar eden kelimeler/sayılar için önemli
+            "presence_penalty": 0.0  # Yeni token cezası yok
+        }
+        if self.structured_output:
+            request["response_format"] = accounting_response_format("receipt_ocr_v2", include_raw_text=True)
+        return request
+    
+    def build_result(
+        self,
+        content: str,
+        usage: Any,
+        finish_reason: Optional[str] = None,
+        response_model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """GPT yanıt metnini OCR sonucuna çevir (interaktif, streaming ve Batch API ortak)"""
+        # JSON parse etmeye çalış
+        structured_data = None
+        text = content
+        
+        try:
+            # JSON bulma ve temizleme (markdown code block), bozuk/kesilmiş ise yerel onarım
+            parsed, repair_flags = parse_gpt_json(content, "openai_vision")
+            text, structured_data = self._split_text_and_structure(parsed, content, repair_flags)
+                
+        except json.JSONDecodeError as e:
+            # JSON parse edilemezse, content'i text olarak kullan
+            logger.warning(f"⚠️ JSON parse error: {str(e)}")
+            text = content
+            structured_data = None
+        
+        return self._make_result(content, text, structured_data, usage, finish_reason, response_model)
+    
+    @staticmethod
+    def _split_text_and_structure(parsed: Any, content: str, repair_flags: List[str]) -> Tuple[str, Optional[Dict]]:
+        """Parse edilmiş yanıttan (ham metin, yapısal veri) çıkar"""
+        text = content
+        structured_data = None
+        
+        # Structured output: ham metin şemadaki ayrı alanda gelir
+        if isinstance(parsed, dict) and RAW_TEXT_FIELD in parsed:
+            text = parsed.pop(RAW_TEXT_FIELD) or content
+        
+        # V2 Schema formatı kontrolü
+        if isinstance(parsed, dict):
+            # Yeni V2 format (metadata, document, items, totals)
+            if all(key in parsed for key in ["metadata", "document", "items", "totals"]):
+                structured_data = parsed
+                if repair_flags:
+                    structured_data["validationFlags"] = list(parsed.get("validationFlags") or []) + repair_flags
+                logger.info("✅ V2 schema detected")
+            # Eski V1 format (raw_text, structured)
+            elif "raw_text" in parsed and "structured" in parsed:
+                text = parsed["raw_text"]
+                structured_data = parsed["structured"]
+                logger.info("✅ V1 schema detected (legacy)")
+            # Direkt structured data
+            else:
+                structured_data = parsed
+                logger.info("✅ Direct JSON structure")
+        elif isinstance(parsed, str):
+            text = parsed
+        
+        return text, structured_data
+    
+    @staticmethod
+    def _make_result(
+        content: str,
+        text: str,
+        structured_data: Optional[Dict],
+        usage: Any,
+        finish_reason: Optional[str] = None,
+        response_model: Optional[str] = None,
+        share: int = 1
+    ) -> Dict[str, Any]:
+        """
+        OCR sonuç sözlüğü
+        
+        share: Paketlenmiş istekte yanıtı paylaşan görsel sayısı (token'lar eşit bölünür)
+        """
+        # Token usage (statik prompt metni görselden önce: prefix cache'e girer)
+        token_count = usage.total_tokens if usage else 0
+        prompt_details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(prompt_details, "cached_tokens", None) or 0
+        
+        return {
+            "text": text,
+            "structured_data": structured_data,
+            "confidence": 0.95,  # OpenAI confidence vermiyor, sabit değer
+            "token_count": token_count // share,
+            "metadata": {
+                "model": response_model,
+                "page_count": 1,  # Her sonuç 1 görsele ait
+                "finish_reason": finish_reason,
+                "prompt_tokens": (usage.prompt_tokens if usage else 0) // share,
+                "completion_tokens": (usage.completion_tokens if usage else 0) // share,
+                "cached_tokens": cached_tokens // share
+            },
+            "raw_response": {
+                "content": content[:500]  # İlk 500 karakter
             }
+        }
+    
+    # ==================== PAKETLENMİŞ (ÇOK GÖRSELLİ) MOD ====================
+    
+    @staticmethod
+    def packed_keys(count: int) -> List[str]:
+        """Paketlenmiş istekte görsel etiketleri (img1, img2, ...)"""
+        return [f"img{i + 1}" for i in range(count)]
+    
+    def build_packed_request(self, images: List[bytes], prompt: str) -> Dict[str, Any]:
+        """
+        K görseli tek istekte gönderen chat.completions.create parametreleri
+        
+        Statik prompt K görsel için bir kez ödenir; her görselin önüne etiketi
+        yazılır ve yanıt {"receipts": {"<etiket>": <sonuç>}} olarak istenir.
+        """
+        keys = self.packed_keys(len(images))
+        content: List[Dict[str, Any]] = [
+            {"type": "text", "text": prompt},
+            {"type": "text", "text": PACKED_PROMPT_SECTION.format(count=len(keys), keys=", ".join(keys))}
+        ]
+        for key, image_bytes in zip(keys, images):
+            base64_image = base64.b64encode(image_bytes).decode('utf-8')
+            content.append({"type": "text", "text": f"Görsel {key}:"})
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:image/png;base64,{base64_image}", "detail": "high"}
+            })
+        
+        request = self.build_request(images[0], prompt)
+        request["messages"] = [{"role": "user", "content": content}]
+        request["max_tokens"] = min(request["max_tokens"] * len(keys), MAX_PACKED_OUTPUT_TOKENS)
+        request["response_format"] = (
+            packed_response_format(keys) if self.structured_output else {"type": "json_object"}
+        )
+        return request
+    
+    def split_packed_result(
+        self,
+        content: str,
+        usage: Any,
+        count: int,
+        finish_reason: Optional[str] = None,
+        response_model: Optional[str] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Paketlenmiş yanıtı görsel başına sonuçlara ayır
+        
+        Returns:
+            Görsel sırasıyla sonuçlar; eksik/bozuk olanlar None (tekli çağrıyla tekrar denenir)
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * count
+        try:
+            parsed, repair_flags = parse_gpt_json(content, "openai_vision/packed")
+        except json.JSONDecodeError as e:
+            logger.warning(f"⚠️ Packed Vision yanıtı parse edilemedi: {e}")
+            return results
+        
+        packed = parsed.get(PACKED_RESULTS_FIELD) if isinstance(parsed, dict) else None
+        if not isinstance(packed, dict):
+            logger.warning(f"⚠️ Packed Vision yanıtında '{PACKED_RESULTS_FIELD}' yok")
+            return results
+        
+        for index, key in enumerate(self.packed_keys(count)):
+            item = packed.get(key)
+            if not item:
+                continue
+            item_content = json.dumps(item, ensure_ascii=False)
+            text, structured_data = self._split_text_and_structure(item, item_content, repair_flags)
+            result = self._make_result(
+                item_content, text, structured_data,
+                usage, finish_reason, response_model, share=count
+            )
+            result["metadata"]["packed"] = {"size": count, "index": index}
+            results[index] = result
+        
+        missing = results.count(None)
+        if missing:
+            logger.warning(f"⚠️ Packed Vision: {missing}/{count} görselin sonucu eksik")
+        return results
+    
+    async def process_images_packed(
+        self,
+        images: List[bytes],
+        prompt: Optional[str] = None,
+        prompt_version: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        K görseli tek çağrıda işle; ayrıştırılamayanlar tek tek process_image ile tekrar denenir
+        
+        Args:
+            images: Ön işlenmiş görseller
+            prompt: Custom prompt
+            prompt_version: Prompt versiyonu
             
-        except Exception as e:
-            raise Exception(f"OpenAI Vision hatası: {str(e)}")
+        Returns:
+            Görsel sırasıyla OCR sonuçları
+        """
+        prompt = self.resolve_prompt(prompt, prompt_version)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        
+        if len(images) > 1:
+            try:
+                response = await self.client.chat.completions.create(**self.build_packed_request(images, prompt))
+                choice = response.choices[0]
+                results = self.split_packed_result(
+                    choice.message.content or "", response.usage, len(images),
+                    choice.finish_reason, response.model
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Packed Vision çağrısı başarısız, tekli çağrılara dönülüyor: {e}")
+        
+        # Fallback: eksik sonuçlar tekli çağrıyla
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = await self.process_image(images[index], prompt)
+        return results
+    
+    @staticmethod
+    async def _consume_stream(stream, on_partial: PartialCallback):
+        """
+        Streaming yanıtı tüket, tamamlanan JSON parçalarını on_partial'a ilet
+        
+        Returns:
+            (içerik, usage, finish_reason, model)
+        """
+        parser = IncrementalJSONParser()
+        usage = None
+        finish_reason = None
+        response_model = None
+        async for chunk in stream:
+            response_model = response_model or chunk.model
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            finish_reason = choice.finish_reason or finish_reason
+            if choice.delta.content:
+                for event, data in parser.feed(choice.delta.content):
+                    await on_partial(event, data)
+        return parser.text, usage, finish_reason, response_model
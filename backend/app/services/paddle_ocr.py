@@ -1,4 +1,5 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import json
 import logging
 from .base import BaseOCRService
 import aiohttp
@@ -10,6 +11,9 @@ logger = logging.getLogger(__name__)
 class PaddleOCRService(BaseOCRService):
     """PaddleOCR Mikroservis Client (Port 8001)"""
     
+    # Hazır olduğu doğrulanmış servis URL'leri (process-wide, /readyz sonucu)
+    _ready_services: set = set()
+    
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.model_name = "paddle_ocr"
@@ -22,8 +26,47 @@ class PaddleOCRService(BaseOCRService):
         
         # Mikroservis URL
         self.service_url = config.get("paddle_service_url", "http://localhost:8001")
+        self.lang = config.get("lang") or None
+        # Bölge bazlı OCR: detection/recognition sadece bu alanlarda çalışır
+        # ({x, y, width, height}; 0-1 arası oransal, aksi halde piksel)
+        self.crops: List[Dict[str, float]] = config.get("crops") or []
         logger.info(f"PaddleOCR mikroservis URL: {self.service_url}")
     
+    def preprocess_image(self, image_bytes: bytes) -> Tuple[bytes, Dict[str, Any]]:
+        """Ön işleme; görsel küçültüldüyse piksel crop'lar da aynı oranla ölçeklenir"""
+        processed_bytes, metadata = super().preprocess_image(image_bytes)
+        if self.crops and metadata.get("resized"):
+            ratio = metadata["new_size"][0] / metadata["original_size"][0]
+            self.crops = [
+                crop if max(crop.values()) <= 1.0 else {key: value * ratio for key, value in crop.items()}
+                for crop in self.crops
+            ]
+        return processed_bytes, metadata
+    
+    async def _ensure_ready(self, session: aiohttp.ClientSession):
+        """
+        Mikroservisin /readyz probe'unu kontrol et
+        
+        Model yüklenip warm-up bitene kadar Paddle işi gönderilmez.
+        Başarılı sonuç cache'lenir, her istekte tekrar sorulmaz.
+        """
+        if self.service_url in PaddleOCRService._ready_services:
+            return
+        
+        async with session.get(
+            f"{self.service_url}/readyz",
+            timeout=aiohttp.ClientTimeout(total=5)
+        ) as response:
+            if response.status != 200:
+                raise Exception("PaddleOCR mikroservis henüz hazır değil (model yükleniyor)")
+            readiness = await response.json()
+        
+        PaddleOCRService._ready_services.add(self.service_url)
+        logger.info(
+            f"PaddleOCR mikroservis hazır (model load: {readiness.get('model_load_ms')} ms, "
+            f"warm-up: {readiness.get('warmup_ms')} ms)"
+        )
+    
     async def process_image(
         self,
         image_bytes: bytes,
@@ -44,6 +87,9 @@ class PaddleOCRService(BaseOCRService):
             
             # Mikroservise HTTP POST isteği
             async with aiohttp.ClientSession() as session:
+                # Servis hazır değilse işi yönlendirme
+                await self._ensure_ready(session)
+                
                 # Multipart form data oluştur
                 form = aiohttp.FormData()
                 form.add_field(
@@ -52,6 +98,10 @@ class PaddleOCRService(BaseOCRService):
                     filename='image.jpg',
                     content_type='image/jpeg'
                 )
+                if self.lang:
+                    form.add_field('lang', self.lang)
+                if self.crops:
+                    form.add_field('crops', json.dumps(self.crops))
                 
                 # İstek gönder
                 async with session.post(
@@ -59,6 +109,9 @@ class PaddleOCRService(BaseOCRService):
                     data=form,
                     timeout=aiohttp.ClientTimeout(total=60)
                 ) as response:
+                    if response.status == 503:
+                        # Servis yeniden başlamış olabilir, readiness'i tekrar sor
+                        PaddleOCRService._ready_services.discard(self.service_url)
                     if response.status != 200:
                         error_text = await response.text()
                         raise Exception(f"Mikroservis hatası (HTTP {response.status}): {error_text}")
@@ -75,6 +128,7 @@ class PaddleOCRService(BaseOCRService):
                 "token_count": None,
                 "metadata": {
                     "line_count": result.get("line_count", 0),
+                    "crop_count": len(self.crops),
                     "page_count": 1,  # Her çağrı 1 sayfa işliyor
                     "service": "PaddleOCR Mikroservis",
                     "microservice_url": self.service_url
@@ -1,28 +1,36 @@
 """
 Muhasebe analiz prompt'larını versiyonlu olarak yöneten servis
+
+Process genelinde tek instance (get_prompt_manager) kullanılır; prompt dosyaları
+bellekte tutulur ve dosyanın mtime'ı değiştiğinde (başka process/elle düzenleme)
+yeniden okunur.
 """
+import copy
 import json
 import os
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import tiktoken
 
 logger = logging.getLogger(__name__)
 
 
+# Model bazında versiyon index'i (versiyon -> dosya, tarih, schema, token sayısı)
+INDEX_FILE = "index.json"
+
+
 class PromptManager:
     """Model bazında muhasebe analiz prompt'larını yönetir"""
     
     def __init__(self, storage_path: str = "prompts"):
         self.storage_path = Path(storage_path)
         self.storage_path.mkdir(exist_ok=True)
-        # Token encoding for GPT-4
-        try:
-            self.encoding = tiktoken.encoding_for_model("gpt-4")
-        except:
-            self.encoding = tiktoken.get_encoding("cl100k_base")
+        # Dosya yolu -> (mtime_ns, JSON içeriği); mtime değişince yeniden okunur
+        self._file_cache: Dict[Path, Tuple[int, Dict]] = {}
+        # Token encoding (lazy: sadece token sayımı gerektiğinde yüklenir)
+        self._encoding = None
         
         # Varsayılan prompt'lar - HER MODEL İÇİN ÖZELLEŞTİRİLMİŞ
         self.default_prompts = {
@@ -194,64 +202,194 @@ Bu OCR çıktısı Amazon Textract tarafından üretildi - HIZLI ve BASİT text
         # İlk açılışta dosyalar yoksa oluştur
         self._initialize_prompts()
     
+    @property
+    def encoding(self):
+        """GPT-4 token encoding (ilk kullanımda yüklenir)"""
+        if self._encoding is None:
+            try:
+                self._encoding = tiktoken.encoding_for_model("gpt-4")
+            except:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+        return self._encoding
+    
     def _initialize_prompts(self):
         """Varsayılan prompt dosyalarını oluştur"""
         for model_name, data in self.default_prompts.items():
             file_path = self.storage_path / f"{model_name}.json"
             if not file_path.exists():
+                data = {**data, "token_count": self.count_tokens(data["prompt"])}
                 self._save_prompt_file(model_name, data)
+                self._update_index(model_name, [(file_path, data)], current_version=data["version"])
     
-    def _get_prompt_file_path(self, model_name: str) -> Path:
-        """Model için prompt dosya yolunu döner"""
-        return self.storage_path / f"{model_name}.json"
+    def _read_json(self, file_path: Path) -> Optional[Dict]:
+        """
+        JSON dosyasını bellekten ver; dosya değiştiyse (mtime) yeniden oku
+        
+        Çağıran sonucu değiştirebileceği için kopya döner.
+        """
+        try:
+            mtime = file_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._file_cache.pop(file_path, None)
+            return None
+        
+        cached = self._file_cache.get(file_path)
+        if cached is None or cached[0] != mtime:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                cached = (mtime, json.load(f))
+            self._file_cache[file_path] = cached
+        return dict(cached[1])
     
-    def _save_prompt_file(self, model_name: str, data: Dict):
-        """Prompt'u dosyaya kaydet"""
-        file_path = self._get_prompt_file_path(model_name)
-        with open(file_path, 'w', encoding='utf-8') as f:
+    def _write_json(self, file_path: Path, data: Dict):
+        """JSON dosyasını atomik yaz (yarım dosya okunmasın) ve cache'i güncelle"""
+        tmp_path = file_path.with_suffix(file_path.suffix + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, file_path)
+        self._file_cache[file_path] = (file_path.stat().st_mtime_ns, dict(data))
     
-    def _load_prompt_file(self, model_name: str) -> Optional[Dict]:
-        """Prompt'u dosyadan yükle"""
-        file_path = self._get_prompt_file_path(model_name)
-        if not file_path.exists():
-            return None
-        
+    def _history_file_path(self, model_name: str, version: int) -> Path:
+        """Geçmiş versiyon dosya yolu"""
+        return self.storage_path / "history" / f"{model_name}_v{version}.json"
+    
+    def _save_history_file(self, model_name: str, data: Dict):
+        """Versiyonu history klasörüne kaydet"""
+        history_file = self._history_file_path(model_name, data.get("version"))
+        history_file.parent.mkdir(exist_ok=True)
+        self._write_json(history_file, data)
+    
+    def warm(self):
+        """Tüm güncel ve geçmiş prompt'ları belleğe al (startup'ta, ilk istek diskten okumasın)"""
+        count = 0
+        for directory in (self.storage_path, self.storage_path / "history"):
+            if not directory.exists():
+                continue
+            for file_path in directory.glob("*.json"):
+                try:
+                    self._read_json(file_path)
+                    count += 1
+                except Exception as e:
+                    logger.error(f"Error warming prompt file {file_path}: {e}")
+        self._load_index()
+        logger.info(f"✅ Prompt cache warmed: {count} files")
+    
+    # ==================== Versiyon index'i ====================
+    
+    def _index_path(self) -> Path:
+        return self.storage_path / INDEX_FILE
+    
+    def _load_index(self) -> Dict:
+        """Versiyon index'i (yoksa dosyalardan bir kez oluşturulur)"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            index = self._read_json(self._index_path())
         except Exception as e:
-            logger.error(f"Error loading prompt for {model_name}: {e}", exc_info=True)
-            return None
+            logger.error(f"Error loading prompt index, rebuilding: {e}")
+            index = None
+        if index is None:
+            index = self._rebuild_index()
+        return index
     
-    def _load_json_files(self, pattern: str, directory: Optional[Path] = None) -> List[Dict]:
+    def _version_entry(self, file_path: Path, data: Dict) -> Dict:
+        """Index'te bir versiyonun özeti (prompt metni olmadan)"""
+        entry = {
+            "version": data.get("version"),
+            "file": file_path.relative_to(self.storage_path).as_posix(),
+            "created_at": data.get("created_at"),
+            "schema_version": data.get("schema_version"),
+            "token_count": self._stored_token_count(data)
+        }
+        for key in ("previous_version", "restored_from_version"):
+            if data.get(key) is not None:
+                entry[key] = data[key]
+        return entry
+    
+    def _stored_token_count(self, data: Dict) -> int:
+        """Kayıtta saklanan token sayısı (token_count'suz eski kayıtlarda bir kez hesaplanır)"""
+        token_count = data.get("token_count")
+        if token_count is None:
+            token_count = self.count_tokens(data.get("prompt", ""))
+        return token_count
+    
+    def get_token_count(self, model_name: str, version: Optional[int] = None) -> Optional[int]:
         """
-        Belirtilen pattern'e uyan JSON dosyalarını yükler
+        Versiyonun token sayısı (index'ten, tokenizer yüklenmez)
         
         Args:
-            pattern: Glob pattern (örn: "model_name_v*.json")
-            directory: Aranacak dizin (None ise self.storage_path kullanılır)
-            
-        Returns:
-            Yüklenmiş JSON objelerinin listesi
+            model_name: Model adı
+            version: Versiyon (None ise güncel versiyon)
         """
-        search_dir = directory if directory else self.storage_path
-        if not search_dir.exists():
-            return []
-        
-        files = sorted(search_dir.glob(pattern))
-        result = []
+        model = self._model_index(model_name)
+        version = version if version is not None else model.get("current_version")
+        entry = model["versions"].get(str(version))
+        return entry.get("token_count") if entry else None
+    
+    def _rebuild_index(self) -> Dict:
+        """Tüm prompt dosyalarını tarayıp index'i oluştur (ilk çalışma / index'siz eski kurulum)"""
+        models: Dict[str, Dict] = {}
         
-        for file_path in files:
+        def add(model_name: str, file_path: Path, is_current: bool):
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    result.append(data)
+                data = self._read_json(file_path)
             except Exception as e:
-                logger.error(f"Error loading JSON file {file_path}: {e}")
-                continue
+                logger.error(f"Error indexing prompt file {file_path}: {e}")
+                return
+            if not data or data.get("version") is None:
+                return
+            model = models.setdefault(model_name, {"current_version": None, "versions": {}})
+            model["versions"][str(data["version"])] = self._version_entry(file_path, data)
+            if is_current:
+                model["current_version"] = data["version"]
         
-        return result
+        for file_path in self.storage_path.glob("*.json"):
+            if file_path.name != INDEX_FILE:
+                add(file_path.stem, file_path, is_current=True)
+        history_path = self.storage_path / "history"
+        if history_path.exists():
+            for file_path in history_path.glob("*_v*.json"):
+                add(file_path.stem.rsplit("_v", 1)[0], file_path, is_current=False)
+        
+        index = {"models": models}
+        self._write_json(self._index_path(), index)
+        logger.info(f"✅ Prompt version index rebuilt: {len(models)} models")
+        return index
+    
+    def _update_index(
+        self,
+        model_name: str,
+        entries: List[Tuple[Path, Dict]],
+        removed: Optional[List[int]] = None,
+        current_version: Optional[int] = None
+    ):
+        """Index'i güncelle ve atomik yaz (kaydet / geri yükle / sil)"""
+        index = copy.deepcopy(self._load_index())
+        model = index["models"].setdefault(model_name, {"current_version": None, "versions": {}})
+        for file_path, data in entries:
+            model["versions"][str(data["version"])] = self._version_entry(file_path, data)
+        for version in removed or []:
+            model["versions"].pop(str(version), None)
+        if current_version is not None:
+            model["current_version"] = current_version
+        self._write_json(self._index_path(), index)
+    
+    def _model_index(self, model_name: str) -> Dict:
+        return self._load_index()["models"].get(model_name) or {"current_version": None, "versions": {}}
+    
+    def _get_prompt_file_path(self, model_name: str) -> Path:
+        """Model için prompt dosya yolunu döner"""
+        return self.storage_path / f"{model_name}.json"
+    
+    def _save_prompt_file(self, model_name: str, data: Dict):
+        """Prompt'u dosyaya kaydet"""
+        self._write_json(self._get_prompt_file_path(model_name), data)
+    
+    def _load_prompt_file(self, model_name: str) -> Optional[Dict]:
+        """Prompt'u dosyadan yükle"""
+        file_path = self._get_prompt_file_path(model_name)
+        try:
+            return self._read_json(file_path)
+        except Exception as e:
+            logger.error(f"Error loading prompt for {model_name}: {e}", exc_info=True)
+            return None
     
     def get_prompt(self, model_name: str, version: Optional[int] = None) -> Dict:
         """
@@ -276,7 +414,7 @@ Bu OCR çıktısı Amazon Textract tarafından üretildi - HIZLI ve BASİT text
         # Dosya yoksa varsayılan prompt'u kullan
         if not data:
             if model_name in self.default_prompts:
-                return self.default_prompts[model_name]
+                return dict(self.default_prompts[model_name])
             else:
                 # Genel varsayılan
                 return {
@@ -320,19 +458,17 @@ Bu OCR çıktısı Amazon Textract tarafından üretildi - HIZLI ve BASİT text
             "schema_version": schema_version,
             "created_at": datetime.now().isoformat(),
             "prompt": new_prompt,
-            "previous_version": current_data.get("version") if current_data else None
+            "previous_version": current_data.get("version") if current_data else None,
+            "token_count": self.count_tokens(new_prompt)  # Kayıtta bir kez hesaplanır
         }
         
         # Geçmişe kaydet (opsiyonel)
         if current_data:
-            history_path = self.storage_path / "history"
-            history_path.mkdir(exist_ok=True)
-            history_file = history_path / f"{model_name}_v{current_data.get('version')}.json"
-            with open(history_file, 'w', encoding='utf-8') as f:
-                json.dump(current_data, f, indent=2, ensure_ascii=False)
+            self._save_history_file(model_name, current_data)
         
         # Yeni prompt'u kaydet
         self._save_prompt_file(model_name, new_data)
+        self._index_new_current(model_name, current_data, new_data)
         
         return new_data
     
@@ -346,11 +482,7 @@ Bu OCR çıktısı Amazon Textract tarafından üretildi - HIZLI ve BASİT text
         # Mevcut versiyonu history'e kaydet
         current_data = self._load_prompt_file(model_name)
         if current_data:
-            history_path = self.storage_path / "history"
-            history_path.mkdir(exist_ok=True)
-            history_file = history_path / f"{model_name}_v{current_data.get('version')}.json"
-            with open(history_file, 'w', encoding='utf-8') as f:
-                json.dump(current_data, f, indent=2, ensure_ascii=False)
+            self._save_history_file(model_name, current_data)
         
         # Hedef versiyonu yeni versiyon numarasıyla kaydet
         new_version = current_data.get("version", 0) + 1 if current_data else 1
@@ -359,38 +491,38 @@ Bu OCR çıktısı Amazon Textract tarafından üretildi - HIZLI ve BASİT text
             "created_at": datetime.now().isoformat(),
             "prompt": target_version["prompt"],
             "previous_version": current_data.get("version") if current_data else None,
-            "restored_from_version": version
+            "restored_from_version": version,
+            "token_count": self._stored_token_count(target_version)
         }
         
         # Kaydet
         self._save_prompt_file(model_name, restored_data)
+        self._index_new_current(model_name, current_data, restored_data)
         
         return restored_data
     
+    def _index_new_current(self, model_name: str, previous: Optional[Dict], current: Dict):
+        """Yeni güncel versiyonu ve history'e taşınan eskisini index'e yaz"""
+        entries = [(self._get_prompt_file_path(model_name), current)]
+        if previous:
+            entries.append((self._history_file_path(model_name, previous.get("version")), previous))
+        self._update_index(model_name, entries, current_version=current["version"])
+    
     def get_prompt_history(self, model_name: str) -> List[Dict]:
-        """Model için prompt geçmişini getir (tüm versiyonlar)"""
-        history_path = self.storage_path / "history"
-        
-        # History'den tüm versiyonları yükle (utility fonksiyon kullanarak)
-        history = self._load_json_files(
-            pattern=f"{model_name}_v*.json",
-            directory=history_path
-        )
-        
-        # Mevcut versiyonu da ekle
-        current = self._load_prompt_file(model_name)
-        if current:
-            history.append(current)
+        """
+        Model için prompt geçmişini getir (tüm versiyonlar, yeniden eskiye)
         
-        return sorted(history, key=lambda x: x.get("version", 0), reverse=True)
+        Sadece index okunur: versiyon özetleri döner, prompt metni için load_version kullanılır.
+        """
+        versions = self._model_index(model_name)["versions"].values()
+        return sorted((dict(v) for v in versions), key=lambda x: x.get("version", 0), reverse=True)
     
     def get_all_prompts(self) -> Dict[str, Dict]:
         """Tüm modellerin prompt'larını getir"""
         result = {}
         
-        # Tüm JSON dosyalarını tara
-        for file_path in self.storage_path.glob("*.json"):
-            model_name = file_path.stem
+        # Index'teki modellerin güncel prompt'ları (dizin taranmaz)
+        for model_name in self._load_index()["models"]:
             data = self._load_prompt_file(model_name)
             if data:
                 result[model_name] = data
@@ -405,15 +537,12 @@ Bu OCR çıktısı Amazon Textract tarafından üretildi - HIZLI ve BASİT text
     def load_version(self, model_name: str, version: int) -> Optional[Dict]:
         """Belirli bir versiyon numarasını yükle"""
         # Önce history'den bak
-        history_path = self.storage_path / "history"
-        if history_path.exists():
-            history_file = history_path / f"{model_name}_v{version}.json"
-            if history_file.exists():
-                try:
-                    with open(history_file, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-                except Exception as e:
-                    logger.error(f"Error loading version {version} for {model_name}: {e}")
+        try:
+            data = self._read_json(self._history_file_path(model_name, version))
+            if data is not None:
+                return data
+        except Exception as e:
+            logger.error(f"Error loading version {version} for {model_name}: {e}")
         
         # Mevcut versiyon mu?
         current = self._load_prompt_file(model_name)
@@ -437,6 +566,8 @@ Bu OCR çıktısı Amazon Textract tarafından üretildi - HIZLI ve BASİT text
             if history_file.exists():
                 try:
                     history_file.unlink()
+                    self._file_cache.pop(history_file, None)
+                    self._update_index(model_name, [], removed=[version])
                     logger.info(f"Deleted version {version} for {model_name}")
                     return True
                 except Exception as e:
@@ -483,33 +614,7 @@ Bu OCR çıktısı Amazon Textract tarafından üretildi - HIZLI ve BASİT text
         Returns:
             Mevcut versiyon numaraları listesi (artan sırada)
         """
-        versions = []
-        
-        # Ana prompt dosyasından güncel versiyonu al
-        main_file = self.storage_path / f"{model_name}.json"
-        if main_file.exists():
-            try:
-                with open(main_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    current_version = data.get("version", 1)
-                    versions.append(current_version)
-            except Exception as e:
-                logger.error(f"Error reading main prompt file for {model_name}: {e}")
-        
-        # History klasöründen diğer versiyonları al (utility fonksiyon kullanarak)
-        history_dir = self.storage_path / "history"
-        history_data = self._load_json_files(
-            pattern=f"{model_name}_v*.json",
-            directory=history_dir
-        )
-        
-        for data in history_data:
-            version = data.get("version")
-            if version and version not in versions:
-                versions.append(version)
-        
-        # Sırala ve döndür
-        versions.sort()
+        versions = sorted(int(v) for v in self._model_index(model_name)["versions"])
         
         # Eğer hiç versiyon bulunamazsa, 1 döndür (default)
         if not versions:
@@ -517,3 +622,21 @@ Bu OCR çıktısı Amazon Textract tarafından üretildi - HIZLI ve BASİT text
             versions = [1]
         
         return versions
+
+
+# Global singleton instance
+_prompt_manager_instance: Optional[PromptManager] = None
+
+
+def get_prompt_manager() -> PromptManager:
+    """
+    Global PromptManager instance'ını döner (singleton pattern)
+    
+    Her istekte/servis oluşturulurken yeni instance (tokenizer yükleme, mkdir,
+    varsayılan dosya kontrolü, her get_prompt'ta disk okuma) yerine tek instance
+    ve bellek cache'i kullanılır.
+    """
+    global _prompt_manager_instance
+    if _prompt_manager_instance is None:
+        _prompt_manager_instance = PromptManager()
+    return _prompt_manager_instance
@@ -0,0 +1,352 @@
+"""
+Sağlayıcıya özgü yapısal OCR çıktısını V2 muhasebe verisine eşleyen mapper'lar
+
+Google DocAI (expense/invoice parser) tipli entity'ler, Amazon Textract
+AnalyzeExpense ise tipli özet alanları ve kalem grupları döndürür. Bu değerler
+GPT'ye metin olarak verilip tekrar çıkarılmak yerine doğrudan V2 yapısına
+(document, items, totals + fieldConfidence) çevrilir. Sonuç RuleBasedExtractor
+ile aynı kontrollerden geçerse AccountingService GPT'yi atlar; geçmezse eşlenen
+veri GPT'ye ön-parse edilmiş veri olarak gider ve GPT sadece eksikleri tamamlar.
+"""
+
+import logging
+import re
+from typing import Dict, Any, List, Optional
+
+from .rule_based_extractor import (
+    parse_amount,
+    is_valid_vkn,
+    is_valid_tckn,
+    DATE_PATTERN,
+    TIME_PATTERN,
+    ITEM_VAT_PATTERN,
+    VALID_VAT_RATES
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Bu güvenin altındaki sağlayıcı değerleri kullanılmaz (DocAI structured_data ile aynı eşik)
+MIN_CONFIDENCE = 0.5
+
+# DocAI entity tipi -> V2 document alanı
+DOCAI_DOCUMENT_FIELDS = {
+    "supplier_name": "merchantName",
+    "supplier_address": "address",
+    "receipt_date": "date",
+    "invoice_date": "date",
+    "purchase_time": "time",
+    "receipt_id": "receiptNo",
+    "invoice_id": "invoiceNo",
+}
+DOCAI_TAX_ID_TYPES = {"supplier_tax_id", "supplier_registration"}
+
+# Textract özet alanı tipi -> V2 document alanı
+TEXTRACT_DOCUMENT_FIELDS = {
+    "VENDOR_NAME": "merchantName",
+    "NAME": "merchantName",
+    "VENDOR_ADDRESS": "address",
+    "ADDRESS": "address",
+    "INVOICE_RECEIPT_DATE": "date",
+    "INVOICE_RECEIPT_ID": "receiptNo",
+}
+TEXTRACT_TAX_ID_TYPES = {"TAX_PAYER_ID", "VENDOR_VAT_NUMBER"}
+
+# KDV satırı etiketi (Textract TAX/OTHER alanları): "KDV %20", "%8 KDV", "TOPKDV"
+VAT_LABEL_PATTERN = re.compile(r"K\.?D\.?V|TAX|VAT", re.IGNORECASE)
+
+
+# ==================== Ortak yardımcılar ====================
+
+def _amount(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return round(float(value), 2)
+    return parse_amount(str(value or "").replace("TL", "").replace("₺", "").strip())
+
+
+def _date(value: Optional[str]) -> Optional[str]:
+    """ISO (YYYY-MM-DD) veya Türkçe (DD.MM.YYYY) tarihi DD/MM/YYYY'ye çevir"""
+    if not value:
+        return None
+    iso = re.search(r"(\d{4})-(\d{2})-(\d{2})", value)
+    if iso:
+        return f"{iso.group(3)}/{iso.group(2)}/{iso.group(1)}"
+    match = DATE_PATTERN.search(value)
+    if match:
+        return f"{match.group(1)}/{match.group(2)}/{match.group(3)}"
+    return None
+
+
+def _time(value: Optional[str]) -> Optional[str]:
+    match = TIME_PATTERN.search(value or "")
+    return f"{match.group(1)}:{match.group(2)}" if match else None
+
+
+def _vat_rate(text: Optional[str]) -> Optional[int]:
+    match = ITEM_VAT_PATTERN.search(text or "")
+    if match and int(match.group(1)) in VALID_VAT_RATES:
+        return int(match.group(1))
+    return None
+
+
+def _set_tax_id(document: Dict[str, Any], confidence: Dict[str, float], value: str, score: float):
+    """VKN (10 hane) / TCKN (11 hane) ayrımı"""
+    digits = re.sub(r"\D", "", value or "")
+    if len(digits) == 10:
+        document["merchantVKN"] = digits
+        confidence["document.merchantVKN"] = score if is_valid_vkn(digits) else min(score, 0.5)
+    elif len(digits) == 11:
+        document["merchantTCKN"] = digits
+        confidence["document.merchantTCKN"] = score if is_valid_tckn(digits) else min(score, 0.5)
+
+
+def _set_document_field(document: Dict[str, Any], confidence: Dict[str, float], field: str, value: str, score: float):
+    if field == "date":
+        value = _date(value)
+    elif field == "time":
+        value = _time(value)
+    elif value:
+        value = value.replace("\n", " ").strip()
+    if value and score >= confidence.get(f"document.{field}", 0.0):
+        document[field] = value
+        confidence[f"document.{field}"] = round(score, 2)
+
+
+def _finalize(
+    source: str,
+    document: Dict[str, Any],
+    items: List[Dict[str, Any]],
+    totals: Dict[str, Any],
+    vat_by_rate: Dict[int, float],
+    confidence: Dict[str, float]
+) -> Dict[str, Any]:
+    """Kalem KDV'leri, KDV dökümü ve matrahları tamamla; RuleBasedExtractor ile aynı V2 yapısını döndür"""
+    rates = sorted(vat_by_rate)
+    for item in items:
+        if item.get("vatRate") is None and len(rates) == 1:
+            item["vatRate"] = rates[0]
+        rate = item.get("vatRate")
+        if rate is not None and item.get("grossAmount") is not None:
+            item["vatAmount"] = round(item["grossAmount"] * rate / (100 + rate), 2) if rate else 0.0
+            item["netAmount"] = round(item["grossAmount"] - item["vatAmount"], 2)
+        item.setdefault("quantity", 1)
+        item.setdefault("unitPrice", item.get("grossAmount"))
+
+    breakdown = []
+    for rate in rates:
+        vat_amount = vat_by_rate[rate]
+        gross = sum(item["grossAmount"] for item in items if item.get("vatRate") == rate)
+        tax_base = round(gross - vat_amount, 2) if gross > 0 else (round(vat_amount * 100 / rate, 2) if rate else 0.0)
+        breakdown.append({"vatRate": rate, "taxBase": tax_base, "vatAmount": vat_amount})
+    totals["vatBreakdown"] = breakdown
+    if "totalVat" not in totals and breakdown:
+        totals["totalVat"] = round(sum(v["vatAmount"] for v in breakdown), 2)
+        confidence["totals.totalVat"] = 0.7
+    totals.setdefault("currency", "TRY")
+
+    if items:
+        confidence["items"] = round(min(item.get("confidence", 0.0) for item in items), 2)
+
+    return {
+        "metadata": {
+            "source": source,
+            "ocrQualityScore": round(sum(confidence.values()) / len(confidence), 2) if confidence else 0.0,
+            "vatTreatment": "included"
+        },
+        "document": document,
+        "items": items,
+        "totals": totals,
+        "fieldConfidence": confidence
+    }
+
+
+# ==================== Google DocAI ====================
+
+def map_docai_entities(entities: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    DocAI entity listesini V2 yapısına çevir
+
+    Args:
+        entities: [{type, mention_text, confidence, normalized_value?, properties?}]
+
+    Returns:
+        V2 veri (+ fieldConfidence) veya eşlenecek entity yoksa None
+    """
+    document: Dict[str, Any] = {}
+    items: List[Dict[str, Any]] = []
+    totals: Dict[str, Any] = {}
+    vat_by_rate: Dict[int, float] = {}
+    confidence: Dict[str, float] = {}
+
+    for entity in entities or []:
+        entity_type = entity.get("type", "")
+        score = float(entity.get("confidence") or 0.0)
+        if score < MIN_CONFIDENCE:
+            continue
+        text = entity.get("normalized_value") or entity.get("mention_text") or ""
+        props = {
+            p.get("type", "").split("/")[-1]: p.get("normalized_value") or p.get("mention_text")
+            for p in entity.get("properties") or []
+        }
+
+        if entity_type in DOCAI_DOCUMENT_FIELDS:
+            _set_document_field(document, confidence, DOCAI_DOCUMENT_FIELDS[entity_type], text, score)
+        elif entity_type in DOCAI_TAX_ID_TYPES:
+            _set_tax_id(document, confidence, entity.get("mention_text", ""), score)
+        elif entity_type == "total_amount":
+            amount = _amount(text)
+            if amount is not None:
+                totals["totalAmount"] = amount
+                confidence["totals.totalAmount"] = round(score, 2)
+        elif entity_type == "total_tax_amount":
+            amount = _amount(text)
+            if amount is not None:
+                totals["totalVat"] = amount
+                confidence["totals.totalVat"] = round(score, 2)
+        elif entity_type == "currency" and text:
+            totals["currency"] = text.strip().upper().replace("TL", "TRY")
+        elif entity_type == "vat":
+            rate = _vat_rate("%" + str(props.get("tax_rate") or "").replace("%", "").strip())
+            amount = _amount(props.get("tax_amount"))
+            if rate is not None and amount is not None:
+                vat_by_rate[rate] = amount
+                confidence[f"totals.vatBreakdown.{rate}"] = round(score, 2)
+        elif entity_type == "line_item":
+            gross = _amount(props.get("amount"))
+            description = (props.get("description") or entity.get("mention_text") or "").strip()
+            if gross is None or not description:
+                continue
+            item: Dict[str, Any] = {
+                "description": description,
+                "grossAmount": gross,
+                "vatRate": _vat_rate(entity.get("mention_text")),
+                "confidence": round(score, 2)
+            }
+            quantity = _amount(props.get("quantity"))
+            unit_price = _amount(props.get("unit_price"))
+            if quantity:
+                item["quantity"] = quantity
+            if unit_price is not None:
+                item["unitPrice"] = unit_price
+            items.append(item)
+
+    if not (document or items or totals):
+        return None
+    return _finalize("google_docai", document, items, totals, vat_by_rate, confidence)
+
+
+# ==================== Amazon Textract ====================
+
+def _field_text(field: Dict[str, Any], key: str) -> str:
+    return ((field.get(key) or {}).get("Text") or "").strip()
+
+
+def _field_confidence(field: Dict[str, Any]) -> float:
+    """Textract güveni 0-100 aralığında"""
+    return float((field.get("ValueDetection") or {}).get("Confidence") or 0.0) / 100
+
+
+def map_textract_expense(expense_documents: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Textract AnalyzeExpense ExpenseDocuments listesini V2 yapısına çevir
+
+    Args:
+        expense_documents: [{SummaryFields: [...], LineItemGroups: [...]}]
+
+    Returns:
+        V2 veri (+ fieldConfidence) veya eşlenecek alan yoksa None
+    """
+    document: Dict[str, Any] = {}
+    items: List[Dict[str, Any]] = []
+    totals: Dict[str, Any] = {}
+    vat_by_rate: Dict[int, float] = {}
+    confidence: Dict[str, float] = {}
+
+    for expense in expense_documents or []:
+        for field in expense.get("SummaryFields") or []:
+            field_type = _field_text(field, "Type")
+            label = _field_text(field, "LabelDetection")
+            value = _field_text(field, "ValueDetection")
+            score = _field_confidence(field)
+            if not value or score < MIN_CONFIDENCE:
+                continue
+
+            if field_type in TEXTRACT_DOCUMENT_FIELDS:
+                _set_document_field(document, confidence, TEXTRACT_DOCUMENT_FIELDS[field_type], value, score)
+            elif field_type in TEXTRACT_TAX_ID_TYPES:
+                _set_tax_id(document, confidence, value, score)
+            elif field_type == "TOTAL":
+                amount = _amount(value)
+                if amount is not None:
+                    # Birden fazla TOTAL varsa en büyüğü (ara toplam değil genel toplam)
+                    if amount >= totals.get("totalAmount", 0.0):
+                        totals["totalAmount"] = amount
+                        confidence["totals.totalAmount"] = round(score, 2)
+                    currency = (field.get("Currency") or {}).get("Code")
+                    if currency:
+                        totals["currency"] = currency
+            elif field_type in ("TAX", "OTHER") and VAT_LABEL_PATTERN.search(label):
+                amount = _amount(value)
+                if amount is None:
+                    continue
+                rate = _vat_rate(label)
+                if rate is not None:
+                    vat_by_rate[rate] = amount
+                    confidence[f"totals.vatBreakdown.{rate}"] = round(score, 2)
+                elif field_type == "TAX":
+                    totals["totalVat"] = amount
+                    confidence["totals.totalVat"] = round(score, 2)
+            elif field_type == "OTHER" and _time(value) and "time" not in document:
+                _set_document_field(document, confidence, "time", value, score)
+
+        for group in expense.get("LineItemGroups") or []:
+            for line_item in group.get("LineItems") or []:
+                fields = {
+                    _field_text(f, "Type"): f
+                    for f in line_item.get("LineItemExpenseFields") or []
+                }
+                price = fields.get("PRICE")
+                description = _field_text(fields.get("ITEM") or {}, "ValueDetection")
+                gross = _amount(_field_text(price or {}, "ValueDetection"))
+                if gross is None or not description:
+                    continue
+                row = _field_text(fields.get("EXPENSE_ROW") or {}, "ValueDetection")
+                item: Dict[str, Any] = {
+                    "description": description,
+                    "grossAmount": gross,
+                    "vatRate": _vat_rate(row),
+                    "confidence": round(min(_field_confidence(price), _field_confidence(fields["ITEM"])), 2)
+                }
+                quantity = _amount(_field_text(fields.get("QUANTITY") or {}, "ValueDetection"))
+                unit_price = _amount(_field_text(fields.get("UNIT_PRICE") or {}, "ValueDetection"))
+                if quantity:
+                    item["quantity"] = quantity
+                if unit_price is not None:
+                    item["unitPrice"] = unit_price
+                items.append(item)
+
+    if not (document or items or totals):
+        return None
+    return _finalize("amazon_textract", document, items, totals, vat_by_rate, confidence)
+
+
+def map_provider_output(
+    model_name: str,
+    entities: Optional[List[Dict[str, Any]]] = None,
+    structured_data: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    OCR modeline göre uygun mapper'ı çalıştır
+
+    Returns:
+        V2 veri veya model için sağlayıcı yapısı yoksa None
+    """
+    try:
+        if model_name == "google_docai" and entities:
+            return map_docai_entities(entities)
+        if model_name == "amazon_textract" and isinstance(structured_data, dict) \
+                and structured_data.get("expenseDocuments"):
+            return map_textract_expense(structured_data["expenseDocuments"])
+    except Exception as e:
+        logger.warning(f"⚠️ {model_name} sağlayıcı çıktısı eşlenemedi: {e}")
+    return None
@@ -0,0 +1,340 @@
+"""
+Kural tabanlı (regex + Türk fiş sezgileri) muhasebe verisi çıkarıcı
+
+Temiz OCR çıktılarında (Textract, DocAI) VKN, tarih, fiş no, KDV satırları ve
+TOPLAM desenlerle bulunabilir. Çıktı V2 yapısındadır (document, items, totals);
+her alan için güven skoru `fieldConfidence` altında döner. Zorunlu alanlar
+doğrulanırsa AccountingService GPT çağrısını atlar.
+"""
+
+import re
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Türkiye'de geçerli KDV oranları (eski + güncel)
+VALID_VAT_RATES = {0, 1, 8, 10, 18, 20}
+
+# Tutar: 1.234,56 / 1234,56 / 1234.56 (opsiyonel * öneki)
+AMOUNT_PATTERN = r"\*?\s*(\d{1,3}(?:[.\s]\d{3})*,\d{2}|\d+[.,]\d{2})"
+
+VKN_PATTERN = re.compile(r"(?:V\.?\s*K\.?\s*N\.?|VERG[İI]\s*(?:K[İI]ML[İI]K\s*)?(?:NO|NUMARASI)|V\.?\s*D\.?)\D{0,25}?(\d{10})(?!\d)", re.IGNORECASE)
+TCKN_PATTERN = re.compile(r"(?:T\.?\s*C\.?\s*K\.?\s*N\.?|T\.?\s*C\.?\s*K[İI]ML[İI]K\s*NO)\D{0,10}?(\d{11})(?!\d)", re.IGNORECASE)
+DATE_PATTERN = re.compile(r"(?<!\d)(\d{2})[./-](\d{2})[./-](\d{4})(?!\d)")
+TIME_PATTERN = re.compile(r"(?<!\d)([01]\d|2[0-3]):([0-5]\d)(?::[0-5]\d)?(?!\d)")
+RECEIPT_NO_PATTERN = re.compile(r"F[İI][ŞS]\s*(?:NO|NUMARASI)\s*[:.]?\s*(\d{1,8})", re.IGNORECASE)
+PLATE_PATTERN = re.compile(r"(?<![A-Z0-9])(0[1-9]|[1-7]\d|8[01])\s?([A-Z]{1,3})\s?(\d{2,4})(?![A-Z0-9])")
+
+TOTAL_PATTERN = re.compile(r"^\s*(?:GENEL\s+)?TOPLAM(?!\s*KDV)\b", re.IGNORECASE)
+TOTAL_VAT_PATTERN = re.compile(r"^\s*(?:TOP\s*KDV|TOPLAM\s*KDV|KDV\s*TOPLAM[I]?)\b", re.IGNORECASE)
+VAT_LINE_PATTERNS = [
+    re.compile(r"^\s*K\.?D\.?V\.?\s*%\s*(\d{1,2})\b", re.IGNORECASE),
+    re.compile(r"^\s*%\s*(\d{1,2})\s*K\.?D\.?V\.?", re.IGNORECASE),
+]
+ITEM_VAT_PATTERN = re.compile(r"%\s*(\d{1,2})\b")
+QUANTITY_PATTERN = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*(?:X|x|AD\.?|ADET)\s*[Xx]?\s*" + AMOUNT_PATTERN)
+
+# Ürün satırı olamayacak anahtar kelimeler
+NON_ITEM_KEYWORDS = re.compile(
+    r"TOPLAM|TOPKDV|KDV|ARA\s*TOP|NAK[İI]T|KRED[İI]|KART|PARA\s*[ÜU]ST|[ÖO]DEME|F[İI][ŞS]\b|"
+    r"TAR[İI]H|SAAT|VKN|V\.D|VERG[İI]|Z\s*NO|EKU|MERS[İI]S|TEL|ADRES|TCKN|BANKA|ONAY|"
+    r"[İI]ND[İI]R[İI]M|YUVARLAMA",
+    re.IGNORECASE
+)
+
+
+def parse_amount(raw: str) -> Optional[float]:
+    """Türkçe/İngilizce sayı formatını float'a çevir"""
+    if not raw:
+        return None
+    value = raw.replace("*", "").replace(" ", "").strip()
+    if "," in value:
+        value = value.replace(".", "").replace(",", ".")
+    try:
+        return round(float(value), 2)
+    except ValueError:
+        return None
+
+
+def is_valid_vkn(vkn: str) -> bool:
+    """10 haneli Vergi Kimlik Numarası checksum kontrolü"""
+    if not vkn or len(vkn) != 10 or not vkn.isdigit():
+        return False
+    digits = [int(d) for d in vkn]
+    total = 0
+    for i in range(9):
+        tmp = (digits[i] + 10 - (i + 1)) % 10
+        total += 9 if tmp == 9 else (tmp * (2 ** (10 - (i + 1)))) % 9
+    return (10 - total % 10) % 10 == digits[9]
+
+
+def is_valid_tckn(tckn: str) -> bool:
+    """11 haneli TC Kimlik No checksum kontrolü"""
+    if not tckn or len(tckn) != 11 or not tckn.isdigit() or tckn[0] == "0":
+        return False
+    d = [int(c) for c in tckn]
+    if ((sum(d[0:9:2]) * 7 - sum(d[1:8:2])) % 10) != d[9]:
+        return False
+    return sum(d[:10]) % 10 == d[10]
+
+
+def _last_amount(line: str) -> Optional[float]:
+    """Satırdaki son tutarı döndür"""
+    matches = re.findall(AMOUNT_PATTERN, line)
+    return parse_amount(matches[-1]) if matches else None
+
+
+class RuleBasedExtractor:
+    """
+    OCR metninden V2 muhasebe verisi çıkarır (GPT'siz, milisaniyeler içinde)
+
+    Kullanım:
+        extractor = RuleBasedExtractor()
+        data = extractor.extract(text)
+        ok, issues = extractor.validate(data)
+    """
+
+    def __init__(self, tolerance: float = 0.05):
+        self.tolerance = tolerance  # Tutar uzlaştırma toleransı (TL)
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        """OCR metninden V2 yapısı (+ fieldConfidence) üret"""
+        lines = [line.strip() for line in (text or "").splitlines() if line.strip()]
+        confidence: Dict[str, float] = {}
+
+        document = self._extract_document(lines, text or "", confidence)
+        totals = self._extract_totals(lines, confidence)
+        items = self._extract_items(lines, totals, confidence)
+
+        # Matrah: KDV satırından geri hesaplamak yuvarlama hatası taşır, ürün brütlerinden türet
+        for vat in totals["vatBreakdown"]:
+            gross = sum(item["grossAmount"] for item in items if item.get("vatRate") == vat["vatRate"])
+            if gross > 0:
+                vat["taxBase"] = round(gross - vat["vatAmount"], 2)
+
+        return {
+            "metadata": {
+                "source": "rule_based",
+                "ocrQualityScore": round(sum(confidence.values()) / len(confidence), 2) if confidence else 0.0,
+                "vatTreatment": "included"
+            },
+            "document": document,
+            "items": items,
+            "totals": totals,
+            "fieldConfidence": confidence
+        }
+
+    # ==================== Document ====================
+
+    def _extract_document(self, lines: List[str], text: str, confidence: Dict[str, float]) -> Dict[str, Any]:
+        document: Dict[str, Any] = {}
+
+        match = VKN_PATTERN.search(text)
+        if match:
+            document["merchantVKN"] = match.group(1)
+            confidence["document.merchantVKN"] = 0.98 if is_valid_vkn(match.group(1)) else 0.5
+
+        match = TCKN_PATTERN.search(text)
+        if match:
+            document["merchantTCKN"] = match.group(1)
+            confidence["document.merchantTCKN"] = 0.98 if is_valid_tckn(match.group(1)) else 0.5
+
+        for match in DATE_PATTERN.finditer(text):
+            day, month, year = int(match.group(1)), int(match.group(2)), int(match.group(3))
+            if 1 <= day <= 31 and 1 <= month <= 12 and 2000 <= year <= 2100:
+                document["date"] = f"{day:02d}/{month:02d}/{year}"
+                confidence["document.date"] = 0.95
+                break
+
+        match = TIME_PATTERN.search(text)
+        if match:
+            document["time"] = f"{match.group(1)}:{match.group(2)}"
+            confidence["document.time"] = 0.9
+
+        match = RECEIPT_NO_PATTERN.search(text)
+        if match:
+            document["receiptNo"] = match.group(1)
+            confidence["document.receiptNo"] = 0.9
+
+        match = PLATE_PATTERN.search(text.upper())
+        if match and re.search(r"PLAKA", text, re.IGNORECASE):
+            document["plate"] = f"{match.group(1)} {match.group(2)} {match.group(3)}"
+            confidence["document.plate"] = 0.8
+
+        # Firma adı: genelde ilk harf ağırlıklı satır (düşük güven, zorunlu değil)
+        for line in lines[:5]:
+            letters = sum(c.isalpha() for c in line)
+            if letters >= 3 and letters / len(line) > 0.6 and not NON_ITEM_KEYWORDS.search(line):
+                document["merchantName"] = line
+                confidence["document.merchantName"] = 0.5
+                break
+
+        return document
+
+    # ==================== Totals ====================
+
+    def _amount_on_or_after(self, lines: List[str], index: int) -> Optional[float]:
+        """Tutar etiketle aynı satırda yoksa OCR bir sonraki satıra bölmüş olabilir"""
+        amount = _last_amount(lines[index])
+        if amount is None and index + 1 < len(lines):
+            next_line = lines[index + 1]
+            if re.fullmatch(AMOUNT_PATTERN, next_line.strip()):
+                amount = _last_amount(next_line)
+        return amount
+
+    def _extract_totals(self, lines: List[str], confidence: Dict[str, float]) -> Dict[str, Any]:
+        totals: Dict[str, Any] = {"vatBreakdown": [], "currency": "TRY"}
+        vat_by_rate: Dict[int, float] = {}
+
+        for i, line in enumerate(lines):
+            if TOTAL_VAT_PATTERN.search(line):
+                amount = self._amount_on_or_after(lines, i)
+                if amount is not None:
+                    totals["totalVat"] = amount
+                    confidence["totals.totalVat"] = 0.9
+                continue
+
+            if TOTAL_PATTERN.search(line):
+                amount = self._amount_on_or_after(lines, i)
+                if amount is not None:
+                    # Birden fazla TOPLAM varsa en sondaki (genel toplam) geçerli
+                    totals["totalAmount"] = amount
+                    confidence["totals.totalAmount"] = 0.9
+                continue
+
+            for pattern in VAT_LINE_PATTERNS:
+                match = pattern.search(line)
+                if match and int(match.group(1)) in VALID_VAT_RATES:
+                    amount = self._amount_on_or_after(lines, i)
+                    if amount is not None:
+                        vat_by_rate[int(match.group(1))] = amount
+                    break
+
+        for rate, vat_amount in sorted(vat_by_rate.items()):
+            tax_base = round(vat_amount * 100 / rate, 2) if rate else 0.0
+            totals["vatBreakdown"].append({"vatRate": rate, "taxBase": tax_base, "vatAmount": vat_amount})
+            confidence[f"totals.vatBreakdown.{rate}"] = 0.85
+
+        if "totalVat" not in totals and vat_by_rate:
+            totals["totalVat"] = round(sum(vat_by_rate.values()), 2)
+            confidence["totals.totalVat"] = 0.7
+
+        return totals
+
+    # ==================== Items ====================
+
+    def _extract_items(
+        self,
+        lines: List[str],
+        totals: Dict[str, Any],
+        confidence: Dict[str, float]
+    ) -> List[Dict[str, Any]]:
+        rates = [v["vatRate"] for v in totals.get("vatBreakdown", [])]
+        single_rate = rates[0] if len(rates) == 1 else None
+
+        items: List[Dict[str, Any]] = []
+        pending_quantity: Optional[Tuple[float, float]] = None
+
+        for line in lines:
+            # "2 X 5,00" satırı bir sonraki ürüne aittir
+            quantity_match = QUANTITY_PATTERN.match(line)
+            if quantity_match:
+                pending_quantity = (
+                    float(quantity_match.group(1).replace(",", ".")),
+                    parse_amount(quantity_match.group(2))
+                )
+                continue
+
+            # Toplam bölümüne gelindiyse ürün listesi bitti
+            if TOTAL_PATTERN.search(line) or TOTAL_VAT_PATTERN.search(line):
+                break
+            if NON_ITEM_KEYWORDS.search(line):
+                continue
+
+            amounts = re.findall(AMOUNT_PATTERN, line)
+            vat_match = ITEM_VAT_PATTERN.search(line)
+            if not amounts or not (vat_match or "*" in line):
+                continue
+
+            description = line[:vat_match.start()] if vat_match else line[:line.find(amounts[-1])]
+            description = description.replace("*", "").strip(" .:-")
+            if sum(c.isalpha() for c in description) < 2:
+                continue
+
+            gross = parse_amount(amounts[-1])
+            vat_rate = int(vat_match.group(1)) if vat_match and int(vat_match.group(1)) in VALID_VAT_RATES else single_rate
+
+            item: Dict[str, Any] = {
+                "description": description,
+                "grossAmount": gross,
+                "vatRate": vat_rate,
+                "confidence": 0.9 if vat_match else 0.7
+            }
+            if pending_quantity:
+                item["quantity"], item["unitPrice"] = pending_quantity
+                pending_quantity = None
+            else:
+                item["quantity"] = 1
+                item["unitPrice"] = gross
+
+            if vat_rate:
+                item["vatAmount"] = round(gross * vat_rate / (100 + vat_rate), 2)
+                item["netAmount"] = round(gross - item["vatAmount"], 2)
+
+            items.append(item)
+
+        if items:
+            confidence["items"] = round(min(item["confidence"] for item in items), 2)
+        return items
+
+    # ==================== Validation ====================
+
+    def validate(self, data: Dict[str, Any]) -> Tuple[bool, List[str]]:
+        """
+        GPT'yi atlamak için zorunlu alan ve uzlaştırma kontrolleri
+
+        Returns:
+            (geçti mi, başarısız kontrol listesi)
+        """
+        issues: List[str] = []
+        document = data.get("document", {})
+        totals = data.get("totals", {})
+        items = data.get("items", [])
+
+        if not (is_valid_vkn(document.get("merchantVKN", "")) or is_valid_tckn(document.get("merchantTCKN", ""))):
+            issues.append("missing_or_invalid_vkn")
+        if not document.get("date"):
+            issues.append("missing_date")
+
+        total_amount = totals.get("totalAmount")
+        breakdown = totals.get("vatBreakdown", [])
+        if total_amount is None:
+            issues.append("missing_total")
+        if not breakdown:
+            issues.append("missing_vat_breakdown")
+        if not items:
+            issues.append("missing_items")
+        if any(item.get("vatRate") is None for item in items):
+            issues.append("item_vat_rate_unknown")
+
+        if total_amount is not None and breakdown:
+            vat_sum = sum(v["vatAmount"] for v in breakdown)
+            if totals.get("totalVat") is not None and abs(vat_sum - totals["totalVat"]) > self.tolerance:
+                issues.append("vat_breakdown_total_vat_mismatch")
+
+            # Her oran için KDV, o orandaki ürün brütlerinden hesaplanan KDV ile uyuşmalı
+            for vat in breakdown:
+                rate = vat["vatRate"]
+                gross = sum(item["grossAmount"] for item in items if item.get("vatRate") == rate)
+                expected_vat = gross * rate / (100 + rate) if rate else 0.0
+                if abs(expected_vat - vat["vatAmount"]) > self.tolerance + 0.01 * len(items):
+                    issues.append(f"vat_{rate}_items_mismatch")
+
+        if total_amount is not None and items:
+            items_sum = sum(item["grossAmount"] for item in items)
+            if abs(items_sum - total_amount) > self.tolerance:
+                issues.append("items_total_mismatch")
+
+        return not issues, issues
@@ -0,0 +1,135 @@
+"""
+OpenAI structured output (JSON schema) desteği
+
+V2 AccountingData şeması strict `json_schema` response format olarak gönderilir.
+Model çıktısı şemaya uymak zorunda olduğundan parse hataları ortadan kalkar ve
+prompt'lardaki uzun şema açıklaması/örnek çıktı gereksizleşir (input token azalır,
+model şemada olmayan alan üretmez).
+"""
+
+import copy
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, Any, List
+
+from ..models.schemas import AccountingData
+
+logger = logging.getLogger(__name__)
+
+
+# Vision çıktısında ham OCR metni için şemaya eklenen alan
+RAW_TEXT_FIELD = "rawText"
+
+# Çok görselli (paketlenmiş) Vision yanıtında sonuçların tutulduğu alan
+PACKED_RESULTS_FIELD = "receipts"
+
+# Strict mode'un desteklemediği / gereksiz anahtarlar
+_DROPPED_KEYS = {"default", "title"}
+
+
+def to_strict_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pydantic JSON şemasını OpenAI strict mode kurallarına uydur
+
+    - Her obje: additionalProperties=false, tüm alanlar required
+      (Optional alanlar zaten anyOf [..., null] olarak gelir)
+    - default/title anahtarları atılır
+    """
+    def _convert(node: Any) -> Any:
+        if isinstance(node, list):
+            return [_convert(n) for n in node]
+        if not isinstance(node, dict):
+            return node
+
+        converted = {k: _convert(v) for k, v in node.items() if k not in _DROPPED_KEYS}
+        if converted.get("type") == "object" or "properties" in converted:
+            converted["type"] = "object"
+            converted.setdefault("properties", {})
+            converted["required"] = list(converted["properties"].keys())
+            converted["additionalProperties"] = False
+        return converted
+
+    return _convert(copy.deepcopy(schema))
+
+
+@lru_cache(maxsize=2)
+def accounting_json_schema(include_raw_text: bool = False) -> Dict[str, Any]:
+    """V2 AccountingData strict JSON şeması (camelCase alias'larla)"""
+    schema = AccountingData.model_json_schema(by_alias=True)
+    if include_raw_text:
+        schema.setdefault("properties", {})[RAW_TEXT_FIELD] = {
+            "type": "string",
+            "description": "Görseldeki tüm metin, satır satır ve aynen"
+        }
+    return to_strict_schema(schema)
+
+
+def accounting_response_format(name: str = "accounting_data_v2", include_raw_text: bool = False) -> Dict[str, Any]:
+    """chat.completions.create için response_format parametresi"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": name,
+            "strict": True,
+            "schema": accounting_json_schema(include_raw_text)
+        }
+    }
+
+
+def packed_response_format(keys: List[str], name: str = "receipt_ocr_v2_packed") -> Dict[str, Any]:
+    """
+    K görselli Vision isteği için response_format: {"receipts": {"<key>": <tek fiş şeması>, ...}}
+
+    Tek fiş şeması $defs'e bir kez konur, anahtarlar $ref ile ona bağlanır
+    (şema K kez kopyalanmaz).
+    """
+    receipt_schema = copy.deepcopy(accounting_json_schema(include_raw_text=True))
+    defs = receipt_schema.pop("$defs", {})
+    defs["ReceiptOCR"] = receipt_schema
+    results = {
+        "type": "object",
+        "properties": {key: {"$ref": "#/$defs/ReceiptOCR"} for key in keys},
+        "required": list(keys),
+        "additionalProperties": False
+    }
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": name,
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {PACKED_RESULTS_FIELD: results},
+                "required": [PACKED_RESULTS_FIELD],
+                "additionalProperties": False,
+                "$defs": defs
+            }
+        }
+    }
+
+
+def strip_json_schema_blocks(prompt: str) -> str:
+    """
+    Prompt'taki satır başı '{' ile başlayıp satır başı '}' ile biten JSON
+    şema/örnek bloklarını çıkar (şema zaten response_format ile gönderiliyor)
+    """
+    lines = prompt.splitlines()
+    kept = []
+    depth = 0
+    removed = 0
+    for line in lines:
+        stripped = line.strip()
+        if depth == 0 and stripped == "{":
+            depth = 1
+            removed += 1
+            kept.append("(Çıktı şeması response_format ile verildi, ona TAM uy.)")
+            continue
+        if depth > 0:
+            depth += stripped.count("{") - stripped.count("}")
+            continue
+        kept.append(line)
+
+    if removed:
+        logger.debug(f"✂️ Prompt'tan {removed} JSON şema bloğu çıkarıldı (structured output)")
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(kept))
@@ -0,0 +1,164 @@
+"""
+OCR metni sıkıştırma (GPT'ye göndermeden önce)
+
+PaddleOCR başta olmak üzere OCR çıktıları tekrar eden satırlar, süs/ayraç
+satırları ve dağınık sayı formatları içerir. Bu adım anlamı bozmadan metni
+kısaltır ve entity JSON'unu kompakt serileştirir; input token'ı azalır.
+"""
+
+import re
+import json
+import logging
+from difflib import SequenceMatcher
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Sadece ayraç/süs karakterlerinden oluşan satır (----, ====, ****, ~~~~)
+DECORATION_PATTERN = re.compile(r"^[\s\-=_*#~.·•+|:]{3,}$")
+# Satırda tutar var mı (bu satırlar tekrar olsa da korunur, aynı üründen iki adet olabilir)
+AMOUNT_PATTERN = re.compile(r"\d+[.,]\d{2}(?!\d)")
+# Miktar/birim taşıyan satır (SUT 1 LT / SUT 2 LT benzer görünür ama farklı üründür; hiç atılmaz)
+QUANTITY_PATTERN = re.compile(r"\d|\b(?:ADET|AD|KG|GR|G|LT|L|ML|CL|PK|PAKET|X)\b", re.IGNORECASE)
+# Binlik ayraçlı Türkçe sayı: 1.234,56
+THOUSANDS_PATTERN = re.compile(r"(?<![\d.,])(\d{1,3}(?:\.\d{3})+),(\d{2})(?!\d)")
+# Ondalık ayıraç etrafındaki boşluk: 12 ,50 / 12, 50 (% ile başlayan oran birleştirilmez: "KDV %1, 20 TL")
+DECIMAL_SPACE_PATTERN = re.compile(r"(?<![\d%])(?<!%\s)(\d+)\s*,\s*(\d{2})(?!\d)")
+# Yıldız ile tutar arası boşluk: * 12,50
+STAR_SPACE_PATTERN = re.compile(r"\*\s+(\d)")
+
+
+class TextCompactor:
+    """
+    Yapılandırılabilir OCR metin sıkıştırıcı
+
+    Args:
+        dedupe_lines: Bir önceki satırın tekrarı olan satırları kaldır (sadece ardışık tekrarlar;
+            "EKMEK / *5,00 / EKMEK / *5,00" gibi aynı üründen iki kalem korunur)
+        near_duplicate_threshold: Bir önceki satırla benzerlik oranı (0-1) bu değeri geçen satırlar tekrar sayılır; None = sadece birebir
+        strip_decorations: Ayraç/süs satırlarını kaldır
+        normalize_numbers: Binlik ayraçları ve ondalık boşluklarını temizle
+        preserve_amount_lines: Tutar içeren satırları tekrar olsa bile koru
+
+    Miktar/birim içeren satırlar hiçbir zaman tekrar sayılmaz.
+    """
+
+    def __init__(
+        self,
+        dedupe_lines: bool = True,
+        near_duplicate_threshold: Optional[float] = 0.9,
+        strip_decorations: bool = True,
+        normalize_numbers: bool = True,
+        preserve_amount_lines: bool = True
+    ):
+        self.dedupe_lines = dedupe_lines
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.strip_decorations = strip_decorations
+        self.normalize_numbers = normalize_numbers
+        self.preserve_amount_lines = preserve_amount_lines
+
+    def settings(self) -> Dict[str, Any]:
+        """Çıktıyı etkileyen ayarlar (cache anahtarı için)"""
+        return {
+            "dedupe_lines": self.dedupe_lines,
+            "near_duplicate_threshold": self.near_duplicate_threshold,
+            "strip_decorations": self.strip_decorations,
+            "normalize_numbers": self.normalize_numbers,
+            "preserve_amount_lines": self.preserve_amount_lines
+        }
+
+    def compact(self, text: str) -> Tuple[str, Dict[str, int]]:
+        """
+        Metni sıkıştır
+
+        Returns:
+            (sıkıştırılmış metin, {"lines_in", "lines_out", "duplicates", "decorations"})
+        """
+        lines_in = (text or "").splitlines()
+        kept: List[str] = []
+        duplicates = 0
+        decorations = 0
+
+        for raw_line in lines_in:
+            line = " ".join(raw_line.split())
+            if not line:
+                continue
+
+            if self.strip_decorations and DECORATION_PATTERN.match(line):
+                decorations += 1
+                continue
+
+            if self.normalize_numbers:
+                line = self._normalize_numbers(line)
+
+            if self.dedupe_lines and kept and self._is_duplicate(line, kept[-1]):
+                duplicates += 1
+                continue
+
+            kept.append(line)
+
+        return "\n".join(kept), {
+            "lines_in": len(lines_in),
+            "lines_out": len(kept),
+            "duplicates": duplicates,
+            "decorations": decorations
+        }
+
+    def _is_duplicate(self, line: str, previous: str) -> bool:
+        """Satır bir önceki satırın (birebir ya da benzer) tekrarı mı (OCR'ın aynı satırı iki kez okuması)"""
+        if self.preserve_amount_lines and AMOUNT_PATTERN.search(line):
+            return False
+        if QUANTITY_PATTERN.search(line):
+            return False
+        key, previous = line.casefold(), previous.casefold()
+        if key == previous:
+            return True
+        if not self.near_duplicate_threshold or len(key) < 4:
+            return False
+        if abs(len(previous) - len(key)) > max(len(key), len(previous)) * (1 - self.near_duplicate_threshold):
+            return False
+        return SequenceMatcher(None, previous, key).ratio() >= self.near_duplicate_threshold
+
+    @staticmethod
+    def _normalize_numbers(line: str) -> str:
+        line = THOUSANDS_PATTERN.sub(lambda m: m.group(1).replace(".", "") + "," + m.group(2), line)
+        line = DECIMAL_SPACE_PATTERN.sub(r"\1,\2", line)
+        return STAR_SPACE_PATTERN.sub(r"*\1", line)
+
+    @staticmethod
+    def serialize_entities(entities: List[Dict[str, Any]]) -> str:
+        """Entity listesini kompakt JSON'a çevir (boşluksuz, boş alanlar atılır)"""
+        def _prune(value: Any) -> Any:
+            if isinstance(value, dict):
+                return {k: _prune(v) for k, v in value.items() if v not in (None, "", [], {})}
+            if isinstance(value, list):
+                return [_prune(v) for v in value]
+            return value
+
+        return json.dumps(_prune(entities), ensure_ascii=False, separators=(",", ":"))
+
+
+# Global singleton instance
+_compactor_instance: Optional[TextCompactor] = None
+
+
+def get_text_compactor() -> Optional[TextCompactor]:
+    """
+    Global text compactor instance'ını döner (singleton pattern)
+
+    OCR_COMPACTION_ENABLED=false ise None döner (ham metin gönderilir).
+    """
+    global _compactor_instance
+    from ..core.config import settings
+
+    if not settings.OCR_COMPACTION_ENABLED:
+        return None
+    if _compactor_instance is None:
+        _compactor_instance = TextCompactor(
+            dedupe_lines=settings.OCR_COMPACTION_DEDUPE,
+            near_duplicate_threshold=settings.OCR_COMPACTION_NEAR_DUP_THRESHOLD or None,
+            strip_decorations=settings.OCR_COMPACTION_STRIP_DECORATIONS,
+            normalize_numbers=settings.OCR_COMPACTION_NORMALIZE_NUMBERS
+        )
+    return _compactor_instance
@@ -1,5 +1,5 @@
 import axios from 'axios'
-import { AnalysisResponse, AnalysisHistory, OCRModelType, AccountingAnalysisResponse } from '@/types'
+import { AnalysisResponse, AnalysisHistory, OCRModelType, CropArea, AccountingAnalysisResponse, EnsembleAccountingResponse, OCRResult, ModelAccountingResult, PipelinePartialEvent } from '@/types'
 
 // Production'da environment variable kullan, development'ta proxy
 const API_BASE_URL = import.meta.env.VITE_API_URL || ''  // Vercel'de VITE_API_URL set edilecek
@@ -55,7 +55,8 @@ api.interceptors.response.use(
 export const analyzeReceipt = async (
   file: File,
   prompt?: string,
-  models?: OCRModelType[]
+  models?: OCRModelType[],
+  cropAreas?: CropArea[]
 ): Promise<AnalysisResponse> => {
   console.log('🚀 API ÇAĞRISI BAŞLADI - analyzeReceipt')
   console.log('📋 İstek parametreleri:', { 
@@ -79,6 +80,11 @@ export const analyzeReceipt = async (
     formData.append('models', models.join(','))
   }
   
+  // Bölge bazlı OCR (şimdilik sadece PaddleOCR)
+  if (cropAreas && cropAreas.length > 0) {
+    formData.append('crop_areas', JSON.stringify(cropAreas))
+  }
+  
   console.log('📤 FormData hazırlandı, POST isteği gönderiliyor...')
   
   try {
@@ -153,12 +159,16 @@ export const healthCheck = async (): Promise<any> => {
 
 export const getAccountingAnalysis = async (
   analysisId: string,
-  gptModel: string = 'gpt-4o-mini'
+  gptModel: string = 'gpt-4o-mini',
+  force: boolean = false
 ): Promise<AccountingAnalysisResponse> => {
   console.log('💰 Muhasebe analizi başlatılıyor:', analysisId, 'Model:', gptModel)
   try {
     const formData = new FormData()
     formData.append('gpt_model', gptModel)
+    if (force) {
+      formData.append('force', 'true')
+    }
     
     const response = await api.post<AccountingAnalysisResponse>(
       `/api/accounting-analysis/${analysisId}`,
@@ -179,6 +189,118 @@ export const getAccountingAnalysis = async (
   }
 }
 
+// Ensemble: tüm OCR çıktıları tek GPT çağrısında (compare=true ise model bazında sonuçlar arka planda hesaplanır)
+export const getEnsembleAccountingAnalysis = async (
+  analysisId: string,
+  gptModel: string = 'gpt-4o-mini',
+  compare: boolean = false
+): Promise<EnsembleAccountingResponse> => {
+  try {
+    const formData = new FormData()
+    formData.append('gpt_model', gptModel)
+    if (compare) {
+      formData.append('compare', 'true')
+    }
+    
+    const response = await api.post<EnsembleAccountingResponse>(
+      `/api/accounting-analysis/${analysisId}/ensemble`,
+      formData,
+      {
+        headers: {
+          'Content-Type': 'multipart/form-data',
+        },
+      }
+    )
+    return response.data
+  } catch (error: any) {
+    console.error('❌ Ensemble muhasebe analizi API hatası:', error)
+    throw new Error(error.response?.data?.detail || error.message || 'Ensemble muhasebe analizi başarısız')
+  }
+}
+
+// Pipeline: OCR + muhasebe tek istekte, model bitince SSE ile akar
+export interface PipelineHandlers {
+  onAnalysis?: (data: { analysis_id: string; models: string[]; gpt_model: string }) => void
+  onOcr?: (result: OCRResult) => void
+  // GPT stream'inde tamamlanan document alanı / kalem / bölüm (toplamlardan önce gelir)
+  onPartial?: (data: PipelinePartialEvent) => void
+  onAccounting?: (result: ModelAccountingResult & { chain_time_ms: number }) => void
+  onDone?: (data: {
+    analysis_id: string
+    total_ocr_cost: number
+    total_accounting_cost: number
+    total_estimated_cost: number
+    total_processing_time_ms: number
+  }) => void
+}
+
+export const analyzePipeline = async (
+  file: File,
+  handlers: PipelineHandlers,
+  prompt?: string,
+  models?: OCRModelType[],
+  gptModel: string = 'gpt-4o-mini',
+  cropAreas?: CropArea[]
+): Promise<void> => {
+  const formData = new FormData()
+  formData.append('file', file)
+  formData.append('gpt_model', gptModel)
+  if (prompt) {
+    formData.append('prompt', prompt)
+  }
+  if (models && models.length > 0) {
+    formData.append('models', models.join(','))
+  }
+  if (cropAreas && cropAreas.length > 0) {
+    formData.append('crop_areas', JSON.stringify(cropAreas))
+  }
+
+  // axios tarayıcıda stream okuyamıyor, fetch kullanılıyor
+  const response = await fetch(`${API_BASE_URL}/api/analyze-pipeline`, {
+    method: 'POST',
+    body: formData,
+  })
+  if (!response.ok || !response.body) {
+    const detail = await response.text()
+    throw new Error(detail || `Pipeline hatası (HTTP ${response.status})`)
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  const dispatch = (raw: string) => {
+    let event = 'message'
+    const dataLines: string[] = []
+    for (const line of raw.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim()
+      else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim())
+    }
+    if (dataLines.length === 0) return
+    const data = JSON.parse(dataLines.join('\n'))
+    if (event === 'analysis') handlers.onAnalysis?.(data)
+    else if (event === 'ocr') handlers.onOcr?.(data)
+    else if (event === 'partial') handlers.onPartial?.(data)
+    else if (event === 'accounting') handlers.onAccounting?.(data)
+    else if (event === 'done') handlers.onDone?.(data)
+  }
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    let boundary = buffer.indexOf('\n\n')
+    while (boundary !== -1) {
+      dispatch(buffer.slice(0, boundary))
+      buffer = buffer.slice(boundary + 2)
+      boundary = buffer.indexOf('\n\n')
+    }
+  }
+  if (buffer.trim()) {
+    dispatch(buffer)
+  }
+}
+
 // Prompt yönetimi
 export interface PromptData {
   version: number
@@ -189,6 +311,17 @@ export interface PromptData {
   token_count?: number
 }
 
+// Prompt geçmişindeki versiyon özeti (prompt metni için getPromptVersion)
+export interface PromptVersionInfo {
+  version: number
+  file: string
+  created_at: string
+  schema_version?: string
+  token_count: number
+  previous_version?: number
+  restored_from_version?: number
+}
+
 export const getAllPrompts = async (): Promise<Record<string, PromptData>> => {
   const response = await api.get<Record<string, PromptData>>('/api/prompts')
   return response.data
@@ -211,8 +344,8 @@ export const saveModelPrompt = async (modelName: string, prompt: string): Promis
   return response.data
 }
 
-export const getPromptHistory = async (modelName: string): Promise<PromptData[]> => {
-  const response = await api.get<PromptData[]>(`/api/prompts/${modelName}/history`)
+export const getPromptHistory = async (modelName: string): Promise<PromptVersionInfo[]> => {
+  const response = await api.get<PromptVersionInfo[]>(`/api/prompts/${modelName}/history`)
   return response.data
 }
 
@@ -526,6 +659,62 @@ export const getReceiptStatistics = async (): Promise<ReceiptStatistics> => {
   return response.data
 }
 
+// ==================== BATCH JOBS API ====================
+
+export interface BatchJobResponse {
+  id: string
+  kind: 'vision' | 'accounting'
+  model_name: string
+  prompt_version: number
+  gpt_model: string
+  client: string
+  batch_id?: string
+  status: string
+  request_count: number
+  succeeded_count: number
+  failed_count: number
+  parent_job_id?: string
+  estimated_cost: number
+  error?: string
+  created_at: string
+  completed_at?: string
+}
+
+export const createBatchJob = async (
+  kind: 'vision' | 'accounting',
+  options?: {
+    modelName?: string
+    gptModel?: string
+    receiptIds?: string[]
+    analysisIds?: string[]
+  }
+): Promise<BatchJobResponse> => {
+  const formData = new FormData()
+  formData.append('kind', kind)
+  if (options?.modelName) formData.append('model_name', options.modelName)
+  if (options?.gptModel) formData.append('gpt_model', options.gptModel)
+  if (options?.receiptIds?.length) formData.append('receipt_ids', options.receiptIds.join(','))
+  if (options?.analysisIds?.length) formData.append('analysis_ids', options.analysisIds.join(','))
+  
+  const response = await api.post<BatchJobResponse>('/api/batch-jobs', formData)
+  return response.data
+}
+
+export const getBatchJobs = async (status?: string): Promise<BatchJobResponse[]> => {
+  const response = await api.get<BatchJobResponse[]>('/api/batch-jobs', { params: { status } })
+  return response.data
+}
+
+export const getBatchJob = async (jobId: string): Promise<BatchJobResponse> => {
+  const response = await api.get<BatchJobResponse>(`/api/batch-jobs/${jobId}`)
+  return response.data
+}
+
+export const pollBatchJob = async (jobId: string): Promise<BatchJobResponse> => {
+  const response = await api.post<BatchJobResponse>(`/api/batch-jobs/${jobId}/poll`)
+  return response.data
+}
+
 // ==================== PROMPT VERSIONS API ====================
 
 export interface PromptVersionsResponse {
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react'
 import { Card, CardContent, CardHeader, CardTitle } from './ui/card'
 import { Button } from './ui/button'
-import { analyzeReceipt, getAccountingAnalysis, getModelPrompt, saveModelPrompt, PromptData, createPromptTest, labelPromptTest, ReceiptResponse, getPromptHistory, restorePromptVersion, deletePromptVersion } from '@/api/client'
+import { analyzeReceipt, getAccountingAnalysis, getModelPrompt, saveModelPrompt, PromptData, PromptVersionInfo, createPromptTest, labelPromptTest, ReceiptResponse, getPromptHistory, getPromptVersion, restorePromptVersion, deletePromptVersion } from '@/api/client'
 import { OCRModelType, AnalysisResponse, AccountingAnalysisResponse, MODEL_NAMES } from '@/types'
 import { Upload, Loader2, Calculator, FileText, Clock, DollarSign, Save, AlertCircle, Crop, Tag, CheckCircle, XCircle, AlertTriangle, Database, FileImage, ZoomIn, X } from 'lucide-react'
 import { ImageCropper } from './ImageCropper'
@@ -33,7 +33,7 @@ export const SingleModelTest: React.FC<SingleModelTestProps> = ({ modelType, mod
   const [showReceiptSelector, setShowReceiptSelector] = useState(false)
   const [selectedReceiptId, setSelectedReceiptId] = useState<string | null>(null)
   const [selectedGptModel, setSelectedGptModel] = useState<string>('gpt-4o-mini')
-  const [promptHistory, setPromptHistory] = useState<PromptData[]>([])
+  const [promptHistory, setPromptHistory] = useState<PromptVersionInfo[]>([])
   const [selectedVersion, setSelectedVersion] = useState<number | null>(null)
 
   // Prompt ve geçmişi yükle
@@ -104,8 +104,7 @@ export const SingleModelTest: React.FC<SingleModelTestProps> = ({ modelType, mod
     
     loading.setLoading('loadingPrompt', true)
     try {
-      const versionData = await getPromptHistory(modelType)
-      const targetVersion = versionData.find(v => v.version === version)
+      const targetVersion = await getPromptVersion(modelType, version)
       if (targetVersion) {
         setCustomPrompt(targetVersion.prompt)
         setSelectedVersion(version)
@@ -102,6 +102,7 @@ export interface AccountingData {
   grand_total_calculated?: number
   
   payment_method?: string
+  validation_flags?: string[]
 }
 
 export interface ModelAccountingResult {
@@ -111,6 +112,12 @@ export interface ModelAccountingResult {
   processing_time_ms: number
   estimated_cost: number
   error?: string
+  cached?: boolean
+  gpt_model?: string
+  routing?: {
+    attempts: { gpt_model: string; issues: string[] }[]
+    escalated: boolean
+  }
 }
 
 export interface AccountingAnalysisResponse {
@@ -119,3 +126,30 @@ export interface AccountingAnalysisResponse {
   total_processing_time_ms: number
   total_estimated_cost: number
 }
+
+// Ensemble: tüm OCR çıktıları tek GPT çağrısında uzlaştırılır (V2 format + provenance)
+export interface EnsembleAccountingResponse {
+  analysis_id: string
+  accounting_data: Record<string, any>
+  provenance: Record<string, string[]>
+  conflicts: string[]
+  sources: string[]
+  raw_gpt_response?: string
+  processing_time_ms: number
+  estimated_cost: number
+  token_usage?: { input: number; output: number; total: number; cached?: number }
+  error?: string
+  cached?: boolean
+  comparison_started: boolean
+}
+
+// Pipeline stream'inde kısmi sonuç (GPT yanıtı bitmeden tamamlanan parça)
+export interface PipelinePartialEvent {
+  model_name: string
+  stage: 'ocr' | 'accounting'
+  event: 'document' | 'item' | 'section'
+  data:
+    | { field: string; value: any }
+    | { index: number; item: Record<string, any> }
+    | { name: string; value: any }
+}
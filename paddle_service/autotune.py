@@ -0,0 +1,216 @@
+"""
+OCR engine CPU parametre autotuner
+
+cpu_threads, enable_mkldnn, det_limit_side_len ve rec_batch_num grid'ini örnek
+görseller üzerinde benchmark eder; referans config'e göre doğruluk toleransı
+içinde kalan en hızlı kombinasyonu seçer ve sonraki çalıştırmalar için kaydeder.
+
+Kullanım:
+    python autotune.py --images ./samples --tolerance 0.02
+    (veya servis startup'ında PADDLE_AUTOTUNE=startup)
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from benchmark import IMAGE_EXTENSIONS, run_backend, text_similarity
+from engines import DEFAULT_ENGINE_PARAMS, OCR_BACKEND, ONNX_QUANTIZED, create_engine
+
+logger = logging.getLogger(__name__)
+
+# off | startup (kayıt yoksa çalıştır) | force (her startup'ta çalıştır)
+AUTOTUNE_MODE = os.getenv("PADDLE_AUTOTUNE", "off").lower()
+AUTOTUNE_RESULT_PATH = os.getenv("AUTOTUNE_RESULT_PATH", "./autotune.json")
+AUTOTUNE_SAMPLES_DIR = os.getenv("AUTOTUNE_SAMPLES_DIR", "./samples")
+AUTOTUNE_TOLERANCE = float(os.getenv("AUTOTUNE_TOLERANCE", "0.02"))
+
+_cpu_count = os.cpu_count() or 4
+
+DEFAULT_GRID: Dict[str, List[Any]] = {
+    "cpu_threads": sorted({max(1, _cpu_count // 2), _cpu_count}),
+    "enable_mkldnn": [False, True],
+    "det_limit_side_len": [640, 960, 1280],
+    "rec_batch_num": [6, 12]
+}
+
+
+def load_samples(samples_dir: str = AUTOTUNE_SAMPLES_DIR) -> List[np.ndarray]:
+    """Örnek görselleri yükle; dizin boşsa sentetik fişler üret"""
+    directory = Path(samples_dir)
+    paths = []
+    if directory.exists():
+        paths = sorted(p for p in directory.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+
+    if paths:
+        return [np.array(Image.open(p)) for p in paths]
+
+    logger.warning(f"Örnek görsel bulunamadı ({samples_dir}), sentetik fişler kullanılıyor")
+    return [_create_synthetic_receipt(seed) for seed in range(4)]
+
+
+def _create_synthetic_receipt(seed: int) -> np.ndarray:
+    """Basit sentetik fiş görseli (gerçek örnek yoksa fallback)"""
+    rng = np.random.default_rng(seed)
+    line_count = 12 + seed * 4
+    image = Image.new("RGB", (600, 60 + line_count * 36), "white")
+    draw = ImageDraw.Draw(image)
+    draw.text((20, 20), f"MARKET FIS NO: {1000 + seed}", fill="black")
+    for i in range(line_count):
+        price = rng.uniform(1, 500)
+        draw.text((20, 60 + i * 36), f"URUN {i + 1:02d}  %20  {price:8.2f}", fill="black")
+    return np.array(image)
+
+
+def _grid_configs(grid: Dict[str, List[Any]], backend: str) -> List[Dict[str, Any]]:
+    """Grid kombinasyonları (ONNX'te MKL-DNN anlamsız, sabitlenir)"""
+    if backend == "onnx":
+        grid = {**grid, "enable_mkldnn": [False]}
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def autotune(
+    images: List[np.ndarray],
+    backend: str = OCR_BACKEND,
+    lang: str = "en",
+    quantized: bool = ONNX_QUANTIZED,
+    grid: Optional[Dict[str, List[Any]]] = None,
+    tolerance: float = AUTOTUNE_TOLERANCE,
+    repeat: int = 1
+) -> Dict[str, Any]:
+    """
+    Grid'i benchmark et, tolerans içindeki en hızlı config'i seç
+
+    Doğruluk referansı DEFAULT_ENGINE_PARAMS çıktısıdır; aday config'in
+    ortalama metin benzerliği (1 - tolerance) altına düşerse elenir.
+    """
+    reference = run_backend(
+        create_engine(backend=backend, lang=lang, quantized=quantized, params=DEFAULT_ENGINE_PARAMS),
+        images,
+        repeat
+    )
+    best = {
+        "params": dict(DEFAULT_ENGINE_PARAMS),
+        "avg_latency_ms": reference["avg_latency_ms"],
+        "similarity": 1.0
+    }
+    logger.info(f"Autotune reference: {reference['avg_latency_ms']:.1f} ms/img")
+
+    candidates = []
+    for params in _grid_configs(grid or DEFAULT_GRID, backend):
+        try:
+            result = run_backend(
+                create_engine(backend=backend, lang=lang, quantized=quantized, params=params),
+                images,
+                repeat
+            )
+        except Exception as e:
+            logger.warning(f"Autotune config failed {params}: {e}")
+            continue
+
+        similarity = float(np.mean([
+            text_similarity(a, b) for a, b in zip(reference["texts"], result["texts"])
+        ]))
+        candidates.append({
+            "params": params,
+            "avg_latency_ms": round(result["avg_latency_ms"], 1),
+            "similarity": round(similarity, 4)
+        })
+        logger.info(f"Autotune {params}: {result['avg_latency_ms']:.1f} ms/img, similarity {similarity:.3f}")
+
+        if similarity >= 1.0 - tolerance and result["avg_latency_ms"] < best["avg_latency_ms"]:
+            best = {
+                "params": params,
+                "avg_latency_ms": round(result["avg_latency_ms"], 1),
+                "similarity": round(similarity, 4)
+            }
+
+    return {
+        **best,
+        "backend": backend,
+        "lang": lang,
+        "quantized": quantized,
+        "cpu_count": _cpu_count,
+        "tolerance": tolerance,
+        "reference_latency_ms": round(reference["avg_latency_ms"], 1),
+        "sample_count": len(images),
+        "candidates": candidates,
+        "tuned_at": datetime.now().isoformat()
+    }
+
+
+def save_result(result: Dict[str, Any], path: str = AUTOTUNE_RESULT_PATH):
+    """Autotune sonucunu atomik olarak kaydet"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_tuned_params(
+    backend: str = OCR_BACKEND,
+    lang: str = "en",
+    quantized: bool = ONNX_QUANTIZED,
+    path: str = AUTOTUNE_RESULT_PATH
+) -> Optional[Dict[str, Any]]:
+    """
+    Kaydedilmiş autotune sonucunu yükle
+
+    Backend/dil/quantization veya CPU sayısı değiştiyse sonuç geçersiz sayılır.
+    """
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading autotune result {path}: {e}")
+        return None
+
+    if (result.get("backend"), result.get("lang"), result.get("quantized"), result.get("cpu_count")) != \
+            (backend, lang, quantized, _cpu_count):
+        logger.info("Autotune sonucu mevcut ortamla eşleşmiyor, yok sayılıyor")
+        return None
+
+    return result
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="OCR engine CPU parametre autotuner")
+    parser.add_argument("--images", default=AUTOTUNE_SAMPLES_DIR, help="Örnek görsel dizini")
+    parser.add_argument("--backend", default=OCR_BACKEND)
+    parser.add_argument("--lang", default="en")
+    parser.add_argument("--quantized", action="store_true", default=ONNX_QUANTIZED)
+    parser.add_argument("--tolerance", type=float, default=AUTOTUNE_TOLERANCE)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", default=AUTOTUNE_RESULT_PATH)
+    args = parser.parse_args()
+
+    result = autotune(
+        load_samples(args.images),
+        backend=args.backend,
+        lang=args.lang,
+        quantized=args.quantized,
+        tolerance=args.tolerance,
+        repeat=args.repeat
+    )
+    save_result(result, args.output)
+
+    print(f"\nEn hızlı config: {result['params']}")
+    print(f"Gecikme: {result['avg_latency_ms']} ms/img (referans: {result['reference_latency_ms']} ms/img)")
+    print(f"Benzerlik: {result['similarity']} (tolerans: {args.tolerance})")
+    print(f"Kaydedildi: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+OCR backend benchmark: native PaddleOCR vs ONNX Runtime (fp32 / int8)
+
+Kullanım:
+    python benchmark.py --images ./samples --backends paddle onnx onnx-int8 --repeat 3
+
+Her backend için images/sec ve native Paddle çıktısına göre metin benzerliği raporlanır.
+"""
+import argparse
+import difflib
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+from engines import create_engine
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def load_images(image_dir: str) -> List[np.ndarray]:
+    """Dizindeki görselleri /ocr/process ile aynı şekilde yükle"""
+    paths = sorted(p for p in Path(image_dir).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not paths:
+        raise ValueError(f"Görsel bulunamadı: {image_dir}")
+    return [np.array(Image.open(p)) for p in paths]
+
+
+def extract_text(ocr_result) -> str:
+    """PaddleOCR çıktısından satır metinlerini birleştir"""
+    if not ocr_result or not ocr_result[0]:
+        return ""
+    return "\n".join(line[1][0] for line in ocr_result[0] if line and len(line) >= 2)
+
+
+def text_similarity(a: str, b: str) -> float:
+    """İki OCR çıktısı arasındaki karakter bazlı benzerlik (0.0 - 1.0)"""
+    if not a and not b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def run_backend(engine, images: List[np.ndarray], repeat: int) -> Dict:
+    """Tek bir engine ile tüm görselleri işle"""
+    # Warm-up (ölçüme dahil değil)
+    engine.ocr(images[0], cls=False)
+    
+    texts = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        texts = [extract_text(engine.ocr(img, cls=False)) for img in images]
+    elapsed = time.perf_counter() - start
+    
+    total_images = len(images) * repeat
+    return {
+        "images_per_sec": total_images / elapsed,
+        "avg_latency_ms": elapsed / total_images * 1000,
+        "texts": texts
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="PaddleOCR backend benchmark")
+    parser.add_argument("--images", required=True, help="Örnek görsel dizini")
+    parser.add_argument("--backends", nargs="+", default=["paddle", "onnx", "onnx-int8"])
+    parser.add_argument("--lang", default="en")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    images = load_images(args.images)
+    logger.info(f"{len(images)} görsel yüklendi, repeat={args.repeat}")
+    
+    results = {}
+    for name in args.backends:
+        backend, _, variant = name.partition("-")
+        engine = create_engine(backend=backend, lang=args.lang, quantized=(variant == "int8"))
+        results[name] = run_backend(engine, images, args.repeat)
+        logger.info(f"{name}: {results[name]['images_per_sec']:.2f} img/s")
+    
+    baseline = results.get("paddle")
+    print()
+    print(f"{'backend':<12} {'img/s':>8} {'latency_ms':>11} {'speedup':>8} {'similarity':>11}")
+    for name, result in results.items():
+        speedup = result["images_per_sec"] / baseline["images_per_sec"] if baseline else 1.0
+        similarity = (
+            np.mean([text_similarity(a, b) for a, b in zip(baseline["texts"], result["texts"])])
+            if baseline else 1.0
+        )
+        print(
+            f"{name:<12} {result['images_per_sec']:>8.2f} {result['avg_latency_ms']:>11.1f} "
+            f"{speedup:>7.2f}x {similarity:>11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
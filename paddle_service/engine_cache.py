@@ -0,0 +1,139 @@
+"""
+OCR engine LRU cache'i
+Dil + model config'ine göre engine'leri bellekte tutar; farklı dillerdeki
+istekler model yeniden yüklemeden karışık olarak işlenebilir.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _current_rss_bytes() -> Optional[int]:
+    """Process RSS (Linux /proc; başka platformlarda None)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class EngineCache:
+    """
+    Thread-safe engine LRU cache'i
+
+    Sınırlar: max_engines (adet) ve max_bytes (engine yüklenirken ölçülen RSS
+    artışının toplamı). Sınır aşılınca en az kullanılan engine atılır;
+    pinned anahtarlar (varsayılan dil) atılmaz.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[..., Any],
+        max_engines: int = 2,
+        max_bytes: Optional[int] = None
+    ):
+        self.factory = factory
+        self.max_engines = max_engines
+        self.max_bytes = max_bytes
+
+        self._engines: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._sizes: Dict[Tuple, int] = {}
+        self._load_ms: Dict[Tuple, float] = {}
+        self._pinned: set = set()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(lang: str, **config: Any) -> Tuple:
+        return (lang, json.dumps(config, sort_keys=True, default=str))
+
+    def get(self, lang: str, pin: bool = False, **config: Any) -> Any:
+        """Engine'i döndür; yoksa yükle (factory(lang=..., **config))"""
+        key = self.make_key(lang, **config)
+
+        with self._lock:
+            if pin:
+                self._pinned.add(key)
+            if key in self._engines:
+                self._engines.move_to_end(key)
+                self.hits += 1
+                return self._engines[key]
+
+        # Aynı anda iki isteğin aynı modeli iki kez yüklemesini önle
+        with self._load_lock:
+            with self._lock:
+                if key in self._engines:
+                    self._engines.move_to_end(key)
+                    self.hits += 1
+                    return self._engines[key]
+
+            logger.info(f"Loading OCR engine: lang={lang}")
+            rss_before = _current_rss_bytes()
+            start = time.perf_counter()
+            engine = self.factory(lang=lang, **config)
+            load_ms = round((time.perf_counter() - start) * 1000, 1)
+            rss_after = _current_rss_bytes()
+            size = max(0, rss_after - rss_before) if rss_before is not None and rss_after is not None else 0
+
+            with self._lock:
+                self._engines[key] = engine
+                self._sizes[key] = size
+                self._load_ms[key] = load_ms
+                self.loads += 1
+                self._evict()
+
+            logger.info(f"OCR engine loaded: lang={lang}, {load_ms} ms, ~{size / (1024 * 1024):.0f} MB")
+            return engine
+
+    def load_ms(self, lang: str, **config: Any) -> Optional[float]:
+        return self._load_ms.get(self.make_key(lang, **config))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "engines": [
+                    {
+                        "lang": key[0],
+                        "config": json.loads(key[1]),
+                        "approx_mb": round(self._sizes.get(key, 0) / (1024 * 1024), 1),
+                        "load_ms": self._load_ms.get(key),
+                        "pinned": key in self._pinned
+                    }
+                    for key in self._engines
+                ],
+                "max_engines": self.max_engines,
+                "max_mb": round(self.max_bytes / (1024 * 1024)) if self.max_bytes else None,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions
+            }
+
+    def _evict(self):
+        """Lock altında çağrılır - sınırlar aşıldıysa LRU engine'leri at"""
+        def over_limit() -> bool:
+            if len(self._engines) > self.max_engines:
+                return True
+            return bool(self.max_bytes) and sum(self._sizes.values()) > self.max_bytes
+
+        for key in list(self._engines.keys()):
+            if not over_limit():
+                break
+            # Son yüklenen engine ve pinned engine'ler atılmaz
+            if key in self._pinned or key == next(reversed(self._engines)):
+                continue
+            del self._engines[key]
+            self._sizes.pop(key, None)
+            self._load_ms.pop(key, None)
+            self.evictions += 1
+            logger.info(f"Evicted OCR engine: lang={key[0]}")
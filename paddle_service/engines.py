@@ -0,0 +1,114 @@
+"""
+OCR engine factory
+Native PaddleOCR veya ONNX Runtime backend'ini config'e göre oluşturur
+"""
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Inference backend: "paddle" (native) veya "onnx" (ONNX Runtime CPU)
+OCR_BACKEND = os.getenv("PADDLE_BACKEND", "paddle").lower()
+
+# ONNX model dizini: {ONNX_MODEL_DIR}/{lang}/det.onnx, rec.onnx, dict.txt
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./onnx_models")
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "false").lower() == "true"
+
+SUPPORTED_BACKENDS = ("paddle", "onnx")
+
+# CPU parametreleri (autotune tarafından ayarlanır)
+# cpu_threads, enable_mkldnn, det_limit_side_len, rec_batch_num
+DEFAULT_ENGINE_PARAMS: Dict[str, Any] = {
+    "cpu_threads": 10,
+    "enable_mkldnn": False,
+    "det_limit_side_len": 960,
+    "rec_batch_num": 6
+}
+
+
+def create_engine(
+    backend: str = OCR_BACKEND,
+    lang: str = "en",
+    quantized: bool = ONNX_QUANTIZED,
+    params: Optional[Dict[str, Any]] = None
+):
+    """
+    OCR engine oluştur
+    
+    Her iki backend de PaddleOCR.ocr(img, cls=False) arayüzünü sağlar.
+    
+    Args:
+        backend: "paddle" veya "onnx"
+        lang: Model dili
+        quantized: ONNX için int8 quantize edilmiş ağırlıkları kullan
+        params: CPU parametreleri (None ise DEFAULT_ENGINE_PARAMS)
+        
+    Returns:
+        OCR engine instance'ı
+    """
+    engine_params = {**DEFAULT_ENGINE_PARAMS, **(params or {})}
+    
+    if backend == "onnx":
+        from onnx_engine import ONNXOCREngine
+        # ONNX Runtime'da MKL-DNN yok, diğer parametreler birebir karşılanır
+        return ONNXOCREngine(
+            model_dir=os.path.join(ONNX_MODEL_DIR, lang),
+            quantized=quantized,
+            num_threads=engine_params["cpu_threads"],
+            det_limit_side_len=engine_params["det_limit_side_len"],
+            rec_batch_num=engine_params["rec_batch_num"]
+        )
+    
+    if backend == "paddle":
+        from paddleocr import PaddleOCR
+        return PaddleOCR(
+            use_angle_cls=False,
+            lang=lang,
+            show_log=False,
+            use_gpu=False,
+            cpu_threads=engine_params["cpu_threads"],
+            enable_mkldnn=engine_params["enable_mkldnn"],
+            det_limit_side_len=engine_params["det_limit_side_len"],
+            rec_batch_num=engine_params["rec_batch_num"]
+        )
+    
+    raise ValueError(f"Desteklenmeyen OCR backend: {backend} (desteklenen: {', '.join(SUPPORTED_BACKENDS)})")
+
+
+def ensure_three_channels(img: np.ndarray) -> np.ndarray:
+    """Gri / RGBA görselleri 3 kanala çevir"""
+    if img.ndim == 2:
+        return np.stack([img] * 3, axis=-1)
+    if img.shape[2] == 4:
+        return img[:, :, :3]
+    return img
+
+
+def run_ocr_with_timings(engine, img: np.ndarray) -> Tuple[List[Optional[List]], Dict[str, float]]:
+    """
+    OCR çalıştır, detection/recognition sürelerini de döndür (saniye)
+    
+    Çıktı PaddleOCR.ocr() ile aynı formattadır.
+    """
+    if hasattr(engine, "ocr_with_timings"):
+        return engine.ocr_with_timings(img)
+    
+    # Native PaddleOCR: TextSystem.__call__ (boxes, rec_res, time_dict) döndürür
+    start = time.perf_counter()
+    output = engine(ensure_three_channels(img), cls=False)
+    elapsed = time.perf_counter() - start
+    
+    dt_boxes, rec_res = output[0], output[1]
+    time_dict = output[2] if len(output) > 2 else {}
+    timings = {
+        "det": time_dict.get("det", elapsed),
+        "rec": time_dict.get("rec", 0.0)
+    }
+    
+    if dt_boxes is None or len(dt_boxes) == 0:
+        return [None], timings
+    return [[[box.tolist(), res] for box, res in zip(dt_boxes, rec_res)]], timings
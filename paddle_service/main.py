@@ -3,15 +3,25 @@ PaddleOCR Mikroservis
 Port: 8001
 Amaç: Protobuf çakışmasını önlemek için PaddleOCR'ı izole ortamda çalıştırma
 """
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from paddleocr import PaddleOCR
+from fastapi.responses import JSONResponse, Response
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageDraw
+import asyncio
 import io
-from typing import Dict, Any
+import os
+import time
+from typing import Dict, Any, List, Optional
 import logging
 
+from engines import create_engine, run_ocr_with_timings, OCR_BACKEND, ONNX_QUANTIZED, DEFAULT_ENGINE_PARAMS
+from autotune import AUTOTUNE_MODE, autotune, load_samples, load_tuned_params, save_result
+from result_cache import ResultCache, make_cache_key
+from engine_cache import EngineCache
+from regions import Rect, crop_regions, parse_crops, to_pixel_rects
+import metrics
+
 # Logging yapılandırması
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -32,23 +42,135 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# PaddleOCR instance (global - bir kez yükle)
-ocr_engine = None
+# Dil ayarları (PaddleOCR lang kodları: en, tr, latin, ...)
+DEFAULT_LANG = os.getenv("PADDLE_DEFAULT_LANG", "en")
+SUPPORTED_LANGS = [l.strip() for l in os.getenv("PADDLE_LANGS", DEFAULT_LANG).split(",") if l.strip()]
+PRELOAD_LANGS = [l.strip() for l in os.getenv("PADDLE_PRELOAD_LANGS", DEFAULT_LANG).split(",") if l.strip()]
+if DEFAULT_LANG not in SUPPORTED_LANGS:
+    SUPPORTED_LANGS.append(DEFAULT_LANG)
 
+# Engine LRU cache'i (dil + model config -> engine, varsayılan dil pinned)
+engine_cache = EngineCache(
+    factory=create_engine,
+    max_engines=int(os.getenv("ENGINE_CACHE_MAX_ENGINES", "2")),
+    max_bytes=int(os.getenv("ENGINE_CACHE_MAX_MB", "0")) * 1024 * 1024 or None
+)
+
+# Startup'ta sentetik warm-up inference çalıştırılsın mı?
+WARMUP_ENABLED = os.getenv("PADDLE_WARMUP", "true").lower() == "true"
+
+# Engine durumu (liveness != readiness)
+engine_state: Dict[str, Any] = {
+    "ready": False,
+    "loading": False,
+    "model_load_ms": None,
+    "warmup_ms": None,
+    "engine_params": None,
+    "languages": {},
+    "error": None
+}
+
+# Arka plan init task referansı (GC'ye karşı)
+_init_task = None
+
+# Eşzamanlı inference sayısı (engine thread-safe değil, varsayılan 1)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+inference_slots = asyncio.Semaphore(INFERENCE_WORKERS)
+
+# Sonuç cache'i (aynı görsel tekrar geldiğinde det + rec atlanır)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+result_cache = ResultCache(
+    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "512")),
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_MB", "64")) * 1024 * 1024,
+    disk_dir=os.getenv("RESULT_CACHE_DISK_DIR") or None,
+    disk_max_entries=int(os.getenv("RESULT_CACHE_DISK_MAX_ENTRIES", "5000"))
+)
 
-def get_ocr_engine():
-    """PaddleOCR engine'i lazy load"""
-    global ocr_engine
-    if ocr_engine is None:
-        logger.info("Initializing PaddleOCR engine...")
-        ocr_engine = PaddleOCR(
-            use_angle_cls=False,
-            lang='en',
-            show_log=False,
-            use_gpu=False
-        )
-        logger.info("PaddleOCR engine initialized successfully")
-    return ocr_engine
+
+def get_ocr_engine(lang: str = DEFAULT_LANG):
+    """Dil için OCR engine'i cache'den al, yoksa yükle (backend: PADDLE_BACKEND)"""
+    return engine_cache.get(
+        lang,
+        pin=(lang == DEFAULT_LANG),
+        backend=OCR_BACKEND,
+        quantized=ONNX_QUANTIZED,
+        params=engine_state["engine_params"]
+    )
+
+
+def resolve_engine_params() -> Dict[str, Any]:
+    """
+    Engine CPU parametrelerini belirle
+    
+    Kayıtlı autotune sonucu varsa onu kullanır. PADDLE_AUTOTUNE=startup
+    iken kayıt yoksa, =force iken her zaman autotune çalıştırır.
+    """
+    tuned = None if AUTOTUNE_MODE == "force" else load_tuned_params(lang=DEFAULT_LANG)
+    
+    if tuned is None and AUTOTUNE_MODE in ("startup", "force"):
+        logger.info("Running engine autotune...")
+        tuned = autotune(load_samples(), lang=DEFAULT_LANG)
+        save_result(tuned)
+    
+    if tuned:
+        logger.info(f"Using tuned engine params: {tuned['params']} ({tuned['avg_latency_ms']} ms/img)")
+        return tuned["params"]
+    
+    return dict(DEFAULT_ENGINE_PARAMS)
+
+
+def _create_warmup_image() -> np.ndarray:
+    """Warm-up için küçük sentetik fiş görseli üret"""
+    image = Image.new("RGB", (640, 200), "white")
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(["MARKET FIS NO: 0040", "KDV %20 20.58", "TOPLAM 123.45"]):
+        draw.text((20, 20 + i * 60), line, fill="black")
+    return np.array(image)
+
+
+def initialize_engine():
+    """
+    Model yükleme + sentetik warm-up inference (blocking)
+    
+    İlk gerçek istek graph warm-up maliyetini ödemesin diye startup'ta
+    çalışır. Süreler /readyz üzerinden raporlanır.
+    """
+    engine_state["loading"] = True
+    engine_state["error"] = None
+    try:
+        engine_state["engine_params"] = resolve_engine_params()
+        
+        # Varsayılan dil önce, sonra önceden yüklenecek diğer diller
+        langs = [DEFAULT_LANG] + [l for l in PRELOAD_LANGS if l != DEFAULT_LANG]
+        for lang in langs:
+            lang_state = {"model_load_ms": None, "warmup_ms": None}
+            
+            start = time.perf_counter()
+            ocr = get_ocr_engine(lang)
+            lang_state["model_load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            logger.info(f"Model load [{lang}]: {lang_state['model_load_ms']} ms")
+            
+            if WARMUP_ENABLED:
+                # Warm-up başarısızlığı readiness'i engellemez (model yüklendi, ilk istek warm-up'ı öder)
+                start = time.perf_counter()
+                try:
+                    run_ocr_with_timings(ocr, _create_warmup_image())
+                    lang_state["warmup_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                    logger.info(f"Warm-up inference [{lang}]: {lang_state['warmup_ms']} ms")
+                except Exception as e:
+                    lang_state["warmup_error"] = str(e)
+                    logger.warning(f"Warm-up inference [{lang}] failed, continuing without warm-up: {e}", exc_info=True)
+            
+            engine_state["languages"][lang] = lang_state
+        
+        engine_state["model_load_ms"] = engine_state["languages"][DEFAULT_LANG]["model_load_ms"]
+        engine_state["warmup_ms"] = engine_state["languages"][DEFAULT_LANG]["warmup_ms"]
+        engine_state["ready"] = True
+    except Exception as e:
+        engine_state["error"] = str(e)
+        logger.error(f"PaddleOCR engine initialization error: {str(e)}", exc_info=True)
+    finally:
+        engine_state["loading"] = False
 
 
 @app.get("/")
@@ -58,52 +180,162 @@ async def root():
         "service": "PaddleOCR Mikroservis",
         "status": "running",
         "port": 8001,
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "backend": OCR_BACKEND
     }
 
 
 @app.get("/health")
 async def health_check():
-    """Detaylı health check"""
-    try:
-        ocr = get_ocr_engine()
-        return {
-            "status": "healthy",
-            "ocr_engine": "initialized" if ocr else "not_initialized"
-        }
-    except Exception as e:
+    """Detaylı health check (engine'i tetiklemez, sadece durumu raporlar)"""
+    if engine_state["error"]:
         return {
             "status": "unhealthy",
-            "error": str(e)
+            "error": engine_state["error"]
         }
+    return {
+        "status": "healthy",
+        "ocr_engine": "initialized" if engine_state["ready"] else "not_initialized",
+        "model_load_ms": engine_state["model_load_ms"],
+        "warmup_ms": engine_state["warmup_ms"]
+    }
+
+
+@app.get("/livez")
+async def liveness():
+    """Liveness probe - process ayakta mı?"""
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+async def readiness():
+    """Readiness probe - model yüklendi ve warm-up tamamlandı mı?"""
+    body = {
+        "ready": engine_state["ready"],
+        "loading": engine_state["loading"],
+        "model_load_ms": engine_state["model_load_ms"],
+        "warmup_ms": engine_state["warmup_ms"],
+        "engine_params": engine_state["engine_params"],
+        "languages": engine_state["languages"],
+        "error": engine_state["error"]
+    }
+    return JSONResponse(status_code=200 if engine_state["ready"] else 503, content=body)
+
+
+def _run_inference(img_array: np.ndarray, lang: str, rects: Optional[List[Rect]] = None):
+    """
+    Worker thread'inde çalışır: OCR + det/rec süreleri
+    
+    rects verilirse OCR yalnızca bu alanlarda çalışır; kutular orijinal
+    görsel koordinatlarına taşınır ve satırlar alan sırasıyla birleştirilir.
+    """
+    engine = get_ocr_engine(lang)
+    if not rects:
+        return run_ocr_with_timings(engine, img_array)
+    
+    lines = []
+    timings = {"det": 0.0, "rec": 0.0}
+    for (x0, y0, _, _), region in zip(rects, crop_regions(img_array, rects)):
+        region_result, region_timings = run_ocr_with_timings(engine, region)
+        timings["det"] += region_timings["det"]
+        timings["rec"] += region_timings["rec"]
+        for box, rec in (region_result[0] if region_result else None) or []:
+            lines.append([[[float(px) + x0, float(py) + y0] for px, py in box], rec])
+    return [lines or None], timings
 
 
 @app.post("/ocr/process")
-async def process_image(file: UploadFile = File(...)) -> Dict[str, Any]:
+async def process_image(
+    file: UploadFile = File(...),
+    lang: Optional[str] = Form(None),
+    crops: Optional[str] = Form(None)
+) -> Dict[str, Any]:
     """
     Görsel üzerinde OCR işlemi yap
     
     Args:
         file: Yüklenecek görsel dosyası
+        lang: Model dili (None ise PADDLE_DEFAULT_LANG)
+        crops: Opsiyonel JSON crop alanları ([{x, y, width, height}, ...]);
+               verilirse detection/recognition yalnızca bu alanlarda çalışır
         
     Returns:
         OCR sonuçları
     """
+    lang = lang or DEFAULT_LANG
+    if lang not in SUPPORTED_LANGS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Desteklenmeyen dil: {lang} (desteklenen: {', '.join(SUPPORTED_LANGS)})"
+        )
+    
+    try:
+        crop_areas = parse_crops(crops)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not engine_state["ready"]:
+        metrics.ERRORS.labels(stage="not_ready").inc()
+        metrics.REQUESTS.labels(status="error").inc()
+        raise HTTPException(status_code=503, detail="PaddleOCR engine henüz hazır değil")
+    
+    metrics.IN_FLIGHT.inc()
+    stage = "decode"
     try:
         logger.info(f"Processing image: {file.filename}")
         
         # Dosyayı oku
         image_bytes = await file.read()
         
+        # Cache kontrolü (görsel hash + engine config)
+        cache_key = make_cache_key(
+            image_bytes,
+            backend=OCR_BACKEND,
+            quantized=ONNX_QUANTIZED,
+            params=engine_state["engine_params"],
+            lang=lang,
+            crops=crop_areas
+        )
+        if RESULT_CACHE_ENABLED:
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"OCR cache hit: {cache_key[:12]}")
+                metrics.REQUESTS.labels(status="cached").inc()
+                return {**cached, "metadata": {**cached["metadata"], "cached": True}}
+        
         # PIL Image'e çevir
+        start = time.perf_counter()
         image = Image.open(io.BytesIO(image_bytes))
         img_array = np.array(image)
+        metrics.DECODE_SECONDS.observe(time.perf_counter() - start)
+        
+        # ROI: yalnızca crop alanları işlenir (geçerli alan kalmazsa tüm görsel)
+        image_pixels = img_array.shape[0] * img_array.shape[1]
+        rects = to_pixel_rects(crop_areas, img_array.shape[1], img_array.shape[0])
+        if crop_areas and not rects:
+            logger.warning("Crop alanları görsel dışında, tüm görsel işleniyor")
+        processed_pixels = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rects) if rects else image_pixels
+        metrics.IMAGE_PIXELS.observe(processed_pixels)
         
-        logger.info(f"Image size: {img_array.shape}")
+        logger.info(f"Image size: {img_array.shape}, processed pixels: {processed_pixels}/{image_pixels}")
         
-        # OCR işlemi
-        ocr = get_ocr_engine()
-        ocr_result = ocr.ocr(img_array, cls=False)
+        # OCR işlemi (worker thread'inde, eşzamanlılık INFERENCE_WORKERS ile sınırlı)
+        stage = "inference"
+        queued_at = time.perf_counter()
+        metrics.QUEUE_DEPTH.inc()
+        waiting = True
+        try:
+            async with inference_slots:
+                metrics.QUEUE_DEPTH.dec()
+                waiting = False
+                metrics.QUEUE_WAIT_SECONDS.observe(time.perf_counter() - queued_at)
+                ocr_result, timings = await asyncio.to_thread(_run_inference, img_array, lang, rects)
+        finally:
+            if waiting:
+                metrics.QUEUE_DEPTH.dec()
+        
+        metrics.DETECTION_SECONDS.observe(timings["det"])
+        metrics.RECOGNITION_SECONDS.observe(timings["rec"])
         
         # Sonuçları işle
         text_lines = []
@@ -125,33 +357,78 @@ async def process_image(file: UploadFile = File(...)) -> Dict[str, Any]:
         
         logger.info(f"OCR completed: {len(text_lines)} lines detected")
         
-        return {
+        response = {
             "success": True,
             "text": full_text,
             "line_count": len(text_lines),
             "confidence": round(avg_confidence, 3),
             "metadata": {
                 "model": "PaddleOCR",
-                "language": "en",
+                "backend": OCR_BACKEND,
+                "language": lang,
                 "lines": text_lines,
-                "confidences": [round(c, 3) for c in confidences]
+                "confidences": [round(c, 3) for c in confidences],
+                "regions": [list(rect) for rect in rects],
+                "processed_pixels": processed_pixels,
+                "image_pixels": image_pixels,
+                "cached": False
             }
         }
         
+        if RESULT_CACHE_ENABLED:
+            result_cache.put(cache_key, response)
+        
+        metrics.REQUESTS.labels(status="success").inc()
+        return response
+        
     except Exception as e:
+        metrics.ERRORS.labels(stage=stage).inc()
+        metrics.REQUESTS.labels(status="error").inc()
         logger.error(f"OCR processing error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"OCR işlemi başarısız: {str(e)}")
+    finally:
+        metrics.IN_FLIGHT.dec()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Sonuç cache'i hit/miss sayaçları"""
+    return {"enabled": RESULT_CACHE_ENABLED, **result_cache.stats()}
+
+
+@app.get("/engines")
+async def engine_stats():
+    """Yüklü engine'ler (dil, yaklaşık bellek, yükleme süresi) ve cache sayaçları"""
+    return {
+        "default_lang": DEFAULT_LANG,
+        "supported_langs": SUPPORTED_LANGS,
+        **engine_cache.stats()
+    }
+
+
+@app.delete("/cache")
+async def clear_cache():
+    """Sonuç cache'ini temizle"""
+    result_cache.clear()
+    return {"success": True}
 
 
 @app.on_event("startup")
 async def startup_event():
     """Uygulama başlangıcında çalışır"""
+    global _init_task
     logger.info("=" * 60)
     logger.info("🐼 PaddleOCR Mikroservis Başlatılıyor...")
     logger.info("Port: 8001")
     logger.info("=" * 60)
-    # OCR engine'i önceden yükle
-    get_ocr_engine()
+    # OCR engine'i arka planda yükle + warm-up (liveness probe bloklanmasın)
+    _init_task = asyncio.create_task(asyncio.to_thread(initialize_engine))
 
 
 @app.on_event("shutdown")
@@ -0,0 +1,84 @@
+"""
+Prometheus metrikleri
+Decode / detection / recognition süreleri, kuyruk derinliği, in-flight istekler,
+görsel piksel sayıları ve hata sayaçları
+"""
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Süre bucket'ları (saniye) - CPU inference için ms..onlarca saniye
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Piksel bucket'ları - 0.25 MP .. 16 MP
+PIXEL_BUCKETS = (250_000, 500_000, 1_000_000, 2_000_000, 4_000_000, 8_000_000, 16_000_000)
+
+REQUESTS = Counter(
+    "paddle_ocr_requests_total",
+    "OCR istekleri (sonuca göre)",
+    ["status"]  # success | cached | error
+)
+
+ERRORS = Counter(
+    "paddle_ocr_errors_total",
+    "OCR hataları (aşamaya göre)",
+    ["stage"]  # not_ready | decode | inference
+)
+
+DECODE_SECONDS = Histogram(
+    "paddle_ocr_decode_seconds",
+    "Görsel decode süresi",
+    buckets=LATENCY_BUCKETS
+)
+
+DETECTION_SECONDS = Histogram(
+    "paddle_ocr_detection_seconds",
+    "Text detection süresi",
+    buckets=LATENCY_BUCKETS
+)
+
+RECOGNITION_SECONDS = Histogram(
+    "paddle_ocr_recognition_seconds",
+    "Text recognition süresi",
+    buckets=LATENCY_BUCKETS
+)
+
+QUEUE_WAIT_SECONDS = Histogram(
+    "paddle_ocr_queue_wait_seconds",
+    "Inference slotu için bekleme süresi",
+    buckets=LATENCY_BUCKETS
+)
+
+IMAGE_PIXELS = Histogram(
+    "paddle_ocr_image_pixels",
+    "İşlenen görsel piksel sayısı",
+    buckets=PIXEL_BUCKETS
+)
+
+QUEUE_DEPTH = Gauge(
+    "paddle_ocr_queue_depth",
+    "Inference slotu bekleyen istek sayısı"
+)
+
+IN_FLIGHT = Gauge(
+    "paddle_ocr_in_flight_requests",
+    "İşlenmekte olan istek sayısı"
+)
+
+
+def render_latest() -> bytes:
+    """Prometheus text exposition formatında tüm metrikler"""
+    return generate_latest()
+
+
+__all__ = [
+    "CONTENT_TYPE_LATEST",
+    "REQUESTS",
+    "ERRORS",
+    "DECODE_SECONDS",
+    "DETECTION_SECONDS",
+    "RECOGNITION_SECONDS",
+    "QUEUE_WAIT_SECONDS",
+    "IMAGE_PIXELS",
+    "QUEUE_DEPTH",
+    "IN_FLIGHT",
+    "render_latest"
+]
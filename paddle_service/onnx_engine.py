@@ -0,0 +1,280 @@
+"""
+ONNX Runtime tabanlı OCR engine (CPU)
+Amaç: PP-OCR det/rec modellerini Paddle inference yerine ONNX Runtime ile çalıştırmak
+
+Modeller paddle2onnx ile çevrilmiş olmalı (bkz. README). Opsiyonel olarak
+quantize_onnx.py ile üretilen int8 ağırlıklar kullanılabilir.
+`ocr()` metodu PaddleOCR.ocr() ile aynı çıktı formatını döndürür, böylece
+/ocr/process yanıtı backend'den bağımsız kalır.
+"""
+import logging
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from engines import ensure_three_channels
+
+logger = logging.getLogger(__name__)
+
+
+def quantized_path(model_path: str) -> str:
+    """det.onnx -> det.int8.onnx"""
+    base, ext = os.path.splitext(model_path)
+    return f"{base}.int8{ext}"
+
+
+class ONNXOCREngine:
+    """PP-OCR detection (DB) + recognition (CTC) pipeline'ı - ONNX Runtime"""
+
+    # Detection normalizasyonu (PP-OCR det, ImageNet mean/std)
+    DET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+    DET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+    def __init__(
+        self,
+        model_dir: str,
+        det_model: str = "det.onnx",
+        rec_model: str = "rec.onnx",
+        rec_dict: str = "dict.txt",
+        quantized: bool = False,
+        num_threads: int = 0,
+        det_limit_side_len: int = 960,
+        rec_batch_num: int = 6,
+        rec_image_height: int = 48,
+        det_db_thresh: float = 0.3,
+        det_db_box_thresh: float = 0.6,
+        det_db_unclip_ratio: float = 1.5,
+        drop_score: float = 0.5
+    ):
+        self.det_limit_side_len = det_limit_side_len
+        self.rec_batch_num = rec_batch_num
+        self.rec_image_height = rec_image_height
+        self.det_db_thresh = det_db_thresh
+        self.det_db_box_thresh = det_db_box_thresh
+        self.det_db_unclip_ratio = det_db_unclip_ratio
+        self.drop_score = drop_score
+
+        det_path = os.path.join(model_dir, det_model)
+        rec_path = os.path.join(model_dir, rec_model)
+        if quantized:
+            det_path = quantized_path(det_path)
+            rec_path = quantized_path(rec_path)
+
+        for path in (det_path, rec_path):
+            if not os.path.exists(path):
+                hint = " (quantize_onnx.py ile üretin)" if quantized else ""
+                raise FileNotFoundError(f"ONNX model bulunamadı: {path}{hint}")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+
+        providers = ["CPUExecutionProvider"]
+        self.det_session = ort.InferenceSession(det_path, sess_options=options, providers=providers)
+        self.rec_session = ort.InferenceSession(rec_path, sess_options=options, providers=providers)
+        self.det_input = self.det_session.get_inputs()[0].name
+        self.rec_input = self.rec_session.get_inputs()[0].name
+
+        # CTC karakter listesi: index 0 = blank, sonda boşluk karakteri
+        with open(os.path.join(model_dir, rec_dict), "r", encoding="utf-8") as f:
+            characters = [line.rstrip("\r\n") for line in f]
+        self.characters = ["blank"] + characters + [" "]
+
+        logger.info(
+            f"ONNX engine loaded: {det_path}, {rec_path} "
+            f"(quantized={quantized}, threads={num_threads or 'auto'})"
+        )
+
+    def ocr(self, img: np.ndarray, cls: bool = False) -> List[Optional[List]]:
+        """
+        PaddleOCR.ocr() uyumlu çıktı: [[ [box, (text, confidence)], ... ]]
+
+        Args:
+            img: Görsel (H, W, C) numpy array
+            cls: Kullanılmıyor (açı sınıflandırıcı yok)
+        """
+        return self.ocr_with_timings(img)[0]
+
+    def ocr_with_timings(self, img: np.ndarray) -> Tuple[List[Optional[List]], Dict[str, float]]:
+        """ocr() + detection/recognition süreleri (saniye)"""
+        img = ensure_three_channels(img)
+
+        start = time.perf_counter()
+        boxes = self.detect(img)
+        timings = {"det": time.perf_counter() - start, "rec": 0.0}
+        if not boxes:
+            return [None], timings
+
+        start = time.perf_counter()
+        crops = [self._crop_box(img, box) for box in boxes]
+        rec_results = self.recognize(crops)
+        timings["rec"] = time.perf_counter() - start
+
+        lines = [
+            [box.tolist(), (text, score)]
+            for box, (text, score) in zip(boxes, rec_results)
+            if score >= self.drop_score
+        ]
+        return [lines], timings
+
+    # ==================== Detection ====================
+
+    def detect(self, img: np.ndarray) -> List[np.ndarray]:
+        """DB text detection - sıralı 4 köşeli kutular döner"""
+        src_h, src_w = img.shape[:2]
+        tensor, ratio_h, ratio_w = self._det_preprocess(img)
+        prob = self.det_session.run(None, {self.det_input: tensor})[0][0, 0]
+        return self._det_postprocess(prob, ratio_h, ratio_w, src_h, src_w)
+
+    def _det_preprocess(self, img: np.ndarray) -> Tuple[np.ndarray, float, float]:
+        h, w = img.shape[:2]
+        ratio = 1.0
+        if max(h, w) > self.det_limit_side_len:
+            ratio = self.det_limit_side_len / max(h, w)
+
+        # DB ağı 32'nin katı boyut bekler
+        resize_h = max(int(round(h * ratio / 32) * 32), 32)
+        resize_w = max(int(round(w * ratio / 32) * 32), 32)
+        resized = cv2.resize(img, (resize_w, resize_h))
+
+        tensor = (resized.astype(np.float32) / 255.0 - self.DET_MEAN) / self.DET_STD
+        tensor = tensor.transpose(2, 0, 1)[np.newaxis, ...]
+        return tensor, resize_h / h, resize_w / w
+
+    def _det_postprocess(
+        self,
+        prob: np.ndarray,
+        ratio_h: float,
+        ratio_w: float,
+        src_h: int,
+        src_w: int
+    ) -> List[np.ndarray]:
+        bitmap = (prob > self.det_db_thresh).astype(np.uint8) * 255
+        contours, _ = cv2.findContours(bitmap, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+        boxes = []
+        for contour in contours[:1000]:
+            rect = cv2.minAreaRect(contour)
+            if min(rect[1]) < 3:
+                continue
+            if self._box_score(prob, contour) < self.det_db_box_thresh:
+                continue
+
+            # Unclip: DB çıktısı metni daraltılmış bölge olarak verir, genişlet
+            (cx, cy), (rw, rh), angle = rect
+            distance = (rw * rh) * self.det_db_unclip_ratio / (2 * (rw + rh))
+            expanded = ((cx, cy), (rw + 2 * distance, rh + 2 * distance), angle)
+            if min(expanded[1]) < 5:
+                continue
+
+            box = cv2.boxPoints(expanded)
+            box[:, 0] = np.clip(box[:, 0] / ratio_w, 0, src_w - 1)
+            box[:, 1] = np.clip(box[:, 1] / ratio_h, 0, src_h - 1)
+            boxes.append(self._order_points(box))
+
+        return self._sort_boxes(boxes)
+
+    @staticmethod
+    def _box_score(prob: np.ndarray, contour: np.ndarray) -> float:
+        """Kontur içindeki ortalama olasılık"""
+        x, y, w, h = cv2.boundingRect(contour)
+        mask = np.zeros((h, w), dtype=np.uint8)
+        shifted = contour.reshape(-1, 2) - np.array([x, y])
+        cv2.fillPoly(mask, [shifted.astype(np.int32)], 1)
+        return cv2.mean(prob[y:y + h, x:x + w], mask)[0]
+
+    @staticmethod
+    def _order_points(box: np.ndarray) -> np.ndarray:
+        """Köşeleri sol-üst, sağ-üst, sağ-alt, sol-alt sırasına koy"""
+        s = box.sum(axis=1)
+        d = np.diff(box, axis=1).ravel()
+        return np.array(
+            [box[np.argmin(s)], box[np.argmin(d)], box[np.argmax(s)], box[np.argmax(d)]],
+            dtype=np.float32
+        )
+
+    @staticmethod
+    def _sort_boxes(boxes: List[np.ndarray]) -> List[np.ndarray]:
+        """Yukarıdan aşağıya, aynı satırda soldan sağa sırala (PaddleOCR sorted_boxes)"""
+        boxes = sorted(boxes, key=lambda b: (b[0][1], b[0][0]))
+        for i in range(len(boxes) - 1):
+            for j in range(i, -1, -1):
+                if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                    boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+                else:
+                    break
+        return boxes
+
+    @staticmethod
+    def _crop_box(img: np.ndarray, box: np.ndarray) -> np.ndarray:
+        """Kutuyu perspektif düzeltmesiyle kırp"""
+        width = int(max(np.linalg.norm(box[0] - box[1]), np.linalg.norm(box[2] - box[3])))
+        height = int(max(np.linalg.norm(box[0] - box[3]), np.linalg.norm(box[1] - box[2])))
+        width, height = max(width, 1), max(height, 1)
+
+        dst = np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float32)
+        matrix = cv2.getPerspectiveTransform(box.astype(np.float32), dst)
+        crop = cv2.warpPerspective(
+            img, matrix, (width, height),
+            borderMode=cv2.BORDER_REPLICATE,
+            flags=cv2.INTER_CUBIC
+        )
+        # Dikey metin: döndür
+        if height / width >= 1.5:
+            crop = np.rot90(crop)
+        return crop
+
+    # ==================== Recognition ====================
+
+    def recognize(self, crops: List[np.ndarray]) -> List[Tuple[str, float]]:
+        """CTC recognition - en-boy oranına göre sıralı batch'ler halinde"""
+        results: List[Tuple[str, float]] = [("", 0.0)] * len(crops)
+        ratios = [crop.shape[1] / float(crop.shape[0]) for crop in crops]
+        order = np.argsort(ratios)
+
+        for start in range(0, len(crops), self.rec_batch_num):
+            batch_idx = order[start:start + self.rec_batch_num]
+            max_ratio = max(320 / 48, max(ratios[i] for i in batch_idx))
+            target_w = int(self.rec_image_height * max_ratio)
+
+            batch = np.stack([self._rec_preprocess(crops[i], target_w) for i in batch_idx])
+            preds = self.rec_session.run(None, {self.rec_input: batch})[0]
+
+            for i, decoded in zip(batch_idx, self._ctc_decode(preds)):
+                results[i] = decoded
+
+        return results
+
+    def _rec_preprocess(self, crop: np.ndarray, target_w: int) -> np.ndarray:
+        h, w = crop.shape[:2]
+        resized_w = min(target_w, int(math.ceil(self.rec_image_height * w / float(h))))
+        resized = cv2.resize(crop, (max(resized_w, 1), self.rec_image_height))
+
+        tensor = (resized.astype(np.float32) / 255.0 - 0.5) / 0.5
+        tensor = tensor.transpose(2, 0, 1)
+
+        padded = np.zeros((3, self.rec_image_height, target_w), dtype=np.float32)
+        padded[:, :, :tensor.shape[2]] = tensor
+        return padded
+
+    def _ctc_decode(self, preds: np.ndarray) -> List[Tuple[str, float]]:
+        """Greedy CTC decode: tekrarları ve blank'leri at"""
+        indices = preds.argmax(axis=2)
+        probs = preds.max(axis=2)
+
+        decoded = []
+        for seq, seq_probs in zip(indices, probs):
+            keep = np.ones(len(seq), dtype=bool)
+            keep[1:] = seq[1:] != seq[:-1]
+            keep &= seq != 0
+
+            text = "".join(self.characters[i] for i in seq[keep] if i < len(self.characters))
+            score = float(seq_probs[keep].mean()) if keep.any() else 0.0
+            decoded.append((text, score))
+        return decoded
@@ -0,0 +1,43 @@
+"""
+ONNX modellerini int8'e quantize eder (dynamic quantization)
+
+Kullanım:
+    python quantize_onnx.py --model-dir ./onnx_models/en
+
+Çıktı: det.int8.onnx, rec.int8.onnx (ONNX_QUANTIZED=true ile kullanılır)
+"""
+import argparse
+import logging
+import os
+
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+from onnx_engine import quantized_path
+
+logger = logging.getLogger(__name__)
+
+
+def quantize_model(model_path: str) -> str:
+    """Tek bir modeli int8 ağırlıklarla quantize et"""
+    output_path = quantized_path(model_path)
+    quantize_dynamic(model_path, output_path, weight_type=QuantType.QUInt8)
+    
+    original_mb = os.path.getsize(model_path) / (1024 * 1024)
+    quantized_mb = os.path.getsize(output_path) / (1024 * 1024)
+    logger.info(f"{model_path}: {original_mb:.1f} MB -> {output_path}: {quantized_mb:.1f} MB")
+    return output_path
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="PP-OCR ONNX modellerini int8'e quantize et")
+    parser.add_argument("--model-dir", required=True, help="det.onnx ve rec.onnx içeren dizin")
+    parser.add_argument("--models", nargs="+", default=["det.onnx", "rec.onnx"])
+    args = parser.parse_args()
+    
+    for model_name in args.models:
+        quantize_model(os.path.join(args.model_dir, model_name))
+
+
+if __name__ == "__main__":
+    main()
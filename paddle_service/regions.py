@@ -0,0 +1,87 @@
+"""
+Region-of-interest (ROI) yardımcıları
+Detection/recognition yalnızca istenen kırpma alanlarında çalışsın diye
+crop dikdörtgenlerini parse eder ve görsel parçalarını üretir.
+
+Dikdörtgen formatı backend'deki CropArea şeması ile aynıdır:
+{"x": ..., "y": ..., "width": ..., "height": ...}
+Tüm değerler 0-1 aralığındaysa görsel boyutuna göre oransal kabul edilir,
+aksi halde piksel koordinatıdır.
+"""
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Kenardaki metin kesilmesin diye her alana eklenen pay (piksel)
+CROP_PADDING = int(os.getenv("CROP_PADDING", "8"))
+MAX_CROPS = int(os.getenv("MAX_CROPS", "8"))
+
+Rect = Tuple[int, int, int, int]  # x0, y0, x1, y1 (piksel, x1/y1 hariç)
+
+
+def parse_crops(raw: Optional[str]) -> List[Dict[str, float]]:
+    """
+    Form alanındaki JSON'u crop listesine çevir
+
+    Tek bir obje veya obje listesi kabul edilir.
+
+    Raises:
+        ValueError: Geçersiz JSON veya alan
+    """
+    if not raw:
+        return []
+
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"crops geçerli JSON değil: {e}")
+
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        raise ValueError("crops bir obje veya obje listesi olmalı")
+    if len(data) > MAX_CROPS:
+        raise ValueError(f"En fazla {MAX_CROPS} crop alanı gönderilebilir")
+
+    crops = []
+    for item in data:
+        if not isinstance(item, dict):
+            raise ValueError("Her crop {x, y, width, height} objesi olmalı")
+        try:
+            crop = {key: float(item[key]) for key in ("x", "y", "width", "height")}
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Her crop sayısal x, y, width, height alanları içermeli")
+        if crop["width"] <= 0 or crop["height"] <= 0:
+            raise ValueError("Crop width/height pozitif olmalı")
+        crops.append(crop)
+    return crops
+
+
+def to_pixel_rects(
+    crops: List[Dict[str, float]],
+    image_width: int,
+    image_height: int,
+    padding: int = CROP_PADDING
+) -> List[Rect]:
+    """Crop'ları görsel sınırlarına kırpılmış piksel dikdörtgenlerine çevir (boş olanlar atılır)"""
+    rects = []
+    for crop in crops:
+        x, y, w, h = crop["x"], crop["y"], crop["width"], crop["height"]
+        if max(x, y, w, h) <= 1.0:
+            x, w = x * image_width, w * image_width
+            y, h = y * image_height, h * image_height
+
+        x0 = max(0, int(x) - padding)
+        y0 = max(0, int(y) - padding)
+        x1 = min(image_width, int(round(x + w)) + padding)
+        y1 = min(image_height, int(round(y + h)) + padding)
+        if x1 > x0 and y1 > y0:
+            rects.append((x0, y0, x1, y1))
+    return rects
+
+
+def crop_regions(img: np.ndarray, rects: List[Rect]) -> List[np.ndarray]:
+    """Dikdörtgenlere karşılık gelen görsel parçaları (engine'ler contiguous array bekler)"""
+    return [np.ascontiguousarray(img[y0:y1, x0:x1]) for x0, y0, x1, y1 in rects]
@@ -0,0 +1,190 @@
+"""
+OCR sonuç cache'i
+Görsel içerik hash'ine göre LRU cache (bellek + opsiyonel disk spill)
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(image_bytes: bytes, **variant: Any) -> str:
+    """
+    Cache anahtarı: görsel içeriği + sonucu etkileyen parametreler
+
+    Args:
+        image_bytes: Ham görsel verisi
+        variant: Backend, dil, engine parametreleri vb.
+    """
+    digest = hashlib.sha256(image_bytes)
+    if variant:
+        digest.update(json.dumps(variant, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Thread-safe LRU sonuç cache'i
+
+    Bellekte entry sayısı ve toplam boyut sınırı uygulanır. disk_dir verilirse
+    bellekten düşen kayıtlar diske yazılır ve sonraki erişimde belleğe alınır.
+    Disk kayıtları bellekte LRU sırasıyla izlenir (dizin sadece açılışta taranır).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_bytes: int = 64 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        disk_max_entries: int = 5000
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_entries = disk_max_entries
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        # Disk kayıtları: key -> dosya boyutu (en eski başta)
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        """Önceki çalışmadan kalan disk kayıtlarını erişim zamanı sırasıyla indexle"""
+        files = []
+        for path in self.disk_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Kayıt varsa döndür (bellek, sonra disk)"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            on_disk = key in self._disk
+            if on_disk:
+                self._disk.move_to_end(key)
+
+        value = self._read_disk(key) if on_disk else None
+        with self._lock:
+            if value is None:
+                if on_disk:
+                    self._disk.pop(key, None)  # Okunamayan/silinmiş dosya
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, value)
+            return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Sonucu cache'e ekle"""
+        with self._lock:
+            self._insert(key, value)
+
+    def clear(self):
+        """Bellek ve disk cache'ini temizle"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+            self._disk.clear()
+            if self.disk_dir:
+                for path in self.disk_dir.glob("*.json"):
+                    path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss sayaçları ve doluluk"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": sum(self._disk.values()),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+            }
+
+    def _insert(self, key: str, value: Dict[str, Any]):
+        """Lock altında çağrılır"""
+        size = len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._total_bytes -= self._sizes[key]
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._sizes[key] = size
+        self._total_bytes += size
+
+        while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+            evicted_key, evicted_value = self._entries.popitem(last=False)
+            self._total_bytes -= self._sizes.pop(evicted_key)
+            self.evictions += 1
+            self._spill(evicted_key, evicted_value)
+
+    def _spill(self, key: str, value: Dict[str, Any]):
+        """Bellekten düşen kaydı diske yaz (disk sınırında en eskiyi sil); lock altında çağrılır"""
+        if not self.disk_dir:
+            return
+        try:
+            if key in self._disk:
+                # Diskteki kopya güncel (sonuçlar görsel hash'ine göre değişmez)
+                self._disk.move_to_end(key)
+                return
+            while self._disk and len(self._disk) >= self.disk_max_entries:
+                oldest, _ = self._disk.popitem(last=False)
+                (self.disk_dir / f"{oldest}.json").unlink(missing_ok=True)
+
+            data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+            tmp_path = self.disk_dir / f"{key}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.disk_dir / f"{key}.json")
+            self._disk[key] = len(data)
+        except Exception as e:
+            logger.warning(f"Result cache disk spill error: {e}")
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.disk_dir:
+            return None
+        path = self.disk_dir / f"{key}.json"
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # Disk LRU için erişim zamanını güncelle
+            return value
+        except Exception as e:
+            logger.warning(f"Result cache disk read error: {e}")
+            return None